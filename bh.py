@@ -1,12 +1,16 @@
-from sgrequests import SgRequests
+from sgrequests import SgRequests, AimdRateLimiter, RetryBudget, CircuitBreaker, HedgePolicy, AdaptiveTimeouts, SingleFlight, \
+    ResponseCache, TrafficArchive, ReplayTransport
 from sgscrape.sgrecord import SgRecord
 from sgscrape.sgwriter import SgWriter
 from sgscrape.sgrecord_id import SgRecordID
 from sgscrape.sgrecord_deduper import SgRecordDeduper
+from sgscrape.sgrecord_id_store import SqliteIdStore
+from sgscrape.pause_resume import CrawlStateSingleton
 from bs4 import BeautifulSoup as bs
 import pandas as pd
 import math
 from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import os
 import shutil
 import re
@@ -17,6 +21,9 @@ from io import BytesIO
 from util.util import Util
 import time
 import argparse
+import json
+import base64
+import zlib
 
 # BASE_PATH = os.path.abspath(os.curdir)
 BASE_PATH = '/tmp'
@@ -75,7 +82,30 @@ jpeg_url = "https://www.zoro.com/static/cms/product/full/{}"
 
 max_workers = 8
 
-http = SgRequests(verify_ssl=False)
+PRODUCT_CACHE_TTL_SEC = 6 * 3600
+
+def mk_http(rate_limit=False,
+            retry_budget=False,
+            circuit_breaker=False,
+            hedge=False,
+            adaptive_timeouts=False,
+            single_flight=False,
+            response_cache=None,
+            record_traffic=None,
+            replay_traffic=None):
+    # every feature is off unless its command-line flag asks for it; see __main__.
+    return SgRequests(verify_ssl=False,
+                      rate_limiter=AimdRateLimiter() if rate_limit else None,
+                      retry_budget=RetryBudget() if retry_budget else None,
+                      circuit_breaker=CircuitBreaker() if circuit_breaker else None,
+                      hedge_policy=HedgePolicy() if hedge else None,
+                      adaptive_timeouts=AdaptiveTimeouts() if adaptive_timeouts else None,
+                      single_flight=SingleFlight() if single_flight else None,
+                      response_cache=response_cache,
+                      record_traffic=record_traffic,
+                      replay_traffic=replay_traffic)
+
+http = None  # made in __main__, as per the command-line flags
 
 class Script:
 
@@ -138,8 +168,13 @@ class Script:
         _url = link['href']
         if not _url.startswith('http'):
             _url = base_url + link['href']
-        
-        return _url, self.request_with_retries(_url)
+
+        try:
+            return _url, self._get_page(_url)
+        except Exception as err:
+            logger.warning(f"failed to fetch {_url}: {err}")
+            time.sleep(1)
+            return _url, (False, None)
 
     def fetchList(self, list, occurrence=max_workers):
         output = []
@@ -161,11 +196,37 @@ class Script:
         return output
 
 
+    def fetchAhead(self, cursor, links, occurrence=max_workers):
+        '''
+            like fetchList, but lazily: yields the pages in order, while fetching at most `occurrence` ahead,
+            and checks the time budget before each fetch, so that a large category can't overrun the deadline
+        '''
+        links = iter(links)
+        in_flight = deque()
+        with ThreadPoolExecutor(
+            max_workers=occurrence, thread_name_prefix="fetcher"
+        ) as executor:
+            while True:
+                while len(in_flight) < occurrence and not cursor.out_of_time():
+                    link = next(links, None)
+                    if link is None:
+                        break
+                    in_flight.append(executor.submit(self.fetchSingle, link))
+                if not in_flight:
+                    return
+                yield in_flight.popleft().result()
+
     def request_with_retries(self, url):
+        return self._get_page(url)[1]
+
+    def _get_page(self, url):
+        '''
+            fetch and parse a page; returns (ok, page), where ok is whether it came back 200
+        '''
         res = http.get(url=url, headers=self._headers())
         if res.status_code != 200:
             logger.warning(res.__str__)
-        return bs(res.text, 'lxml')
+        return res.status_code == 200, bs(res.text, 'lxml')
 
 
     def _check_old_list(self, mf_number):
@@ -259,7 +320,61 @@ class Script:
         for x, link in enumerate(categories):
             logger.info(f"[{x}] {self._url(link)}")
 
-    def fetch_zoro_data(self, cat_idx=0, cat_list=[]):
+    def _fetch_items(self, cursor, unit, items, ok):
+        '''
+            yield the records of a page's items, and mark the page done if it came back 200 (ok) with items,
+            none of which failed; e.g. a soft-ban or captcha page parses to no items, and is retried on resume.
+        '''
+        complete = ok and len(items) > 0
+        for item in items:
+            try:
+                yield self._d_zoro(item)
+            except Exception as err:
+                complete = False
+                time.sleep(1)
+
+        if complete:
+            cursor.done(*unit)
+        return complete
+
+    def _fetch_listing(self, cursor, unit, url, listing, ok):
+        '''
+            yield the records of a (sub)category listing, across its pages, skipping the pages already done.
+            the listing is its first page, as fetched (ok: whether it came back 200), or None if fetching it failed.
+            returns whether all of its pages are done.
+        '''
+        if listing is None:
+            return False
+        complete = True
+        pages = listing.select('section.search__results__footer div.v-select-list a')
+        if cursor.out_of_time():
+            return False
+        if not cursor.is_done(*unit, 1):
+            items = listing.select('div.search-results__result div.product-card-container')
+            logger.info(f"[{len(items)}] {url}")
+            complete &= yield from self._fetch_items(cursor, unit + (1, ), items, ok)
+
+        # page 2 > 
+        if len(pages) > 1:
+            for page in pages:
+                page_no = page.text.strip()
+                if cursor.is_done(*unit, page_no):
+                    continue
+                if cursor.out_of_time():
+                    return False
+                try:
+                    ok1, listing1 = self._get_page(url+f'?page={page_no}')
+                except:
+                    time.sleep(1)
+                    complete = False
+                    continue
+                items1 = listing1.select('div.search-results__result div.product-card-container')
+                logger.info(f"[{len(items1)}] ***page*** [{page_no}]")
+                complete &= yield from self._fetch_items(cursor, unit + (page_no, ), items1, ok1)
+
+        return complete
+
+    def fetch_zoro_data(self, cursor, cat_idx=0, cat_list=[]):
         categories = self.request_with_retries(base_url).select('div.mega-menu > div.mega-menu__grid div.mega-menu__grid-item a.mega-menu__level1')
         logger.info(f"Total {len(categories)} categories")
         # for cat_url, cat in self.fetchList(categories):
@@ -268,88 +383,236 @@ class Script:
                 continue
             # if x != int(cat_idx):
             #     continue
+            if cursor.is_done(x):
+                logger.info(f"[{x}] already crawled, skipping")
+                continue
+            if cursor.out_of_time():
+                return
             cat_url = self._url(link)
-            cat = self.request_with_retries(cat_url)
+            try:
+                cat_ok, cat = self._get_page(cat_url)
+            except Exception as err:
+                logger.warning(f"failed to fetch {cat_url}: {err}")
+                time.sleep(1)
+                continue
             sub_categories = cat.select('ul.c-sidebar-nav__list li a')
             logger.warning(f"{cat_url} [sub cat {len(sub_categories)}]")
+            complete = True
             if len(sub_categories):
-                for sub_url, sub_cat in self.fetchList(sub_categories):
-                # for sub_link in sub_categories:
-                        # sub_url = self._url(sub_link)
-                        # sub_cat = self.request_with_retries(sub_url)
-                        pages = sub_cat.select('section.search__results__footer div.v-select-list a')
-                        items = sub_cat.select('div.search-results__result div.product-card-container')
-                        logger.info(f"[{len(items)}] {sub_url}")
-                        for item in items:
-                            try:
-                                yield self._d_zoro(item)
-                            except Exception as err:
-                                time.sleep(1)
-
-                        # page 2 > 
-                        if len(pages) > 1:
-                            for page in pages:
-                                sub_url1 = sub_url+f'?page={page.text.strip()}'
-                                try:
-                                    sub_cat1 = self.request_with_retries(sub_url1)
-                                except:
-                                    time.sleep(1)
-                                    continue
-                                items1 = sub_cat1.select('div.search-results__result div.product-card-container')
-                                logger.info(f"[{len(items1)}] ***page*** [{page.text.strip()}]")
-                                for item1 in items1:
-                                    try:
-                                        yield self._d_zoro(item1)
-                                    except Exception as err:
-                                        time.sleep(1)
-
-                    
+                sub_categories = [sub_link for sub_link in sub_categories if not cursor.is_done(x, self._url(sub_link))]
+                for sub_url, (sub_ok, sub_cat) in self.fetchAhead(cursor, sub_categories):
+                    if cursor.out_of_time():
+                        complete = False
+                        break
+                    sub_complete = yield from self._fetch_listing(cursor, (x, sub_url), sub_url, sub_cat, sub_ok)
+                    if sub_complete:
+                        cursor.done(x, sub_url)
+                    complete &= sub_complete
+                if cursor.out_of_time():
+                    complete = False  # fetchAhead stopped before the remaining sub categories
             else:
-                pages1 = cat.select('section.search__results__footer div.v-select-list a')
-                items2 = cat.select('div.search-results__result div.product-card-container')
-                logger.info(f"[{len(items2)}] {cat_url}")
-                for item in items2:
-                    try:
-                        yield self._d_zoro(item)
-                    except Exception as err:
-                        time.sleep(1)
-
-                # page 2 > 
-                if len(pages1) > 1:
-                    for page in pages1:
-                        sub_url21 = cat_url+f'?page={page.text.strip()}'
-                        try:
-                            sub_cat21 = self.request_with_retries(sub_url21)
-                        except:
-                            time.sleep(1)
-                            continue
-                        items21 = sub_cat21.select('div.search-results__result div.product-card-container')
-                        logger.info(f"[{len(items21)}] ***page*** [{page.text.strip()}]")
-                        for item1 in items21:
-                            try:
-                                yield self._d_zoro(item1)
-                            except Exception as err:
-                                time.sleep(1)
+                complete = yield from self._fetch_listing(cursor, (x, ), cat_url, cat, cat_ok)
+
+            if complete:
+                cursor.done(x)
+
+
+class TimeBudget:
+    '''
+        tracks the wall-clock time left to a run, so that it stops taking new crawl units near its deadline
+    '''
+
+    def __init__(self, seconds, margin):
+        self.deadline = time.monotonic() + seconds
+        self.margin = min(margin, seconds / 2)
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def exhausted(self):
+        return self.remaining() <= self.margin
+
+
+class CrawlCursor:
+    '''
+        records the crawl units done - categories, subcategories, and their pages - in the crawl state,
+        so that a restarted crawl skips them, and only re-fetches the pages that were in flight.
+        units are only recorded once the writer has saved their records to file (see `commit`).
+    '''
+    PREFIX = 'zoro'
+    DEDUP_NAMESPACE_KEY = 'dedup_namespace'
+
+    def __init__(self, budget=None):
+        self.state = CrawlStateSingleton.get_instance()
+        self.pending = set()
+        self.budget = budget
+        self.stopped_early = False
+
+    def out_of_time(self):
+        '''
+            whether the run is near the deadline of its time budget, and so should not take new units
+        '''
+        if not self.stopped_early and self.budget and self.budget.exhausted():
+            logger.warning(f"time budget nearly exhausted [{self.budget.remaining():.0f}s left], stopping")
+            self.stopped_early = True
+        return self.stopped_early
+
+    def _key(self, unit):
+        return ':'.join([CrawlCursor.PREFIX] + [str(u) for u in unit])
+
+    def is_done(self, *unit):
+        key = self._key(unit)
+        return key in self.pending or bool(self.state.get_misc_value(key))
+
+    def done(self, *unit):
+        self.pending.add(self._key(unit))
+
+    def commit(self):
+        '''
+            record the units done so far; call once their records are saved.
+        '''
+        for key in self.pending:
+            self.state.set_misc_value(key, 1)
+        self.pending.clear()
+
+    def token(self, cat_idx):
+        '''
+            a continuation token, from which a later run (possibly on another machine) picks up where this one stopped
+        '''
+        done = self.state.get_misc_keys(prefix=CrawlCursor.PREFIX + ':')
+        payload = json.dumps({'index': cat_idx,
+                              'done': done,
+                              'dedup_namespace': self.state.get_misc_value(CrawlCursor.DEDUP_NAMESPACE_KEY)}).encode('utf-8')
+        return base64.urlsafe_b64encode(zlib.compress(payload)).decode('ascii')
+
+    @staticmethod
+    def parse_token(token):
+        return json.loads(zlib.decompress(base64.urlsafe_b64decode(token)))
+
+    def restore(self, done, dedup_namespace=None):
+        '''
+            record the units done, and the dedup namespace, as per a continuation token
+        '''
+        for key in done:
+            self.state.set_misc_value(key, 1)
+        if dedup_namespace:
+            self.state.set_misc_value(CrawlCursor.DEDUP_NAMESPACE_KEY, dedup_namespace)
+
+    def dedup_namespace(self, requested=None):
+        '''
+            the run's dedup namespace: the requested one, or the one a resumed run started with, or $ZORO_RUN_ID;
+            None if there's none. It can't be made up here: each category worker would make up its own.
+        '''
+        namespace = requested \
+            or self.state.get_misc_value(CrawlCursor.DEDUP_NAMESPACE_KEY) \
+            or os.environ.get('ZORO_RUN_ID')
+        if namespace:
+            self.state.set_misc_value(CrawlCursor.DEDUP_NAMESPACE_KEY, namespace)
+        return namespace
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-i', '--index', type=str, required=False, help="the name of childscraper. e.g, ganjapreneur from https://www.ganjapreneur.com/businesses/  complete example: python3 dirscraper.py -k ganjapreneur")
-    cat_idx = parser.parse_args().index or 0
+    parser.add_argument('--dedup-db', type=str, required=False, help="path to a SQLite file shared by all category workers, so that items are deduplicated across categories (and runs)")
+    parser.add_argument('--dedup-namespace', type=str, required=False, help="the dedup scope within --dedup-db, shared by all the category workers of a run: pass the same value to each of them, or set $ZORO_RUN_ID. Required with --dedup-db, unless resuming a run that had one (it's kept across --resume and --continue). Reuse a value across runs to dedup against them")
+    parser.add_argument('--resume', action='store_true', help="append to an existing category output file, skipping the items it already holds, and the categories/pages a previous run completed")
+    parser.add_argument('--time-budget', type=float, required=False, help="the wall-clock seconds this run may take; near the deadline, it stops taking new pages, saves its output and crawl state, and prints a continuation token")
+    parser.add_argument('--time-budget-margin', type=float, default=120, help="how many seconds before the --time-budget deadline to stop taking new pages")
+    parser.add_argument('--continue', dest='continuation', type=str, required=False, help="the continuation token printed by a previous --time-budget run, to resume where it stopped (implies --resume)")
+    parser.add_argument('--record-traffic', type=str, required=False, help="path to a JSONL archive to record every HTTP request/response pair into, for replaying offline")
+    parser.add_argument('--replay-traffic', type=str, required=False, help="path to a JSONL archive recorded with --record-traffic, to serve the HTTP responses from, without any network")
+    parser.add_argument('--replay-latency-scale', type=float, default=0.0, help="how much of the recorded latencies to wait when replaying: 0 answers right away, 1 in real time")
+    parser.add_argument('--rate-limit', action='store_true', help="pace the requests per host, slowing down when throttled")
+    parser.add_argument('--retry-budget', action='store_true', help="cap the retries (and proxy rotations) at a share of all the requests")
+    parser.add_argument('--circuit-breaker', action='store_true', help="fail fast on the requests to a host that keeps failing")
+    parser.add_argument('--hedge', action='store_true', help="duplicate the slowest requests through another proxy, when there is one")
+    parser.add_argument('--adaptive-timeouts', action='store_true', help="derive each host's request timeouts from its observed latencies")
+    parser.add_argument('--single-flight', action='store_true', help="have concurrent identical GETs share a single request")
+    parser.add_argument('--http-cache-dir', type=str, required=False, help="a directory to cache the GET responses in, across runs, revalidating them once stale; no cache by default")
+    parser.add_argument('--http-cache-ttl', type=float, default=ResponseCache.DEFAULT_TTL_SEC, help="how many seconds a cached response is served without revalidation (product pages: at most %d)" % PRODUCT_CACHE_TTL_SEC)
+    args = parser.parse_args()
+    if args.record_traffic and args.replay_traffic:
+        parser.error('--record-traffic and --replay-traffic are mutually exclusive')
+    if args.http_cache_dir and args.replay_traffic:
+        # a replay serves every request from the archive, so that runs are comparable.
+        parser.error('--http-cache-dir and --replay-traffic are mutually exclusive')
+    response_cache = ResponseCache(args.http_cache_dir,
+                                   default_ttl_sec=args.http_cache_ttl,
+                                   ttl_rules=[(r'/product/\?products=', min(args.http_cache_ttl, PRODUCT_CACHE_TTL_SEC))]) \
+        if args.http_cache_dir else None
+    traffic_archive = TrafficArchive(args.record_traffic or args.replay_traffic) \
+        if args.record_traffic or args.replay_traffic else None
+    http = mk_http(rate_limit=args.rate_limit,
+                   retry_budget=args.retry_budget,
+                   circuit_breaker=args.circuit_breaker,
+                   hedge=args.hedge,
+                   adaptive_timeouts=args.adaptive_timeouts,
+                   single_flight=args.single_flight,
+                   response_cache=response_cache,
+                   record_traffic=traffic_archive if args.record_traffic else None,
+                   replay_traffic=ReplayTransport(traffic_archive, latency_scale=args.replay_latency_scale)
+                   if args.replay_traffic else None)
+    budget = TimeBudget(args.time_budget, args.time_budget_margin) if args.time_budget else None
+    continuation = CrawlCursor.parse_token(args.continuation) if args.continuation else None
+    cat_idx = continuation['index'] if continuation else (args.index or 0)
+    resume = args.resume or continuation is not None
 
     cat_list = [100, 101, 102, 103, 104, 105, 106, 107, 108, 109, 110, 111, 112, 113, 114, 115, 116, 117, 118, 119, 120, 121, 122, 123, 124, 125, 126, 127, 128, 129, 130, 131, 132, 133, 134, 135, 136, 137, 138, 139, 140, 141, 142, 143, 144, 145, 146, 147, 148, 149, 150, 151, 152, 153, 154, 155, 156, 157, 158, 159, 160, 161, 162, 163, 164, 165, 166, 167, 168, 169, 170, 171, 172, 173, 174, 175, 176, 177, 178, 179, 180, 181, 182, 183, 184, 185, 186, 187, 188, 189, 190, 191, 192, 193, 194, 195, 196, 197, 198, 199, 200, 201, 202, 203, 204, 205, 206, 207, 208, 209, 210, 211, 212, 213, 214, 215, 216, 217, 218, 219, 22, 220, 221, 222, 223, 224, 225, 226, 227, 228, 229, 230, 231, 232, 233, 234, 235, 236, 237, 238, 239, 240, 241, 242, 243, 244, 245, 246, 247, 248, 249, 250, 251, 252, 253, 254, 255, 256, 257, 258, 259, 260, 261, 262, 263, 264, 265, 266, 267, 268, 269, 27, 270, 271, 272, 273, 274, 275, 276, 277, 278, 279, 280, 281, 282, 283, 284, 285, 286, 287, 288, 289, 290, 291, 292, 293, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 43, 44, 45, 46, 47, 48, 49, 50, 51, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 71, 72, 73, 75, 76, 77, 78, 79, 80, 81, 82, 83, 84, 85, 86, 87, 88, 89, 90, 91, 92, 93, 94, 95, 96, 97, 98, 99]
     
-    script = Script()
-    # script._save_master_excel()
-    if cat_idx == 'missing':
-        script.find_missing_or_incomplete_categories()
-    elif cat_idx == 'list':
-        script.list_zoro_cat()
-    elif cat_idx != '-1':
-        logger.info(f"{cat_idx}st Category scraper")
-        ZORO_PATH = BASE_PATH + f'/ZORO_SCRAPE_Category_{cat_idx}.xlsx'
-        with SgWriter(SgRecordDeduper(SgRecordID({SgRecord.Headers.ITEM_URL})), data_file=ZORO_PATH, s3=s3) as writer:
-            script.initialize()
-            results = script.fetch_zoro_data(cat_idx=cat_idx, cat_list=cat_list)
-            for rec in results:
-                writer.write_row(rec)
-    
\ No newline at end of file
+    try:
+        script = Script()
+        # script._save_master_excel()
+        if cat_idx == 'missing':
+            script.find_missing_or_incomplete_categories()
+        elif cat_idx == 'list':
+            script.list_zoro_cat()
+        elif cat_idx != '-1':
+            logger.info(f"{cat_idx}st Category scraper")
+            ZORO_PATH = BASE_PATH + f'/ZORO_SCRAPE_Category_{cat_idx}.xlsx'
+            CrawlStateSingleton.set_state_file(BASE_PATH + f'/ZORO_STATE_Category_{cat_idx}.json')
+            if not resume:
+                CrawlStateSingleton.discard_saved_state()
+            if continuation and not os.path.exists(ZORO_PATH):
+                # e.g. a fresh worker: pick up the output that the previous run uploaded
+                logger.info('downloading the output of the previous run ...')
+                s3.download_file(ZORO_RESULTS_BUCKET, ZORO_PATH.split('/')[-1], ZORO_PATH)
+            cursor = CrawlCursor(budget)
+            if continuation:
+                cursor.restore(continuation['done'], continuation.get('dedup_namespace'))
+            id_store = None
+            if args.dedup_db:
+                # ids are only committed once the writer has saved their rows; see on_save below.
+                dedup_namespace = cursor.dedup_namespace(args.dedup_namespace)
+                if not dedup_namespace:
+                    parser.error('--dedup-db needs --dedup-namespace (or $ZORO_RUN_ID), the same for all the category workers of a run')
+                id_store = SqliteIdStore(args.dedup_db, namespace=dedup_namespace, autocommit=False)
+            deduper = SgRecordDeduper(SgRecordID({SgRecord.Headers.ITEM_URL}, hashed=True),
+                                      data_file_path=ZORO_PATH if resume else None,
+                                      id_store=id_store)
+            started = time.monotonic()
+            rows = 0
+            def on_save():
+                deduper.commit()
+                cursor.commit()
+
+            with SgWriter(deduper, data_file=ZORO_PATH, s3=s3, resume=resume, on_save=on_save) as writer:
+                script.initialize()
+                results = script.fetch_zoro_data(cursor, cat_idx=cat_idx, cat_list=cat_list)
+                for rec in results:
+                    writer.write_row(rec)
+                    rows += 1
+            elapsed = time.monotonic() - started
+            logger.info(f"Throughput: {rows} records in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.2f} records/s)")
+            logger.info(f"Retry budget: {http.retry_budget_stats()}")
+            logger.info(f"Hedging: {http.hedge_stats()}")
+            logger.info(f"Coalesced requests: {http.single_flight_stats()}")
+            logger.info(f"Response cache: {http.response_cache_stats()}")
+
+            if cursor.stopped_early:
+                print(f"CONTINUATION_TOKEN={cursor.token(cat_idx)}")
+    finally:
+        http.close()
+        if response_cache:
+            response_cache.close()
+        if traffic_archive:
+            traffic_archive.close()
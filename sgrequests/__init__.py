@@ -1,6 +1,15 @@
 import sys
 
 from .sgrequests import SgRequests, SgRequestsAsync, SgRequestError
+from .rate_control import AimdRateLimiter
+from .retry_budget import RetryBudget, RetryBudgetStats, CircuitBreaker
+from .hedging import HedgePolicy, HedgeStats
+from .latency import LatencyTracker, AdaptiveTimeouts
+from .single_flight import SingleFlight, SingleFlightStats
+from .response_cache import ResponseCache, ResponseCacheStats, CachedResponse
+from .traffic_archive import TrafficArchive, RecordedExchange, RecordingTransport, ReplayTransport, ReplayMissError
+from .proxy_pool import ProxyPool
+from .ip_discovery import PublicIpCache, PublicIpDiscovery, JsonIpDiscovery, StaticIpDiscovery
 
 if sys.version_info[0] >= 3:
     from .sghttpclient import SgHttpClient
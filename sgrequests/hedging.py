@@ -0,0 +1,107 @@
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from .latency import LatencyTracker
+
+
+@dataclass(frozen=True)
+class HedgeStats:
+    requests: int
+    hedges: int
+    hedge_wins: int
+
+    @property
+    def extra_load(self) -> float:
+        """
+        The share of requests that were duplicated.
+        """
+        return self.hedges / self.requests if self.requests else 0.0
+
+
+class HedgePolicy:
+    """
+    When to hedge a request: if it hasn't been answered within its host's observed `quantile` latency (the p95, by
+    default), a duplicate is sent through a different proxy (if there's another healthy one), and whichever answers
+    first is used.
+
+    To cap the extra load, each request earns `max_extra_load` of a hedge, and a hedge is only sent when a whole one
+    has been earned (up to `burst` can be saved up). Only idempotent `METHODS` are hedged.
+
+    It's thread-safe; share one across `SgRequests` instances to share the cap and the latency observations.
+    """
+
+    METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+    DEFAULT_QUANTILE = 0.95
+    DEFAULT_MAX_EXTRA_LOAD = 0.05
+    DEFAULT_MIN_SAMPLES = 20
+    DEFAULT_MAX_WORKERS = 32
+
+    def __init__(self,
+                 quantile: float = DEFAULT_QUANTILE,
+                 max_extra_load: float = DEFAULT_MAX_EXTRA_LOAD,
+                 min_samples: int = DEFAULT_MIN_SAMPLES,
+                 min_delay_sec: float = 0.05,
+                 burst: float = 10.0,
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 latency: Optional[LatencyTracker] = None):
+        """
+        :param quantile: The host's latency quantile after which a request is hedged.
+        :param max_extra_load: The most hedges to send, per request.
+        :param min_samples: How many latencies to observe for a host before hedging its requests.
+        :param min_delay_sec: The shortest a request is waited on before it's hedged.
+        :param burst: How many hedges can be saved up, while requests are answered in time.
+        :param max_workers: The threads `SgRequests` sends the hedges on; each request that may be hedged is sent on
+                            a thread of its own, so that it can wait on whichever answers first. Unused by
+                            `SgRequestsAsync`.
+        :param latency: [LatencyTracker()] Where the latencies are observed.
+        """
+        if not 0 < quantile < 1:
+            raise ValueError(f"quantile must be between 0 and 1. Got: {quantile}")
+
+        self.__quantile = quantile
+        self.__max_extra_load = max_extra_load
+        self.__min_samples = min_samples
+        self.__min_delay_sec = min_delay_sec
+        self.__burst = burst
+        self.max_workers = max_workers
+        self.latency = latency or LatencyTracker()
+        self.__tokens = 0.0
+        self.__requests = 0
+        self.__hedges = 0
+        self.__hedge_wins = 0
+        self.__lock = threading.Lock()
+
+    def hedge_delay(self, host: str, method: str) -> Optional[float]:
+        """
+        Records a request, and returns how long to wait on it before hedging it.
+
+        :return: The delay in seconds, or `None` if the request isn't to be hedged.
+        """
+        with self.__lock:
+            self.__requests += 1
+            self.__tokens = min(self.__burst, self.__tokens + self.__max_extra_load)
+        if method.upper() not in HedgePolicy.METHODS:
+            return None
+        delay = self.latency.quantile(host, self.__quantile, min_samples=self.__min_samples)
+        return max(self.__min_delay_sec, delay) if delay is not None else None
+
+    def try_acquire_hedge(self) -> bool:
+        """
+        :return: Whether a hedge may be sent now, as per the `max_extra_load` cap; if so, it's counted against it.
+        """
+        with self.__lock:
+            if self.__tokens < 1:
+                return False
+            self.__tokens -= 1
+            self.__hedges += 1
+            return True
+
+    def record_hedge_win(self) -> None:
+        with self.__lock:
+            self.__hedge_wins += 1
+
+    def stats(self) -> HedgeStats:
+        with self.__lock:
+            return HedgeStats(requests=self.__requests, hedges=self.__hedges, hedge_wins=self.__hedge_wins)
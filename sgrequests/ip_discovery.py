@@ -0,0 +1,115 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+import httpx
+
+
+class PublicIpDiscovery:
+    """
+    Finds out the public IP that requests through a proxy come from.
+    """
+
+    def discover(self, proxy_url: Optional[str]) -> Optional[str]:
+        """
+        :param proxy_url: The proxy to look the IP up through; `None` for a direct connection.
+        :return: The public IP, or `None` if it couldn't be determined.
+        """
+        raise NotImplementedError("Use a concrete PublicIpDiscovery, such as JsonIpDiscovery")
+
+
+class JsonIpDiscovery(PublicIpDiscovery):
+    """
+    Looks the IP up with jsonip.com, through the proxy. This is the default.
+    """
+
+    URL = 'https://jsonip.com/'
+    DEFAULT_TIMEOUT_SEC = 10.0
+
+    def __init__(self, timeout_sec: float = DEFAULT_TIMEOUT_SEC):
+        self.__timeout_sec = timeout_sec
+
+    def discover(self, proxy_url: Optional[str]) -> Optional[str]:
+        try:
+            return httpx.get(JsonIpDiscovery.URL,
+                             proxies=proxy_url,
+                             trust_env=False,
+                             timeout=self.__timeout_sec).json()['ip']
+        except Exception:
+            # TODO - try another service; e.g. "ipify"
+            return None
+
+
+class StaticIpDiscovery(PublicIpDiscovery):
+    """
+    A local stand-in, for tests: reports a fixed IP per proxy, without any network access.
+    """
+
+    def __init__(self, default_ip: Optional[str] = None, ip_by_proxy: Optional[Dict[Optional[str], str]] = None):
+        """
+        :param default_ip: The IP of proxies missing from `ip_by_proxy`.
+        :param ip_by_proxy: The IP of each proxy url.
+        """
+        self.__default_ip = default_ip
+        self.__ip_by_proxy = dict(ip_by_proxy or {})
+
+    def discover(self, proxy_url: Optional[str]) -> Optional[str]:
+        return self.__ip_by_proxy.get(proxy_url, self.__default_ip)
+
+
+class PublicIpCache:
+    """
+    Discovers public IPs in the background, once per proxy session, so that rotating proxies never waits on it.
+    Failed discoveries aren't cached, and are retried on the next lookup.
+    """
+
+    __shared: Optional['PublicIpCache'] = None
+    __shared_lock = threading.Lock()
+
+    def __init__(self, discovery: Optional[PublicIpDiscovery] = None, max_workers: int = 2):
+        """
+        :param discovery: [JsonIpDiscovery()] How to discover IPs.
+        :param max_workers: How many discoveries can run at once.
+        """
+        self.__discovery = discovery or JsonIpDiscovery()
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='public-ip')
+        self.__futures: Dict[Optional[str], 'Future[Optional[str]]'] = {}
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def shared() -> 'PublicIpCache':
+        """
+        The process-wide cache, backed by `JsonIpDiscovery`; created on first use.
+        """
+        with PublicIpCache.__shared_lock:
+            if PublicIpCache.__shared is None:
+                PublicIpCache.__shared = PublicIpCache()
+            return PublicIpCache.__shared
+
+    def lookup(self, proxy_url: Optional[str]) -> 'Future[Optional[str]]':
+        """
+        Returns immediately, with the (possibly still running) discovery of the proxy's public IP.
+        """
+        with self.__lock:
+            future = self.__futures.get(proxy_url)
+            if future is None:
+                future = self.__futures[proxy_url] = self.__executor.submit(self.__discovery.discover, proxy_url)
+                future.add_done_callback(lambda done: self.__forget_failed(proxy_url, done))
+            return future
+
+    def __forget_failed(self, proxy_url: Optional[str], future: 'Future[Optional[str]]') -> None:
+        if future.exception() is None and future.result():
+            return
+        with self.__lock:
+            if self.__futures.get(proxy_url) is future:
+                del self.__futures[proxy_url]
+
+    def invalidate(self, proxy_url: Optional[str]) -> None:
+        """
+        Forgets the proxy's IP, e.g. when its session ends; the next lookup discovers it anew.
+        """
+        with self.__lock:
+            self.__futures.pop(proxy_url, None)
+
+    def close(self) -> None:
+        self.__executor.shutdown(wait=False)
@@ -0,0 +1,111 @@
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """
+    Keeps each host's most recent response latencies, to estimate their quantiles (e.g. the p95) from.
+    It's thread-safe.
+    """
+
+    DEFAULT_WINDOW = 200
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        """
+        :param window: How many of each host's most recent latencies to keep.
+        """
+        self.__window = window
+        self.__samples: Dict[str, Deque[float]] = {}
+        self.__lock = threading.Lock()
+
+    def record(self, host: str, latency_sec: float) -> None:
+        with self.__lock:
+            samples = self.__samples.get(host)
+            if samples is None:
+                samples = self.__samples[host] = deque(maxlen=self.__window)
+            samples.append(latency_sec)
+
+    def samples(self, host: str) -> int:
+        with self.__lock:
+            return len(self.__samples.get(host, ()))
+
+    def quantile(self, host: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """
+        The host's latency quantile (nearest-rank); e.g. `q=0.95` for the p95.
+
+        :return: The quantile, in seconds, or `None` with fewer than `min_samples` latencies for the host.
+        """
+        with self.__lock:
+            samples = sorted(self.__samples.get(host, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        rank = min(len(samples), max(1, math.ceil(q * len(samples))))
+        return samples[rank - 1]
+
+
+class AdaptiveTimeouts:
+    """
+    Derives each request's timeout from the latencies observed for its host and request class (`SgRequests` uses
+    the HTTP method): the `quantile` latency (the p99, by default) times `factor`, within `[floor_sec, ceiling_sec]`.
+    Until `min_samples` latencies are observed, the client's default timeout applies.
+
+    A timed-out request counts as having taken its whole timeout, so that the estimate grows with a slowing host.
+    It's thread-safe; share one across `SgRequests` instances to share the observations.
+    """
+
+    DEFAULT_QUANTILE = 0.99
+    DEFAULT_FACTOR = 3.0
+    DEFAULT_FLOOR_SEC = 5.0
+    DEFAULT_CEILING_SEC = 61.0
+    DEFAULT_MIN_SAMPLES = 20
+
+    def __init__(self,
+                 quantile: float = DEFAULT_QUANTILE,
+                 factor: float = DEFAULT_FACTOR,
+                 floor_sec: float = DEFAULT_FLOOR_SEC,
+                 ceiling_sec: float = DEFAULT_CEILING_SEC,
+                 min_samples: int = DEFAULT_MIN_SAMPLES,
+                 latency: Optional[LatencyTracker] = None):
+        """
+        :param quantile: The latency quantile to scale.
+        :param factor: By how much to scale it.
+        :param floor_sec: The shortest timeout.
+        :param ceiling_sec: The longest timeout.
+        :param min_samples: How many latencies to observe for a host and request class, before adapting its timeout.
+        :param latency: [LatencyTracker()] Where the latencies are observed.
+        """
+        if not 0 < floor_sec <= ceiling_sec:
+            raise ValueError(f"Expected 0 < floor_sec <= ceiling_sec. Got: {floor_sec}, {ceiling_sec}")
+
+        self.__quantile = quantile
+        self.__factor = factor
+        self.__floor_sec = floor_sec
+        self.__ceiling_sec = ceiling_sec
+        self.__min_samples = min_samples
+        self.__latency = latency or LatencyTracker()
+
+    @staticmethod
+    def key(host: str, request_class: str) -> str:
+        return f"{request_class.upper()} {host}"
+
+    def timeout_sec(self, host: str, request_class: str) -> Optional[float]:
+        """
+        :return: The timeout, in seconds, for a request to the host; `None` until enough latencies are observed.
+        """
+        latency_sec = self.__latency.quantile(AdaptiveTimeouts.key(host, request_class),
+                                              self.__quantile,
+                                              min_samples=self.__min_samples)
+        if latency_sec is None:
+            return None
+        return min(self.__ceiling_sec, max(self.__floor_sec, latency_sec * self.__factor))
+
+    def record(self, host: str, request_class: str, latency_sec: float) -> None:
+        self.__latency.record(AdaptiveTimeouts.key(host, request_class), latency_sec)
+
+    def record_timeout(self, host: str, request_class: str, timeout_sec: float) -> None:
+        """
+        Records a request that timed out after `timeout_sec`.
+        """
+        self.record(host, request_class, timeout_sec)
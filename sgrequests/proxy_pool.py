@@ -0,0 +1,186 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+
+@dataclass
+class ProxyHealth:
+    """
+    The observed quality of a proxy endpoint; all ratios are exponentially-weighted moving averages.
+    """
+    proxy: str
+    latency_sec: Optional[float] = None
+    success_ratio: float = 1.0
+    ban_ratio: float = 0.0
+    consecutive_failures: int = 0
+    quarantined_until: float = 0.0
+
+    def is_quarantined(self, now: float) -> bool:
+        return self.quarantined_until > now
+
+
+class ProxyPool:
+    """
+    A thread-safe pool of proxy endpoints, each scored by its EWMA latency, success ratio and ban ratio.
+
+    `acquire()` routes to the better-scoring endpoints (picking the best of two random healthy ones, so that load
+    still spreads across comparable endpoints). An endpoint that fails `max_consecutive_failures` times in a row,
+    or whose success ratio drops below `min_success_ratio`, is quarantined for `quarantine_sec`; meanwhile,
+    a background thread `probe`s it, and returns it to the pool as soon as a probe succeeds.
+
+    Use `ProxyPool.shared(...)` so that all the clients of the same endpoints learn from each other.
+    """
+
+    DEFAULT_PROBE_URL = 'https://jsonip.com/'
+    DEFAULT_PROBE_TIMEOUT_SEC = 10.0
+
+    __shared: Dict[Tuple[str, ...], 'ProxyPool'] = {}
+    __shared_lock = threading.Lock()
+
+    def __init__(self,
+                 proxies: Iterable[str],
+                 alpha: float = 0.2,
+                 max_consecutive_failures: int = 3,
+                 min_success_ratio: float = 0.3,
+                 quarantine_sec: float = 60.0,
+                 probe: Optional[Callable[[str], bool]] = None,
+                 probe_interval_sec: float = 15.0):
+        """
+        :param proxies: The proxy endpoint URLs.
+        :param alpha: The weight of the latest observation in the moving averages.
+        :param max_consecutive_failures: How many failures in a row quarantine an endpoint.
+        :param min_success_ratio: The success ratio under which an endpoint is quarantined.
+        :param quarantine_sec: The cool-off, after which a quarantined endpoint is tried again, even if unprobed.
+        :param probe: [ProxyPool.http_probe] Checks whether a quarantined endpoint works again.
+        :param probe_interval_sec: How often to probe the quarantined endpoints.
+        """
+        self.__health: Dict[str, ProxyHealth] = {proxy: ProxyHealth(proxy=proxy) for proxy in proxies}
+        if not self.__health:
+            raise ValueError("A ProxyPool needs at least one proxy.")
+        if not 0 < alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1]. Got: {alpha}")
+
+        self.__alpha = alpha
+        self.__max_consecutive_failures = max_consecutive_failures
+        self.__min_success_ratio = min_success_ratio
+        self.__quarantine_sec = quarantine_sec
+        self.__probe = probe or ProxyPool.http_probe
+        self.__probe_interval_sec = probe_interval_sec
+        self.__lock = threading.Lock()
+        self.__closed = threading.Event()
+        self.__prober: Optional[threading.Thread] = None
+
+    @staticmethod
+    def shared(proxies: Iterable[str]) -> 'ProxyPool':
+        """
+        The process-wide pool for these proxy endpoints; created on first use.
+        """
+        key = tuple(sorted(proxies))
+        with ProxyPool.__shared_lock:
+            pool = ProxyPool.__shared.get(key)
+            if pool is None:
+                pool = ProxyPool.__shared[key] = ProxyPool(key)
+            return pool
+
+    @staticmethod
+    def http_probe(proxy: str) -> bool:
+        """
+        Fetches `DEFAULT_PROBE_URL` through the proxy; a 2XX response means the proxy works.
+        """
+        proxy_url = proxy if '://' in proxy else f'http://{proxy}'
+        try:
+            response = httpx.get(ProxyPool.DEFAULT_PROBE_URL,
+                                 proxies=proxy_url,
+                                 trust_env=False,
+                                 timeout=ProxyPool.DEFAULT_PROBE_TIMEOUT_SEC)
+            return response.is_success
+        except Exception:
+            return False
+
+    def __score(self, health: ProxyHealth, default_latency_sec: float) -> float:
+        latency_sec = health.latency_sec if health.latency_sec is not None else default_latency_sec
+        return health.success_ratio * (1 - health.ban_ratio) / max(latency_sec, 0.01)
+
+    def acquire(self, exclude: Optional[str] = None) -> str:
+        """
+        Picks a proxy endpoint to route a request through. If all are quarantined, the one out of quarantine soonest.
+
+        :param exclude: A proxy to avoid, unless it's the only healthy one; e.g. for a hedged request.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            healthy = [health for health in self.__health.values() if not health.is_quarantined(now)]
+            if exclude is not None and len(healthy) > 1:
+                healthy = [health for health in healthy if health.proxy != exclude] or healthy
+            if not healthy:
+                return min(self.__health.values(), key=lambda health: health.quarantined_until).proxy
+
+            # unmeasured endpoints are assumed to be as fast as the average, so that they get tried.
+            latencies = [health.latency_sec for health in healthy if health.latency_sec is not None]
+            default_latency_sec = sum(latencies) / len(latencies) if latencies else 1.0
+            candidates = random.sample(healthy, min(2, len(healthy)))
+            return max(candidates, key=lambda health: self.__score(health, default_latency_sec)).proxy
+
+    def __ewma(self, average: float, value: float) -> float:
+        return self.__alpha * value + (1 - self.__alpha) * average
+
+    def report_success(self, proxy: str, latency_sec: float) -> None:
+        with self.__lock:
+            health = self.__health.get(proxy)
+            if health is None:
+                return
+            health.latency_sec = latency_sec if health.latency_sec is None else self.__ewma(health.latency_sec, latency_sec)
+            health.success_ratio = self.__ewma(health.success_ratio, 1.0)
+            health.ban_ratio = self.__ewma(health.ban_ratio, 0.0)
+            health.consecutive_failures = 0
+
+    def report_failure(self, proxy: str, banned: bool = False) -> None:
+        """
+        :param banned: Whether the target site blocked the request (e.g. a 403/429), rather than the proxy failing it.
+        """
+        with self.__lock:
+            health = self.__health.get(proxy)
+            if health is None:
+                return
+            health.success_ratio = self.__ewma(health.success_ratio, 0.0)
+            health.ban_ratio = self.__ewma(health.ban_ratio, 1.0 if banned else 0.0)
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.__max_consecutive_failures \
+                    or health.success_ratio < self.__min_success_ratio:
+                self.__quarantine(health)
+
+    def __quarantine(self, health: ProxyHealth) -> None:
+        health.quarantined_until = time.monotonic() + self.__quarantine_sec
+        health.consecutive_failures = 0
+        if self.__prober is None:
+            self.__prober = threading.Thread(target=self.__probe_loop, name='proxy-pool-prober', daemon=True)
+            self.__prober.start()
+
+    def __probe_loop(self) -> None:
+        while not self.__closed.wait(self.__probe_interval_sec):
+            now = time.monotonic()
+            with self.__lock:
+                quarantined = [health.proxy for health in self.__health.values() if health.is_quarantined(now)]
+            for proxy in quarantined:
+                if self.__probe(proxy):
+                    with self.__lock:
+                        health = self.__health[proxy]
+                        health.quarantined_until = 0.0
+                        health.success_ratio = self.__ewma(health.success_ratio, 1.0)
+
+    def health(self) -> List[ProxyHealth]:
+        """
+        A copy of each endpoint's current health, e.g. for logging.
+        """
+        with self.__lock:
+            return [ProxyHealth(**vars(health)) for health in self.__health.values()]
+
+    def close(self) -> None:
+        """
+        Stops the background prober.
+        """
+        self.__closed.set()
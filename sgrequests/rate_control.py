@@ -0,0 +1,131 @@
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import Dict, Optional
+
+from httpx import Response
+
+
+@dataclass
+class _HostRate:
+    rate: float
+    next_slot: float = 0.0
+    last_decrease: float = float('-inf')
+
+
+class AimdRateLimiter:
+    """
+    Paces requests per host, at a rate found by AIMD (additive-increase / multiplicative-decrease):
+    while responses are healthy, the rate grows by about `additive_increase` requests/sec every second;
+    on a throttling response (see `THROTTLE_STATUS_CODES`) or a timeout, it's multiplied by `multiplicative_decrease`.
+    Thus, each host is crawled at the highest rate it sustains, without tuning the number of worker threads.
+
+    A `Retry-After` header on a throttling response additionally holds off all requests to its host until then.
+
+    It's thread-safe, and can be shared across `SgRequests` instances, so that they're paced together.
+    """
+
+    THROTTLE_STATUS_CODES = frozenset({403, 429, 503})
+
+    DEFAULT_INITIAL_RATE = 2.0
+    DEFAULT_MIN_RATE = 0.2
+    DEFAULT_MAX_RATE = 50.0
+
+    def __init__(self,
+                 initial_rate: float = DEFAULT_INITIAL_RATE,
+                 min_rate: float = DEFAULT_MIN_RATE,
+                 max_rate: float = DEFAULT_MAX_RATE,
+                 additive_increase: float = 0.5,
+                 multiplicative_decrease: float = 0.5,
+                 decrease_cooldown_sec: float = 1.0):
+        """
+        :param initial_rate: The requests/sec each host starts out at.
+        :param min_rate: The requests/sec a host is never throttled below.
+        :param max_rate: The requests/sec a host is never ramped up above.
+        :param additive_increase: By how many requests/sec, roughly, the rate grows every second of healthy responses.
+        :param multiplicative_decrease: The factor by which the rate is cut on throttling.
+        :param decrease_cooldown_sec: Throttling within this long of the previous cut doesn't cut the rate again,
+                                      as it's most likely from requests sent before that cut.
+        """
+        if not 0 < multiplicative_decrease < 1:
+            raise ValueError(f"multiplicative_decrease must be between 0 and 1. Got: {multiplicative_decrease}")
+        if not 0 < min_rate <= initial_rate <= max_rate:
+            raise ValueError(f"Expected 0 < min_rate <= initial_rate <= max_rate. "
+                             f"Got: {min_rate}, {initial_rate}, {max_rate}")
+
+        self.__initial_rate = initial_rate
+        self.__min_rate = min_rate
+        self.__max_rate = max_rate
+        self.__additive_increase = additive_increase
+        self.__multiplicative_decrease = multiplicative_decrease
+        self.__decrease_cooldown_sec = decrease_cooldown_sec
+        self.__hosts: Dict[str, _HostRate] = {}
+        self.__lock = Lock()
+
+    def __host(self, host: str) -> _HostRate:
+        host_rate = self.__hosts.get(host)
+        if host_rate is None:
+            host_rate = self.__hosts[host] = _HostRate(rate=self.__initial_rate)
+        return host_rate
+
+    def reserve(self, host: str) -> float:
+        """
+        Reserves the next slot to send a request to the host in.
+
+        :return: How many seconds to wait before sending the request.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            host_rate = self.__host(host)
+            slot = max(now, host_rate.next_slot)
+            host_rate.next_slot = slot + 1 / host_rate.rate
+        return slot - now
+
+    def on_success(self, host: str) -> None:
+        with self.__lock:
+            host_rate = self.__host(host)
+            host_rate.rate = min(self.__max_rate, host_rate.rate + self.__additive_increase / host_rate.rate)
+
+    def on_throttled(self, host: str, retry_after_sec: Optional[float] = None) -> None:
+        now = time.monotonic()
+        with self.__lock:
+            host_rate = self.__host(host)
+            if now - host_rate.last_decrease >= self.__decrease_cooldown_sec:
+                host_rate.rate = max(self.__min_rate, host_rate.rate * self.__multiplicative_decrease)
+                host_rate.last_decrease = now
+            if retry_after_sec:
+                host_rate.next_slot = max(host_rate.next_slot, now + retry_after_sec)
+
+    def on_response(self, host: str, response: Response) -> None:
+        """
+        Adjusts the host's rate based on the response's status code.
+        """
+        if response.status_code in AimdRateLimiter.THROTTLE_STATUS_CODES:
+            self.on_throttled(host, AimdRateLimiter.retry_after_sec(response))
+        elif response.status_code < 500:
+            self.on_success(host)
+
+    def rate(self, host: str) -> float:
+        """
+        The host's current rate, in requests/sec.
+        """
+        with self.__lock:
+            return self.__host(host).rate
+
+    @staticmethod
+    def retry_after_sec(response: Response) -> Optional[float]:
+        """
+        Parses the `Retry-After` header, whether in seconds or an HTTP date; `None` if it's missing or invalid.
+        """
+        value = response.headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
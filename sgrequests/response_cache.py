@@ -0,0 +1,296 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from email.utils import formatdate
+from hashlib import blake2b
+from typing import Iterable, List, Optional, Tuple
+
+import httpx
+from httpx import Response
+from httpx._types import CookieTypes, HeaderTypes, QueryParamTypes
+
+from .single_flight import SingleFlight
+
+
+@dataclass(frozen=True)
+class ResponseCacheStats:
+    hits: int
+    revalidations: int
+    misses: int
+    stores: int
+    evictions: int
+    size_bytes: int
+
+    @property
+    def hit_ratio(self) -> float:
+        """
+        The share of lookups served from the cache, whether fresh or revalidated.
+        """
+        lookups = self.hits + self.revalidations + self.misses
+        return (self.hits + self.revalidations) / lookups if lookups else 0.0
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    key: str
+    url: str
+    status_code: int
+    headers: List[Tuple[str, str]]
+    content: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    expires_at: float
+
+    def is_fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+    def conditional_headers(self) -> List[Tuple[str, str]]:
+        """
+        The headers to revalidate the response with, if it's stale.
+        """
+        headers = []
+        if self.etag:
+            headers.append(('If-None-Match', self.etag))
+        if self.last_modified:
+            headers.append(('If-Modified-Since', self.last_modified))
+        return headers
+
+    def to_response(self, method: str = 'GET') -> Response:
+        return Response(self.status_code,
+                        headers=self.headers,
+                        content=self.content,
+                        request=httpx.Request(method, self.url))
+
+
+class ResponseCache:
+    """
+    An on-disk HTTP response cache, for `SgRequests`: responses are kept for a TTL (per URL pattern), and once stale,
+    revalidated with a conditional GET (`If-None-Match` / `If-Modified-Since`) when they have an `ETag` or a
+    `Last-Modified` header; a `304 Not Modified` then serves the cached copy, and renews its TTL.
+
+    Bodies are zlib-compressed, and content-addressed (by their blake2b digest), so identical bodies are stored once.
+    The index is a SQLite database in WAL mode, in `cache_dir`. Entries older than `max_age_sec` are evicted, as
+    are the least-recently-used ones, when the bodies exceed `max_size_bytes`.
+
+    Only `200 OK` responses to body-less GETs are cached (see `SingleFlight.request_fingerprint`), unless they're
+    marked `Cache-Control: no-store`. The request headers in `ignored_headers` (e.g. a rotating `User-Agent`) aren't
+    part of the cache key. It's thread-safe.
+    """
+
+    DEFAULT_TTL_SEC = 24 * 3600.0
+    DEFAULT_MAX_SIZE_BYTES = 1 << 30
+    DEFAULT_MAX_AGE_SEC = 7 * 24 * 3600.0
+    DEFAULT_COMPRESSION_LEVEL = 6
+    DEFAULT_IGNORED_HEADERS = frozenset({'user-agent', 'cache-control', 'pragma', 'if-none-match', 'if-modified-since'})
+
+    # the body is stored decoded, so these no longer apply to it.
+    __DROPPED_HEADERS = frozenset({'content-encoding', 'content-length', 'transfer-encoding', 'connection'})
+
+    def __init__(self,
+                 cache_dir: str,
+                 default_ttl_sec: float = DEFAULT_TTL_SEC,
+                 ttl_rules: Iterable[Tuple[str, float]] = (),
+                 max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES,
+                 max_age_sec: float = DEFAULT_MAX_AGE_SEC,
+                 compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+                 ignored_headers: Iterable[str] = DEFAULT_IGNORED_HEADERS):
+        """
+        :param cache_dir: Where to keep the cache; created if needed.
+        :param default_ttl_sec: How long a response is served without revalidation, unless a `ttl_rules` matches.
+        :param ttl_rules: `(url regex, ttl seconds)` pairs; the first whose regex matches (`re.search`) the URL applies.
+                          e.g. `[(r'/product/', 3 * 24 * 3600), (r'\\?page=', 3600)]`. A TTL of 0 always revalidates.
+        :param max_size_bytes: The most (compressed) body bytes to keep.
+        :param max_age_sec: The longest to keep a response, even if it keeps being revalidated.
+        :param compression_level: The zlib compression level of the bodies.
+        :param ignored_headers: The request headers (case-insensitive) that don't change the response.
+        """
+        self.__bodies_dir = os.path.join(cache_dir, 'bodies')
+        os.makedirs(self.__bodies_dir, exist_ok=True)
+        self.__default_ttl_sec = default_ttl_sec
+        self.__ttl_rules = [(re.compile(pattern), ttl_sec) for pattern, ttl_sec in ttl_rules]
+        self.__max_size_bytes = max_size_bytes
+        self.__max_age_sec = max_age_sec
+        self.__compression_level = compression_level
+        self.__ignored_headers = frozenset(name.lower() for name in ignored_headers)
+        self.__hits = 0
+        self.__revalidations = 0
+        self.__misses = 0
+        self.__stores = 0
+        self.__evictions = 0
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'),
+                                      isolation_level=None,
+                                      check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                            "key TEXT PRIMARY KEY, "
+                            "url TEXT NOT NULL, "
+                            "status_code INTEGER NOT NULL, "
+                            "headers TEXT NOT NULL, "
+                            "body_digest TEXT NOT NULL, "
+                            "etag TEXT, "
+                            "last_modified TEXT, "
+                            "stored_at REAL NOT NULL, "
+                            "expires_at REAL NOT NULL, "
+                            "last_access REAL NOT NULL)")
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS bodies ("
+                            "digest TEXT PRIMARY KEY, "
+                            "size INTEGER NOT NULL)")
+        with self.__lock:
+            self.__size_bytes = self.__conn.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+            self.__evict()
+
+    def ttl_sec(self, url: str) -> float:
+        for pattern, ttl_sec in self.__ttl_rules:
+            if pattern.search(url):
+                return ttl_sec
+        return self.__default_ttl_sec
+
+    def key(self,
+            url: str,
+            params: Optional[QueryParamTypes] = None,
+            headers: Optional[HeaderTypes] = None,
+            cookies: Optional[CookieTypes] = None) -> Optional[str]:
+        """
+        The cache key of a body-less GET; `None` if it's not cacheable (see `SingleFlight.request_fingerprint`).
+        """
+        headers = [(name, value) for name, value in httpx.Headers(headers).multi_items()
+                   if name.lower() not in self.__ignored_headers]
+        return SingleFlight.request_fingerprint('GET', url, params=params, headers=headers, cookies=cookies)
+
+    def __body_path(self, digest: str) -> str:
+        return os.path.join(self.__bodies_dir, digest[:2], digest + '.z')
+
+    def lookup(self, key: str) -> Optional[CachedResponse]:
+        """
+        The cached response, whether fresh or stale; a fresh one counts as a hit.
+        """
+        with self.__lock:
+            row = self.__conn.execute("SELECT url, status_code, headers, body_digest, etag, last_modified, "
+                                      "stored_at, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            url, status_code, headers, body_digest, etag, last_modified, stored_at, expires_at = row
+            try:
+                with open(self.__body_path(body_digest), 'rb') as body_file:
+                    content = zlib.decompress(body_file.read())
+            except (OSError, zlib.error):
+                self.__conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self.__conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            cached = CachedResponse(key=key,
+                                    url=url,
+                                    status_code=status_code,
+                                    headers=[tuple(header) for header in json.loads(headers)],
+                                    content=content,
+                                    etag=etag,
+                                    last_modified=last_modified,
+                                    stored_at=stored_at,
+                                    expires_at=expires_at)
+            if cached.is_fresh():
+                self.__hits += 1
+            return cached
+
+    def update(self, key: str, stale: Optional[CachedResponse], response: Response) -> Response:
+        """
+        Folds a response from the network into the cache: a `304` to a revalidation renews the `stale` entry,
+        and a `200` is stored.
+
+        :return: The response to use; that's the cached one for a `304`.
+        """
+        if stale is not None and response.status_code == httpx.codes.NOT_MODIFIED:
+            now = time.time()
+            etag = response.headers.get('etag', stale.etag)
+            with self.__lock:
+                self.__revalidations += 1
+                self.__conn.execute("UPDATE entries SET expires_at = ?, etag = ?, last_access = ? WHERE key = ?",
+                                    (now + self.ttl_sec(stale.url), etag, now, key))
+            return stale.to_response(response.request.method)
+
+        with self.__lock:
+            self.__misses += 1
+        if response.status_code == httpx.codes.OK and 'no-store' not in response.headers.get('cache-control', ''):
+            self.__store(key, response)
+        return response
+
+    def __store(self, key: str, response: Response) -> None:
+        content = response.content
+        digest = blake2b(content, digest_size=20).hexdigest()
+        headers = [(name, value) for name, value in response.headers.multi_items()
+                   if name.lower() not in ResponseCache.__DROPPED_HEADERS]
+        url = str(response.request.url)
+        now = time.time()
+        # e.g. for responses without a Last-Modified, revalidate with the time it was fetched.
+        last_modified = response.headers.get('last-modified') or formatdate(now, usegmt=True)
+
+        with self.__lock:
+            if not self.__conn.execute("SELECT 1 FROM bodies WHERE digest = ?", (digest,)).fetchone():
+                compressed = zlib.compress(content, self.__compression_level)
+                path = self.__body_path(digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.tmp', 'wb') as body_file:
+                    body_file.write(compressed)
+                os.replace(path + '.tmp', path)
+                self.__conn.execute("INSERT INTO bodies (digest, size) VALUES (?, ?)", (digest, len(compressed)))
+                self.__size_bytes += len(compressed)
+            self.__conn.execute("INSERT OR REPLACE INTO entries (key, url, status_code, headers, body_digest, etag, "
+                                "last_modified, stored_at, expires_at, last_access) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (key, url, response.status_code, json.dumps(headers), digest,
+                                 response.headers.get('etag'), last_modified, now, now + self.ttl_sec(url), now))
+            self.__stores += 1
+            if self.__size_bytes > self.__max_size_bytes:
+                self.__evict()
+
+    def __evict(self) -> None:
+        # Only call while holding the lock
+        evicted = self.__conn.execute("DELETE FROM entries WHERE stored_at < ?",
+                                      (time.time() - self.__max_age_sec,)).rowcount
+        self.__remove_orphan_bodies()
+        while self.__size_bytes > self.__max_size_bytes:
+            keys = [row[0] for row in self.__conn.execute("SELECT key FROM entries ORDER BY last_access LIMIT 100")]
+            if not keys:
+                break
+            self.__conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+            evicted += len(keys)
+            self.__remove_orphan_bodies()
+        self.__evictions += evicted
+
+    def __remove_orphan_bodies(self) -> None:
+        orphans = self.__conn.execute("SELECT digest, size FROM bodies "
+                                      "WHERE digest NOT IN (SELECT body_digest FROM entries)").fetchall()
+        for digest, size in orphans:
+            try:
+                os.remove(self.__body_path(digest))
+            except FileNotFoundError:
+                pass
+            self.__size_bytes -= size
+        self.__conn.executemany("DELETE FROM bodies WHERE digest = ?", [(digest,) for digest, _ in orphans])
+
+    def evict(self) -> None:
+        """
+        Evicts the entries older than `max_age_sec`, then the least-recently-used ones while over `max_size_bytes`.
+        """
+        with self.__lock:
+            self.__evict()
+
+    def stats(self) -> ResponseCacheStats:
+        with self.__lock:
+            return ResponseCacheStats(hits=self.__hits,
+                                      revalidations=self.__revalidations,
+                                      misses=self.__misses,
+                                      stores=self.__stores,
+                                      evictions=self.__evictions,
+                                      size_bytes=self.__size_bytes)
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__conn.close()
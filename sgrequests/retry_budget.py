@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List
+
+
+@dataclass(frozen=True)
+class RetryBudgetStats:
+    """
+    How much of a `RetryBudget` has been used; the `window_*` counts are over the last `window_sec`.
+    """
+    window_requests: int
+    window_retries: int
+    window_limit: int
+    total_requests: int
+    total_retries: int
+    total_denied_retries: int
+
+    @property
+    def utilization(self) -> float:
+        return self.window_retries / self.window_limit if self.window_limit else 1.0
+
+
+class RetryBudget:
+    """
+    Caps retries, across everything sharing the budget, at `ratio` of the requests made over a sliding window
+    (plus a floor of `min_retries_per_window`, so that a trickle of requests can still be retried).
+    Once it's spent, failing requests fail at once, rather than each tying up a worker in retries.
+
+    It's thread-safe; share one across `SgRequests` instances so that the budget is global.
+    """
+
+    DEFAULT_RATIO = 0.2
+    DEFAULT_MIN_RETRIES_PER_WINDOW = 10
+    DEFAULT_WINDOW_SEC = 60.0
+
+    def __init__(self,
+                 ratio: float = DEFAULT_RATIO,
+                 min_retries_per_window: int = DEFAULT_MIN_RETRIES_PER_WINDOW,
+                 window_sec: float = DEFAULT_WINDOW_SEC):
+        """
+        :param ratio: The retries allowed per request made within the window.
+        :param min_retries_per_window: The retries allowed within the window, however few requests are made.
+        :param window_sec: The span of the sliding window.
+        """
+        self.__ratio = ratio
+        self.__min_retries_per_window = min_retries_per_window
+        self.__window_sec = window_sec
+        self.__requests: Deque[float] = deque()
+        self.__retries: Deque[float] = deque()
+        self.__total_requests = 0
+        self.__total_retries = 0
+        self.__total_denied_retries = 0
+        self.__lock = threading.Lock()
+
+    def __expire(self, now: float) -> None:
+        horizon = now - self.__window_sec
+        for events in (self.__requests, self.__retries):
+            while events and events[0] <= horizon:
+                events.popleft()
+
+    def __limit(self) -> int:
+        return max(self.__min_retries_per_window, int(len(self.__requests) * self.__ratio))
+
+    def record_request(self) -> None:
+        """
+        Records a (first) attempt at a request, which earns `ratio` retries.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            self.__expire(now)
+            self.__requests.append(now)
+            self.__total_requests += 1
+
+    def try_acquire_retry(self) -> bool:
+        """
+        :return: Whether a retry may be made; if so, it's counted against the budget.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            self.__expire(now)
+            if len(self.__retries) >= self.__limit():
+                self.__total_denied_retries += 1
+                return False
+            self.__retries.append(now)
+            self.__total_retries += 1
+            return True
+
+    def stats(self) -> RetryBudgetStats:
+        with self.__lock:
+            self.__expire(time.monotonic())
+            return RetryBudgetStats(window_requests=len(self.__requests),
+                                    window_retries=len(self.__retries),
+                                    window_limit=self.__limit(),
+                                    total_requests=self.__total_requests,
+                                    total_retries=self.__total_retries,
+                                    total_denied_retries=self.__total_denied_retries)
+
+
+@dataclass
+class _HostCircuit:
+    consecutive_failures: int = 0
+    opened_at: float = 0.0
+    is_open: bool = False
+    trial_in_flight: bool = False
+    times_opened: int = 0
+
+
+class CircuitBreaker:
+    """
+    A per-host circuit breaker: after `failure_threshold` consecutive failures (connection errors, timeouts, 5XX
+    responses, or any other error an attempt ends with), a host's circuit opens, and requests to it fail fast for
+    `reset_timeout_sec`. Then, a single trial request is let through (half-open): if it succeeds, the circuit closes;
+    otherwise it stays open.
+
+    It's thread-safe, and can be shared across `SgRequests` instances.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    DEFAULT_FAILURE_THRESHOLD = 5
+    DEFAULT_RESET_TIMEOUT_SEC = 30.0
+
+    def __init__(self,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout_sec: float = DEFAULT_RESET_TIMEOUT_SEC):
+        """
+        :param failure_threshold: How many consecutive failures open a host's circuit.
+        :param reset_timeout_sec: How long an open circuit fails fast, before a trial request is let through.
+        """
+        self.__failure_threshold = failure_threshold
+        self.__reset_timeout_sec = reset_timeout_sec
+        self.__hosts: Dict[str, _HostCircuit] = {}
+        self.__lock = threading.Lock()
+
+    def __circuit(self, host: str) -> _HostCircuit:
+        circuit = self.__hosts.get(host)
+        if circuit is None:
+            circuit = self.__hosts[host] = _HostCircuit()
+        return circuit
+
+    def allow(self, host: str) -> bool:
+        """
+        :return: Whether a request to the host may be made now.
+        """
+        now = time.monotonic()
+        with self.__lock:
+            circuit = self.__circuit(host)
+            if not circuit.is_open:
+                return True
+            if circuit.trial_in_flight or now - circuit.opened_at < self.__reset_timeout_sec:
+                return False
+            circuit.trial_in_flight = True
+            return True
+
+    def record_success(self, host: str) -> None:
+        with self.__lock:
+            circuit = self.__circuit(host)
+            circuit.consecutive_failures = 0
+            circuit.is_open = False
+            circuit.trial_in_flight = False
+
+    def record_failure(self, host: str) -> None:
+        with self.__lock:
+            circuit = self.__circuit(host)
+            circuit.consecutive_failures += 1
+            if circuit.trial_in_flight or circuit.consecutive_failures >= self.__failure_threshold:
+                if not circuit.is_open:
+                    circuit.times_opened += 1
+                circuit.is_open = True
+                circuit.opened_at = time.monotonic()
+                circuit.trial_in_flight = False
+
+    def state(self, host: str) -> str:
+        now = time.monotonic()
+        with self.__lock:
+            circuit = self.__circuit(host)
+            if not circuit.is_open:
+                return CircuitBreaker.CLOSED
+            if circuit.trial_in_flight or now - circuit.opened_at >= self.__reset_timeout_sec:
+                return CircuitBreaker.HALF_OPEN
+            return CircuitBreaker.OPEN
+
+    def open_hosts(self) -> List[str]:
+        """
+        The hosts whose circuit is currently open (or half-open).
+        """
+        with self.__lock:
+            return [host for host, circuit in self.__hosts.items() if circuit.is_open]
+
+    def times_opened(self, host: str) -> int:
+        with self.__lock:
+            return self.__circuit(host).times_opened
@@ -1,20 +1,32 @@
+import asyncio
 import logging
 import os
 import re
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dataclasses import dataclass
-from threading import Lock
-from typing import Optional, Any, Coroutine, Callable, Union, Set
+from threading import Lock, Thread
+from typing import Optional, Any, Coroutine, Callable, Union, Set, List, Tuple, Dict
 
 import httpx
 from httpcore._sync import base as sync_base
 from httpcore._async import base as async_base
-from httpx import Timeout, RequestError, codes, Response, HTTPError, Request, HTTPStatusError
-from httpx._client import BaseClient
+from httpx import Timeout, RequestError, codes, Response, HTTPError, Request, HTTPStatusError, TimeoutException
+from httpx._client import BaseClient, USE_CLIENT_DEFAULT, UseClientDefault
 from httpx._types import RequestData, QueryParamTypes, HeaderTypes, CookieTypes, RequestFiles, VerifyTypes
 from sglogging import SgLogSetup
 from tenacity import stop_after_attempt, retry, retry_if_exception_type, before_sleep_log, wait_incrementing
 
-import random
+from .hedging import HedgePolicy, HedgeStats
+from .ip_discovery import PublicIpCache, StaticIpDiscovery
+from .latency import AdaptiveTimeouts
+from .proxy_pool import ProxyPool
+from .rate_control import AimdRateLimiter
+from .response_cache import CachedResponse, ResponseCache, ResponseCacheStats
+from .retry_budget import RetryBudget, RetryBudgetStats, CircuitBreaker
+from .single_flight import SingleFlight, SingleFlightStats
+from .traffic_archive import TrafficArchive, RecordingTransport, ReplayTransport
 
 @dataclass(frozen=True)
 class SgRequestError(Exception):
@@ -38,18 +50,26 @@ class CriticalSgRequestError(Exception):
     base_exception: SgRequestError
 
 
+def _retry_allowed(retry_state) -> bool:
+    """
+    A tenacity retry condition for `__retry_request_*(self, url, method, cmd)`, as per the `retry_budget` and `circuit_breaker`.
+    """
+    sg_requests, url = retry_state.args[0], retry_state.args[1]
+    return sg_requests._allow_retry(url)
+
+
 class SgRequestsBase:
     DEFAULT_RETRIES = 10
     DEFAULT_IP_ROTATION_RETRIES_BEHIND_PROXY = 10
     DEFAULT_TIMEOUT = Timeout(timeout=61, connect=61)
     DEFAULT_PROXY_URL = "http://groups-RESIDENTIAL,country-us:{}@proxy.apify.com:8000/"
     DEFAULT_DONT_RETRY_STATUS_CODES = frozenset(range(400, 600))
+    DEFAULT_MAX_POOLED_CLIENTS = 8
 
     STORM_PROXIES = [
         "http://5.79.73.131:13080",
     ]
 
-    _IP_ROTATION_MAX_RETRIES = 10
     __BANNED_IP_SET = set()
     _CONNECTION_RETRIES = 10
     __instance_id = 0
@@ -60,7 +80,19 @@ class SgRequestsBase:
     def __init__(self,
                  proxy_country: Optional[str] = None,
                  dont_retry_status_codes: Set[int] = DEFAULT_DONT_RETRY_STATUS_CODES,
-                 dont_retry_status_codes_exceptions: Set[int] = frozenset()):
+                 dont_retry_status_codes_exceptions: Set[int] = frozenset(),
+                 rate_limiter: Optional[AimdRateLimiter] = None,
+                 proxy_pool: Optional[ProxyPool] = None,
+                 max_pooled_clients: int = DEFAULT_MAX_POOLED_CLIENTS,
+                 public_ip_cache: Optional[PublicIpCache] = None,
+                 retry_budget: Optional[RetryBudget] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedge_policy: Optional[HedgePolicy] = None,
+                 adaptive_timeouts: Optional[AdaptiveTimeouts] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 record_traffic: Optional[TrafficArchive] = None,
+                 replay_traffic: Optional[ReplayTransport] = None):
         """
         Asynchronous SgRequests, backed by httpx, with proxy rotation and lots of customization.
 
@@ -68,14 +100,47 @@ class SgRequestsBase:
                               (`us` at the time of writing).
         :param dont_retry_status_codes: [SgRequestsAsync.DEFAULT_DONT_RETRY_STATUS_CODES] Skip retries for these status codes.
         :param dont_retry_status_codes_exceptions: Exceptions to `dont_retry_status_codes`. Defaults to an empty set.
+        :param rate_limiter: [None] Optionally, pace each request attempt per host, adapting to throttling.
+        :param proxy_pool: [ProxyPool.shared(STORM_PROXIES)] The health-scored pool to pick proxies from.
+        :param max_pooled_clients: How many per-proxy clients to keep open (see `_client_for`).
+        :param public_ip_cache: [PublicIpCache.shared()] Discovers each proxy session's public IP in the background.
+        :param retry_budget: [None] Optionally, cap retries (including proxy rotations) at a share of all requests.
+        :param circuit_breaker: [None] Optionally, fail fast on requests to hosts that keep failing.
+        :param hedge_policy: [None] Optionally, hedge slow requests with a duplicate through another proxy.
+        :param adaptive_timeouts: [None] Optionally, derive each request's timeout from its host's observed latencies.
+        :param single_flight: [None] Optionally, have concurrent identical GETs share a single request.
+        :param response_cache: [None] Optionally, serve GETs from an on-disk cache, revalidating stale responses.
+        :param record_traffic: [None] Optionally, record every exchange with the network into an archive.
+        :param replay_traffic: [None] Optionally, serve recorded exchanges instead of going to the network.
         """
         self.__behind_proxy: bool = True
+        self.__rate_limiter = rate_limiter
+        self.__retry_budget = retry_budget
+        self.__circuit_breaker = circuit_breaker
+        self.__hedge_policy = hedge_policy
+        self.__adaptive_timeouts = adaptive_timeouts
+        self.__single_flight = single_flight
+        self.__response_cache = response_cache
+        if record_traffic and replay_traffic:
+            raise ValueError("Can't both record and replay traffic.")
+        self.__record_traffic = record_traffic
+        self.__replay_traffic = replay_traffic
+        self.__proxy_pool = proxy_pool or ProxyPool.shared(self.STORM_PROXIES)
+        self.__proxy: Optional[str] = None
         self.__proxy_country = proxy_country
         self.__dont_retry_status_codes = set.difference(set(dont_retry_status_codes),
                                                         set(dont_retry_status_codes_exceptions))
 
         self._session: Union[httpx.AsyncClient, httpx.Client, None] = None
-        self.__ip = None
+        self.__max_pooled_clients = max(1, max_pooled_clients)
+        self.__clients: 'OrderedDict[Optional[str], BaseClient]' = OrderedDict()  # proxy url -> client, LRU last
+        self.__clients_lock = Lock()
+        self.__clients_in_use: Dict[BaseClient, int] = {}  # client -> how many sends are using it
+        self.__retired_clients: List[BaseClient] = []  # removed from the pool, but still in use
+        if public_ip_cache is None and replay_traffic:
+            public_ip_cache = PublicIpCache(StaticIpDiscovery('127.0.0.1'))
+        self.__ip_cache = public_ip_cache or PublicIpCache.shared()
+        self.__ip_future: Optional['Future[Optional[str]]'] = None
         SgRequestsBase.__instance_id += 1
         self._log = SgLogSetup().get_logger(logger_name=f'sgrequests{SgRequestsBase.__instance_id}')
 
@@ -85,12 +150,102 @@ class SgRequestsBase:
     def _client(self) -> Union[httpx.AsyncClient, httpx.Client, None]:
         return self._session
 
+    def _client_for(self, proxy_url: Optional[str], checkout: bool = False) -> Tuple[BaseClient, List[BaseClient]]:
+        """
+        The pooled client for the proxy url, made if needed; rotating back to a proxy thus reuses its client,
+        and its warm (keep-alive / HTTP/2) connections.
+
+        :param checkout: Whether to mark the client as in use, as `_checkout` does.
+        :return: The client, and the least-recently-used clients evicted to stay within `max_pooled_clients`,
+                 which the caller should close.
+        """
+        with self.__clients_lock:
+            client = self.__clients.get(proxy_url)
+            if client is None:
+                client = self.__clients[proxy_url] = self._mk_client(proxy_url=proxy_url)
+            self.__clients.move_to_end(proxy_url)
+            if checkout:
+                self.__clients_in_use[client] = self.__clients_in_use.get(client, 0) + 1
+            evicted = []
+            for evicted_proxy_url in list(self.__clients):
+                if len(self.__clients) <= self.__max_pooled_clients:
+                    break
+                if evicted_proxy_url == proxy_url or self.__clients[evicted_proxy_url] is self._session:
+                    continue  # still in use
+                evicted.extend(self.__retire(self.__clients.pop(evicted_proxy_url)))
+                self.__ip_cache.invalidate(evicted_proxy_url)
+            return client, evicted
+
+    def __retire(self, client: BaseClient) -> List[BaseClient]:
+        """
+        A client just removed from the pool: to be closed right away, unless it's still in use (see `_checkin`).
+        Must be called with the `__clients_lock` held.
+        """
+        if self.__clients_in_use.get(client):
+            self.__retired_clients.append(client)
+            return []
+        return [client]
+
+    def _retire_client(self, proxy_url: Optional[str]) -> List[BaseClient]:
+        """
+        Removes the proxy's client from the pool, so that the next `_client_for` makes a new one, with new connections;
+        e.g. when its session is banned, since rotating back to the same proxy would otherwise reuse the banned session.
+
+        :return: The client, if it isn't in use, which the caller should close; otherwise, it's closed on `_checkin`.
+        """
+        self.__ip_cache.invalidate(proxy_url)  # the new session may well have another IP
+        with self.__clients_lock:
+            client = self.__clients.pop(proxy_url, None)
+            return self.__retire(client) if client is not None else []
+
+    def _checkout(self) -> Tuple[BaseClient, Optional[str]]:
+        """
+        The current client, and the proxy it goes through; it's marked as in use, so that it's not closed while
+        sending, should it be retired meanwhile by another request. Every checkout must be matched by a `_checkin`.
+        """
+        with self.__clients_lock:
+            client = self._session
+            self.__clients_in_use[client] = self.__clients_in_use.get(client, 0) + 1
+            return client, self._current_proxy()
+
+    def _checkin(self, client: BaseClient) -> List[BaseClient]:
+        """
+        Marks a send through the (checked-out) client as done.
+
+        :return: The client, if it was retired while in use, and isn't anymore, which the caller should close.
+        """
+        with self.__clients_lock:
+            in_use = self.__clients_in_use.get(client, 0) - 1
+            if in_use > 0:
+                self.__clients_in_use[client] = in_use
+                return []
+            self.__clients_in_use.pop(client, None)
+            if client in self.__retired_clients:
+                self.__retired_clients.remove(client)
+                return [client]
+            return []
+
+    def _drain_clients(self) -> List[BaseClient]:
+        """
+        Removes all pooled clients, and the retired ones still in use, returning them to be closed.
+        """
+        with self.__clients_lock:
+            clients = list(self.__clients.values()) + self.__retired_clients
+            self.__clients.clear()
+            self.__retired_clients = []
+            self._session = None
+            return clients
+
+    def _current_proxy(self) -> Optional[str]:
+        return self.__proxy if self._behind_proxy() else None
+
     # custom
-    def _get_random_proxy(self) -> str:
-        return random.choice(self.STORM_PROXIES)
+    def _get_proxy(self) -> str:
+        self.__proxy = self.__proxy_pool.acquire()
+        return self.__proxy
 
     def _mk_proxy_url(self) -> str:
-        return self._get_random_proxy()
+        return self._get_proxy()
 
         proxy_password = os.environ["PROXY_PASSWORD"]
         url = os.environ["PROXY_URL"] if 'PROXY_URL' in os.environ else self.DEFAULT_PROXY_URL
@@ -102,13 +257,229 @@ class SgRequestsBase:
         proxy_url = url.format(proxy_password)
         return proxy_url
 
-    def _get_public_ip(self) -> Optional[str]:
-        try:
-            return httpx.get('https://jsonip.com/').json()['ip']
-        except:
-            # TODO - try another service; e.g. "ipify"
-            self._log.warning('Non-critical: Unable to fetch public IP. Proceeding without.')
+    @staticmethod
+    def _host_of(url: str) -> str:
+        return httpx.URL(url).host
+
+    def _pacing_delay(self, url: str) -> float:
+        """
+        How many seconds to wait before the next attempt at a request to the url, as per the `rate_limiter`.
+        """
+        return self.__rate_limiter.reserve(self._host_of(url)) if self.__rate_limiter else 0.0
+
+    def _start_request(self, url: str, is_retry: bool) -> Optional[SgRequestError]:
+        """
+        Records a request with the `retry_budget`, unless it's a retry.
+
+        :return: An error to fail fast with, if the host's circuit is open; otherwise `None`.
+        """
+        if not is_retry and self.__retry_budget:
+            self.__retry_budget.record_request()
+        if self.__circuit_breaker and not self.__circuit_breaker.allow(self._host_of(url)):
+            return SgRequestError(message=f'Circuit open for host [{self._host_of(url)}]; failing fast.')
+        return None
+
+    def _allow_retry(self, url: str) -> bool:
+        """
+        Whether a failed request to the url may be retried, as per the `circuit_breaker` and the `retry_budget`.
+        """
+        if self.__circuit_breaker and not self.__circuit_breaker.allow(self._host_of(url)):
+            return False
+        return not self.__retry_budget or self.__retry_budget.try_acquire_retry()
+
+    def _timeout_for(self, url: str, method: str) -> Union[Timeout, UseClientDefault]:
+        """
+        The timeout for a request, as per the `adaptive_timeouts`; otherwise, the client's own.
+        """
+        if not self.__adaptive_timeouts:
+            return USE_CLIENT_DEFAULT
+        timeout_sec = self.__adaptive_timeouts.timeout_sec(self._host_of(url), method)
+        return Timeout(timeout_sec) if timeout_sec is not None else USE_CLIENT_DEFAULT
+
+    def _hedge_delay(self, url: str, method: str) -> Optional[float]:
+        """
+        How long to wait on an attempt at a request before hedging it, as per the `hedge_policy`; `None` not to hedge.
+        """
+        return self.__hedge_policy.hedge_delay(self._host_of(url), method) if self.__hedge_policy else None
+
+    def _try_hedge(self, proxy: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Whether a hedge may be sent (see `HedgePolicy.try_acquire_hedge`); if so, the proxy to send it through
+        (`None` when not behind a proxy). Behind a proxy, it's not sent unless there's another healthy one:
+        a duplicate through the same proxy would only add to its load.
+
+        :param proxy: The proxy the request being hedged went through.
+        :return: A `(may_hedge, proxy)` tuple.
+        """
+        if not self.__hedge_policy:
+            return False, None
+        hedge_proxy = None
+        if self._behind_proxy():
+            hedge_proxy = self.__proxy_pool.acquire(exclude=proxy)
+            if hedge_proxy == proxy:
+                return False, None
+        if not self.__hedge_policy.try_acquire_hedge():
+            return False, None
+        return True, hedge_proxy
+
+    def _record_hedge_win(self):
+        self.__hedge_policy.record_hedge_win()
+
+    def _hedge_workers(self) -> int:
+        return self.__hedge_policy.max_workers if self.__hedge_policy else 1
+
+    def hedge_stats(self) -> Optional[HedgeStats]:
+        """
+        How many requests were hedged, and how many hedges won, if there is a `hedge_policy`.
+        """
+        return self.__hedge_policy.stats() if self.__hedge_policy else None
+
+    def _single_flight_key(self,
+                           method: str,
+                           url: str,
+                           data: Optional[RequestData],
+                           params: Optional[QueryParamTypes],
+                           headers: Optional[HeaderTypes],
+                           cookies: Optional[CookieTypes],
+                           files: Optional[RequestFiles],
+                           json: Any) -> Optional[str]:
+        """
+        The key to coalesce the request on, with the `single_flight`; `None` if it's not to be coalesced.
+        """
+        if not self.__single_flight or data is not None or files is not None or json is not None:
             return None
+        return SingleFlight.request_fingerprint(method, url, params=params, headers=headers, cookies=cookies)
+
+    def _single_flight(self) -> Optional[SingleFlight]:
+        return self.__single_flight
+
+    def single_flight_stats(self) -> Optional[SingleFlightStats]:
+        """
+        How many requests were coalesced (`followers`) into another in-flight one, if there is a `single_flight`.
+        """
+        return self.__single_flight.stats() if self.__single_flight else None
+
+    def _cache_lookup(self,
+                      method: str,
+                      url: str,
+                      data: Optional[RequestData],
+                      params: Optional[QueryParamTypes],
+                      headers: Optional[HeaderTypes],
+                      cookies: Optional[CookieTypes],
+                      files: Optional[RequestFiles],
+                      json: Any) -> Tuple[Optional[str], Optional[CachedResponse]]:
+        """
+        Looks the request up in the `response_cache`, if it's a body-less GET.
+
+        :return: The request's cache key (`None` if it's not cacheable), and its cached response, if any.
+        """
+        if not self.__response_cache or method.upper() != 'GET' \
+                or data is not None or files is not None or json is not None:
+            return None, None
+        key = self.__response_cache.key(url, params=params, headers=headers, cookies=cookies)
+        return key, (self.__response_cache.lookup(key) if key else None)
+
+    @staticmethod
+    def _revalidation_headers(headers: Optional[HeaderTypes],
+                              cached: Optional[CachedResponse]) -> Optional[HeaderTypes]:
+        """
+        The request's headers, plus the conditional ones to revalidate a stale `cached` response with.
+        """
+        if cached is None:
+            return headers
+        conditional = httpx.Headers(headers)
+        for name, value in cached.conditional_headers():
+            conditional[name] = value
+        return conditional
+
+    def _cache_update(self,
+                      key: Optional[str],
+                      cached: Optional[CachedResponse],
+                      result: Union[Response, SgRequestError]) -> Union[Response, SgRequestError]:
+        """
+        Folds the result into the `response_cache`; for a `304` to a revalidation, that's the cached response.
+        """
+        if key is None or not isinstance(result, Response):
+            return result
+        return self.__response_cache.update(key, cached, result)
+
+    def _replay_transport(self) -> Optional[ReplayTransport]:
+        return self.__replay_traffic
+
+    def _recording(self) -> bool:
+        return self.__record_traffic is not None
+
+    def _recorded(self, transport):
+        """
+        The transport, recording into the `record_traffic` archive, if there is one.
+        """
+        return RecordingTransport(transport, self.__record_traffic) if self.__record_traffic else transport
+
+    def response_cache_stats(self) -> Optional[ResponseCacheStats]:
+        """
+        How many requests were served from the `response_cache`, whether fresh or revalidated, if there is one.
+        """
+        return self.__response_cache.stats() if self.__response_cache else None
+
+    def retry_budget_stats(self) -> Optional[RetryBudgetStats]:
+        """
+        How much of the `retry_budget` is used, if there is one.
+        """
+        return self.__retry_budget.stats() if self.__retry_budget else None
+
+    def _on_attempt_result(self,
+                           url: str,
+                           elapsed_sec: float,
+                           response: Optional[Response] = None,
+                           error: Optional[BaseException] = None):
+        """
+        Feeds the outcome of an attempt at a request to the url (either a `response`, or an `error`)
+        to the `rate_limiter` and the `circuit_breaker`.
+
+        Any `error` counts as a failure for the circuit, including a cancellation, so that an attempt
+        that was the half-open trial always releases it.
+        """
+        if self.__circuit_breaker:
+            if response is not None and response.status_code < 500:
+                self.__circuit_breaker.record_success(self._host_of(url))
+            else:
+                self.__circuit_breaker.record_failure(self._host_of(url))
+
+        if self.__rate_limiter:
+            if response is not None:
+                self.__rate_limiter.on_response(self._host_of(url), response)
+            elif isinstance(error, TimeoutException):
+                self.__rate_limiter.on_throttled(self._host_of(url))
+
+    def _on_send_result(self,
+                        url: str,
+                        method: str,
+                        proxy: Optional[str],
+                        elapsed_sec: float,
+                        response: Optional[Response] = None,
+                        error: Optional[Exception] = None,
+                        is_hedge: bool = False):
+        """
+        Feeds the outcome of a single send of a request (an attempt sends it once, or twice if hedged) to the
+        `proxy_pool`, for the proxy it went through, and its latency to the `hedge_policy` and `adaptive_timeouts`.
+        """
+        if self.__adaptive_timeouts:
+            if response is not None and response.status_code < 500:
+                self.__adaptive_timeouts.record(self._host_of(url), method, elapsed_sec)
+            elif isinstance(error, TimeoutException):
+                self.__adaptive_timeouts.record_timeout(self._host_of(url), method, elapsed_sec)
+
+        if proxy:
+            if response is None or response.status_code >= 500:
+                self.__proxy_pool.report_failure(proxy)
+            elif response.status_code in AimdRateLimiter.THROTTLE_STATUS_CODES:
+                self.__proxy_pool.report_failure(proxy, banned=True)
+            else:
+                self.__proxy_pool.report_success(proxy, elapsed_sec)
+
+        # hedges are sent late, and only when they're likely to win; their latencies would skew the quantiles.
+        if self.__hedge_policy and not is_hedge and response is not None and response.status_code < 500:
+            self.__hedge_policy.latency.record(self._host_of(url), elapsed_sec)
 
     def _analyze_resp_status(self, response: Response) -> Response:
         if response.status_code in self.__dont_retry_status_codes:
@@ -127,30 +498,61 @@ class SgRequestsBase:
         else:
             return response
 
-    def _refresh_ip(self):
-        with SgRequestsBase._ip_refresh_lock:
-            self.__ip = self.__get_fresh_ip_recur()
+    def _refresh_ip(self, proxy_url: Optional[str]):
+        """
+        Starts discovering the public IP of the proxy session in the background, if it isn't cached already;
+        it never blocks. Should the IP turn out to be banned, the proxy is deprioritized in the `proxy_pool`.
+        """
+        proxy = self.__proxy
+        self.__ip_future = self.__ip_cache.lookup(proxy_url)
+        self.__ip_future.add_done_callback(lambda future: self.__on_ip_discovered(proxy, future))
 
-    def __get_fresh_ip_recur(self, retries=0):
-        public_ip = self._get_public_ip()
-        is_banned = public_ip in SgRequestsBase.__BANNED_IP_SET
-        if is_banned and retries < SgRequestsBase._IP_ROTATION_MAX_RETRIES:
-            return self.__get_fresh_ip_recur(retries=retries+1)
+    @staticmethod
+    def __discovered_ip(future: 'Future[Optional[str]]') -> Optional[str]:
+        return future.result() if future.exception() is None else None
+
+    def __on_ip_discovered(self, proxy: Optional[str], future: 'Future[Optional[str]]'):
+        public_ip = self.__discovered_ip(future)
+        if not public_ip:
+            self._log.info('Refreshed public IP [< unable to determine >]')
+            return
+        with SgRequestsBase._ip_refresh_lock:
+            is_banned = public_ip in SgRequestsBase.__BANNED_IP_SET
+        if is_banned and proxy:
+            self._log.info(f'Proxy session is on banned IP [{public_ip}]; deprioritizing its proxy.')
+            self.__proxy_pool.report_failure(proxy, banned=True)
         else:
-            if is_banned:
-                self._log.info(f'Exhausted all retries; proceeding with banned IP [{public_ip}]')
-            else:
-                if public_ip:
-                    self._log.info(f'Refreshed public IP [{public_ip}]')
-                else:
-                    self._log.info('Refreshed public IP [< unable to determine >]')
-            return public_ip
+            self._log.info(f'Refreshed public IP [{public_ip}]')
 
     def _ban_ip(self):
-        with SgRequestsBase._ip_refresh_lock:
-            if self.__ip:
-                self._log.info(f"Banning IP address: {self.__ip}")
-                self.__BANNED_IP_SET.add(self.__ip)
+        """
+        Bans the proxy session's public IP, as soon as it's discovered; and forgets it, so that the proxy's next session
+        discovers its own IP, rather than being taken for the banned one.
+        """
+        if self.__ip_future:
+            self.__ip_future.add_done_callback(self.__ban_discovered_ip)
+        self.__ip_cache.invalidate(self._current_proxy())
+
+    def __ban_discovered_ip(self, future: 'Future[Optional[str]]'):
+        public_ip = self.__discovered_ip(future)
+        if public_ip:
+            with SgRequestsBase._ip_refresh_lock:
+                self._log.info(f"Banning IP address: {public_ip}")
+                self.__BANNED_IP_SET.add(public_ip)
+
+    def my_public_ip(self, wait_sec: float = 0.0) -> Optional[str]:
+        """
+        The public IP of the current proxy session, if it's been discovered; `None` otherwise,
+        including when the discovery failed.
+
+        :param wait_sec: How long to wait for an ongoing discovery.
+        """
+        if not self.__ip_future:
+            return None
+        try:
+            return self.__ip_future.result(timeout=wait_sec)
+        except Exception:
+            return None
 
     @staticmethod
     def raise_on_err(result: Union[Response, SgRequestError]) -> Response:
@@ -191,7 +593,19 @@ class SgRequestsAsync(SgRequestsBase):
                  dont_retry_status_codes_exceptions: Set[int] = frozenset(),
                  timeout_config: Timeout = SgRequestsBase.DEFAULT_TIMEOUT,
                  retries_with_fresh_proxy_ip: int = SgRequestsBase.DEFAULT_IP_ROTATION_RETRIES_BEHIND_PROXY,
-                 verify_ssl: VerifyTypes = True):
+                 verify_ssl: VerifyTypes = True,
+                 rate_limiter: Optional[AimdRateLimiter] = None,
+                 proxy_pool: Optional[ProxyPool] = None,
+                 max_pooled_clients: int = SgRequestsBase.DEFAULT_MAX_POOLED_CLIENTS,
+                 public_ip_cache: Optional[PublicIpCache] = None,
+                 retry_budget: Optional[RetryBudget] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedge_policy: Optional[HedgePolicy] = None,
+                 adaptive_timeouts: Optional[AdaptiveTimeouts] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 record_traffic: Optional[TrafficArchive] = None,
+                 replay_traffic: Optional[ReplayTransport] = None):
         """
         Asynchronous SgRequests, backed by httpx, with proxy rotation and lots of customization.
 
@@ -202,6 +616,34 @@ class SgRequestsAsync(SgRequestsBase):
         :param timeout_config: [SgRequestsAsync.DEFAULT_TIMEOUT] HTTP timeout configuration. See `httpx`'s Timeout object.
         :param retries_with_fresh_proxy_ip: How many times to rotate proxy IPs on errors, for each request errors before giving up?
         :param verify_ssl: See [https://www.python-httpx.org/advanced/] for the `SSL certificates` section
+        :param rate_limiter: [None] Optionally, pace each request attempt per host, adapting to throttling;
+                             e.g. `AimdRateLimiter()`. Share one across instances to pace them together.
+        :param proxy_pool: [ProxyPool.shared(STORM_PROXIES)] The health-scored pool to pick proxies from.
+        :param max_pooled_clients: [8] How many per-proxy clients to keep open. Rotating proxies switches between
+                                   pooled clients rather than closing the current one, so their connections stay warm.
+        :param public_ip_cache: [PublicIpCache.shared()] Discovers each proxy session's public IP in the background;
+                                pass e.g. `PublicIpCache(StaticIpDiscovery('127.0.0.1'))` to stay offline in tests.
+        :param retry_budget: [None] Optionally, cap retries (including proxy rotations) at a share of all requests;
+                             e.g. `RetryBudget()`. Share one across instances to make it global.
+        :param circuit_breaker: [None] Optionally, fail fast on requests to hosts that keep failing;
+                                e.g. `CircuitBreaker()`.
+        :param hedge_policy: [None] Optionally, when a request is slower than its host's observed p95 latency,
+                             send a duplicate through another proxy, and use whichever answers first;
+                             e.g. `HedgePolicy()`. The policy caps the extra load.
+        :param adaptive_timeouts: [None] Optionally, derive each request's timeout from the latencies observed for its
+                                  host and method (e.g. their p99 x 3, between 5 and 61 seconds), rather than
+                                  always using `timeout_config`; e.g. `AdaptiveTimeouts()`.
+        :param single_flight: [None] Optionally, have concurrent identical GET/HEAD requests (as per
+                              `SingleFlight.request_fingerprint`) share a single request, and its response;
+                              e.g. `SingleFlight()`.
+        :param response_cache: [None] Optionally, serve body-less GETs from an on-disk cache while fresh (as per its
+                               TTLs), and revalidate stale ones with a conditional GET, reusing them on a `304`;
+                               e.g. `ResponseCache('cache/http')`.
+        :param record_traffic: [None] Optionally, record each request that goes to the network, and its response,
+                               into a JSONL archive; e.g. `TrafficArchive('/tmp/traffic.jsonl')`.
+        :param replay_traffic: [None] Optionally, serve the responses of a recorded archive, with no network at all;
+                               e.g. `ReplayTransport(TrafficArchive('/tmp/traffic.jsonl'))`. Proxies are then unused,
+                               and public IPs aren't looked up. Can't be combined with `record_traffic`.
         """
         self.__timeout = timeout_config
         self.__retries_with_proxy_rotation = retries_with_fresh_proxy_ip
@@ -209,7 +651,19 @@ class SgRequestsAsync(SgRequestsBase):
 
         super(SgRequestsAsync, self).__init__(proxy_country=proxy_country,
                                               dont_retry_status_codes=dont_retry_status_codes,
-                                              dont_retry_status_codes_exceptions=dont_retry_status_codes_exceptions)
+                                              dont_retry_status_codes_exceptions=dont_retry_status_codes_exceptions,
+                                              rate_limiter=rate_limiter,
+                                              proxy_pool=proxy_pool,
+                                              max_pooled_clients=max_pooled_clients,
+                                              public_ip_cache=public_ip_cache,
+                                              retry_budget=retry_budget,
+                                              circuit_breaker=circuit_breaker,
+                                              hedge_policy=hedge_policy,
+                                              adaptive_timeouts=adaptive_timeouts,
+                                              single_flight=single_flight,
+                                              response_cache=response_cache,
+                                              record_traffic=record_traffic,
+                                              replay_traffic=replay_traffic)
 
     async def __aenter__(self):
         await self.__refresh_client()
@@ -219,35 +673,108 @@ class SgRequestsAsync(SgRequestsBase):
         await self.__aclose()
 
     async def __refresh_client(self):
-        await self.__aclose()
         proxy_url = None
         if self._behind_proxy():
-            self._refresh_ip()
             proxy_url = self._mk_proxy_url()
+            self._refresh_ip(proxy_url)
 
-        self._session = self._mk_client(proxy_url=proxy_url)
+        self._session, evicted = self._client_for(proxy_url)
+        for client in evicted:
+            await client.aclose()
 
     async def __execute_http_async(self,
-                                   cmd: Callable[[], Coroutine[Any, Any, Response]],
+                                   url: str,
+                                   method: str,
+                                   cmd: Callable[..., Coroutine[Any, Any, Response]],
                                    proxy_retries=0) -> Union[Response, SgRequestError]:
+        circuit_open = self._start_request(url, is_retry=proxy_retries > 0)
+        if circuit_open:
+            return circuit_open
         try:
-            return await self.__retry_request_async(cmd)
+            return await self.__retry_request_async(url, method, cmd)
         except Exception as e:
             result = await self.__interpret_resp_errors(e=e, proxy_retries=proxy_retries)
             if isinstance(result, bool):
-                return await self.__execute_http_async(cmd, proxy_retries=proxy_retries+1)
+                return await self.__execute_http_async(url, method, cmd, proxy_retries=proxy_retries+1)
             else:
                 return result
 
-    @retry(retry=(retry_if_exception_type(RequestError) | retry_if_exception_type(HTTPStatusError) | retry_if_exception_type(async_base.NewConnectionRequired)),
+    @retry(retry=(retry_if_exception_type(RequestError) | retry_if_exception_type(HTTPStatusError) | retry_if_exception_type(async_base.NewConnectionRequired)) & _retry_allowed,
            reraise=True,
            stop=stop_after_attempt(SgRequestsBase.DEFAULT_RETRIES),
            wait=wait_incrementing(start=1, increment=3, max=31),
            before_sleep=before_sleep_log(SgRequestsBase._main_logger, logging.WARNING))
-    async def __retry_request_async(self, cmd: Callable[[], Coroutine[Any, Any, Response]]) -> Response:
-        response = await cmd()
+    async def __retry_request_async(self,
+                                    url: str,
+                                    method: str,
+                                    cmd: Callable[..., Coroutine[Any, Any, Response]]) -> Response:
+        delay = self._pacing_delay(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        started = time.monotonic()
+        try:
+            response = await self.__send_hedged_async(url, method, cmd)
+        except BaseException as e:
+            self._on_attempt_result(url, time.monotonic() - started, error=e)
+            raise
+        self._on_attempt_result(url, time.monotonic() - started, response=response)
         return self._analyze_resp_status(response)
 
+    async def __send_async(self,
+                           url: str,
+                           method: str,
+                           client: BaseClient,
+                           proxy: Optional[str],
+                           cmd: Callable[..., Coroutine[Any, Any, Response]],
+                           is_hedge: bool = False) -> Response:
+        timeout = self._timeout_for(url, method)
+        started = time.monotonic()
+        try:
+            response = await cmd(client, timeout)
+        except Exception as e:
+            self._on_send_result(url, method, proxy, time.monotonic() - started, error=e, is_hedge=is_hedge)
+            raise
+        finally:
+            for retired in self._checkin(client):
+                await retired.aclose()
+        self._on_send_result(url, method, proxy, time.monotonic() - started, response=response, is_hedge=is_hedge)
+        return response
+
+    async def __send_hedged_async(self,
+                                  url: str,
+                                  method: str,
+                                  cmd: Callable[..., Coroutine[Any, Any, Response]]) -> Response:
+        """
+        Sends the request; if it's slow to answer, as per the `hedge_policy`, sends a duplicate through another proxy
+        (if there's another), and returns whichever answers first, cancelling the other.
+        """
+        client, proxy = self._checkout()
+        hedge_delay = self._hedge_delay(url, method)
+        if hedge_delay is None:
+            return await self.__send_async(url, method, client, proxy, cmd)
+
+        primary = asyncio.ensure_future(self.__send_async(url, method, client, proxy, cmd))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        may_hedge, hedge_proxy = (False, None) if done else self._try_hedge(proxy)
+        if not may_hedge:
+            return await primary
+
+        hedge_client, evicted = self._client_for(hedge_proxy, checkout=True)
+        for evicted_client in evicted:
+            await evicted_client.aclose()
+        hedge = asyncio.ensure_future(self.__send_async(url, method, hedge_client, hedge_proxy, cmd, is_hedge=True))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is hedge:
+                        self._record_hedge_win()
+                    return task.result()
+        return primary.result()  # both failed
+
     async def __interpret_resp_errors(self, e: Exception, proxy_retries: int) -> Union[Response, SgRequestError, bool]:
         if isinstance(e, HTTPStatusError):
             request, response = e.request, e.response
@@ -255,9 +782,11 @@ class SgRequestsAsync(SgRequestsBase):
             if self._behind_proxy():
                 self._ban_ip()
 
-                if proxy_retries <= self.__retries_with_proxy_rotation:
+                if proxy_retries <= self.__retries_with_proxy_rotation and self._allow_retry(str(request.url)):
                     self._log.info(f"Request failed with status: [{response.status_code}]. "
                                     "Rotating IPs to rule out IP blocking.")
+                    for banned in self._retire_client(self._current_proxy()):
+                        await banned.aclose()
                     await self.__refresh_client()
                     return True
                 else:
@@ -302,16 +831,28 @@ class SgRequestsAsync(SgRequestsBase):
         A near-complete subset of httpx.request(...).
         Throws an `SgRequestError` in the case the result isn't in the 2XX range.
         """
-        return await self.__execute_http_async(
-            lambda: self._client().request(method=method,
-                                           url=url,
-                                           data=data,
-                                           params=params,
-                                           headers=headers,
-                                           cookies=cookies,
-                                           files=files,
-                                           json=json,
-                                           allow_redirects=True))
+        cache_key, cached = self._cache_lookup(method, url, data, params, headers, cookies, files, json)
+        if cached and cached.is_fresh():
+            return cached.to_response(method)
+        headers = self._revalidation_headers(headers, cached)
+
+        key = self._single_flight_key(method, url, data, params, headers, cookies, files, json)
+
+        async def execute():
+            return self._cache_update(cache_key, cached, await self.__execute_http_async(
+                url,
+                method,
+                lambda client, timeout: client.request(method=method,
+                                                       url=url,
+                                                       data=data,
+                                                       params=params,
+                                                       headers=headers,
+                                                       cookies=cookies,
+                                                       files=files,
+                                                       json=json,
+                                                       allow_redirects=True,
+                                                       timeout=timeout)))
+        return await (execute() if key is None else self._single_flight().do_async(key, execute))
 
     async def get(self,
                   url: str,
@@ -403,32 +944,30 @@ class SgRequestsAsync(SgRequestsBase):
         await self.__refresh_client()
 
     def _mk_client(self, proxy_url: Optional[str]) -> BaseClient:
-        return httpx.AsyncClient(proxies=proxy_url,
+        if self._replay_transport():
+            return httpx.AsyncClient(trust_env=False, timeout=self.__timeout, transport=self._replay_transport())
+        # when recording, the proxy goes on the recorded transport; a separate proxy transport would bypass it.
+        recording = self._recording()
+        return httpx.AsyncClient(proxies=None if recording else proxy_url,
                                  trust_env=False,
                                  timeout=self.__timeout,
                                  verify=self.__verify_ssl,
-                                 transport=httpx.AsyncHTTPTransport(retries=SgRequestsBase._CONNECTION_RETRIES,
-                                                                    verify=self.__verify_ssl,
-                                                                    trust_env=False,
-                                                                    http2=True)
+                                 transport=self._recorded(
+                                     httpx.AsyncHTTPTransport(retries=SgRequestsBase._CONNECTION_RETRIES,
+                                                              verify=self.__verify_ssl,
+                                                              trust_env=False,
+                                                              http2=True,
+                                                              proxy=httpx.Proxy(proxy_url) if recording and proxy_url else None))
                                  )
 
     async def __aclose(self):
-        session = self._client()
-        if session:
-            await session.aclose()
+        for client in self._drain_clients():
+            await client.aclose()
 
     def clear_cookies(self):
         if self._session:
             self._session.cookies.clear()
 
-    def my_public_ip(self) -> Optional[str]:
-        """
-        This is set if we are behind an Apify proxy.
-        Failure to retrieve the public IP will result in it being None.
-        """
-        return self.__ip
-
 
 class SgRequests(SgRequestsBase):
 
@@ -438,7 +977,19 @@ class SgRequests(SgRequestsBase):
                  dont_retry_status_codes_exceptions: Set[int] = frozenset(),
                  timeout_config: Timeout = SgRequestsBase.DEFAULT_TIMEOUT,
                  retries_with_fresh_proxy_ip: int = 4,
-                 verify_ssl: VerifyTypes = True):
+                 verify_ssl: VerifyTypes = True,
+                 rate_limiter: Optional[AimdRateLimiter] = None,
+                 proxy_pool: Optional[ProxyPool] = None,
+                 max_pooled_clients: int = SgRequestsBase.DEFAULT_MAX_POOLED_CLIENTS,
+                 public_ip_cache: Optional[PublicIpCache] = None,
+                 retry_budget: Optional[RetryBudget] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedge_policy: Optional[HedgePolicy] = None,
+                 adaptive_timeouts: Optional[AdaptiveTimeouts] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 record_traffic: Optional[TrafficArchive] = None,
+                 replay_traffic: Optional[ReplayTransport] = None):
         """
         Synchronous SgRequests, backed by httpx, with proxy rotation and lots of customization.
 
@@ -450,6 +1001,35 @@ class SgRequests(SgRequestsBase):
         :param retries_with_fresh_proxy_ip: [4] How many times to rotate proxy IPs on errors,
                                                 for each request errors before giving up?
         :param verify_ssl: See [https://www.python-httpx.org/advanced/] for the `SSL certificates` section
+        :param rate_limiter: [None] Optionally, pace each request attempt per host, adapting to throttling;
+                             e.g. `AimdRateLimiter()`. Share one across instances (and threads) to pace them together.
+        :param proxy_pool: [ProxyPool.shared(STORM_PROXIES)] The health-scored pool to pick proxies from;
+                           a fresh proxy is acquired from it whenever the client is refreshed.
+        :param max_pooled_clients: [8] How many per-proxy clients to keep open. Rotating proxies switches between
+                                   pooled clients rather than closing the current one, so their connections stay warm.
+        :param public_ip_cache: [PublicIpCache.shared()] Discovers each proxy session's public IP in the background;
+                                pass e.g. `PublicIpCache(StaticIpDiscovery('127.0.0.1'))` to stay offline in tests.
+        :param retry_budget: [None] Optionally, cap retries (including proxy rotations) at a share of all requests;
+                             e.g. `RetryBudget()`. Share one across instances to make it global.
+        :param circuit_breaker: [None] Optionally, fail fast on requests to hosts that keep failing;
+                                e.g. `CircuitBreaker()`.
+        :param hedge_policy: [None] Optionally, when a request is slower than its host's observed p95 latency,
+                             send a duplicate through another proxy, and use whichever answers first;
+                             e.g. `HedgePolicy()`. The policy caps the extra load.
+        :param adaptive_timeouts: [None] Optionally, derive each request's timeout from the latencies observed for its
+                                  host and method (e.g. their p99 x 3, between 5 and 61 seconds), rather than
+                                  always using `timeout_config`; e.g. `AdaptiveTimeouts()`.
+        :param single_flight: [None] Optionally, have concurrent identical GET/HEAD requests (as per
+                              `SingleFlight.request_fingerprint`) share a single request, and its response;
+                              e.g. `SingleFlight()`.
+        :param response_cache: [None] Optionally, serve body-less GETs from an on-disk cache while fresh (as per its
+                               TTLs), and revalidate stale ones with a conditional GET, reusing them on a `304`;
+                               e.g. `ResponseCache('cache/http')`.
+        :param record_traffic: [None] Optionally, record each request that goes to the network, and its response,
+                               into a JSONL archive; e.g. `TrafficArchive('/tmp/traffic.jsonl')`.
+        :param replay_traffic: [None] Optionally, serve the responses of a recorded archive, with no network at all;
+                               e.g. `ReplayTransport(TrafficArchive('/tmp/traffic.jsonl'))`. Proxies are then unused,
+                               and public IPs aren't looked up. Can't be combined with `record_traffic`.
         """
         self.__timeout = timeout_config
         self.__retries_with_proxy_rotation = retries_with_fresh_proxy_ip
@@ -457,16 +1037,31 @@ class SgRequests(SgRequestsBase):
 
         super().__init__(proxy_country=proxy_country,
                          dont_retry_status_codes=dont_retry_status_codes,
-                         dont_retry_status_codes_exceptions=dont_retry_status_codes_exceptions)
+                         dont_retry_status_codes_exceptions=dont_retry_status_codes_exceptions,
+                         rate_limiter=rate_limiter,
+                         proxy_pool=proxy_pool,
+                         max_pooled_clients=max_pooled_clients,
+                         public_ip_cache=public_ip_cache,
+                         retry_budget=retry_budget,
+                         circuit_breaker=circuit_breaker,
+                         hedge_policy=hedge_policy,
+                         adaptive_timeouts=adaptive_timeouts,
+                         single_flight=single_flight,
+                         response_cache=response_cache,
+                         record_traffic=record_traffic,
+                         replay_traffic=replay_traffic)
+        self.__hedge_executor: Optional[ThreadPoolExecutor] = None
+        self.__hedge_executor_lock = Lock()
         self.__refresh_client()
 
     def __refresh_client(self):
-        self.close()
         proxy_url = None
         if self._behind_proxy():
-            self._refresh_ip()
             proxy_url = self._mk_proxy_url()
-        self._session = self._mk_client(proxy_url=proxy_url)
+            self._refresh_ip(proxy_url)
+        self._session, evicted = self._client_for(proxy_url)
+        for client in evicted:
+            client.close()
 
     def __enter__(self):
         return self
@@ -475,18 +1070,25 @@ class SgRequests(SgRequestsBase):
         self.close()
 
     def close(self):
-        if self._client():
-            self._client().close()
+        for client in self._drain_clients():
+            client.close()
+        if self.__hedge_executor:
+            self.__hedge_executor.shutdown(wait=False)
 
     def __execute_http_sync(self,
-                            cmd: Callable[[], Response],
+                            url: str,
+                            method: str,
+                            cmd: Callable[..., Response],
                             proxy_retries=0) -> Union[Response, SgRequestError]:
+        circuit_open = self._start_request(url, is_retry=proxy_retries > 0)
+        if circuit_open:
+            return circuit_open
         try:
-            return self.__retry_request_sync(cmd)
+            return self.__retry_request_sync(url, method, cmd)
         except Exception as e:
             result = self.__interpret_resp_errors(e=e, proxy_retries=proxy_retries)
             if isinstance(result, bool):
-                return self.__execute_http_sync(cmd, proxy_retries=proxy_retries + 1)
+                return self.__execute_http_sync(url, method, cmd, proxy_retries=proxy_retries + 1)
             else:
                 return result
 
@@ -497,9 +1099,11 @@ class SgRequests(SgRequestsBase):
             if self._behind_proxy():
                 self._ban_ip()
 
-                if proxy_retries <= self.__retries_with_proxy_rotation:
+                if proxy_retries <= self.__retries_with_proxy_rotation and self._allow_retry(str(request.url)):
                     self._log.info(f"Request failed with status: [{response.status_code}]. "
                                     "Rotating IPs to rule out IP blocking.")
+                    for banned in self._retire_client(self._current_proxy()):
+                        banned.close()
                     self.__refresh_client()
                     return True
                 else:
@@ -531,13 +1135,99 @@ class SgRequests(SgRequestsBase):
                                   message=f"Unexpected error occurred; check `base_exception` for details.",
                                   base_exception=e)
 
-    @retry(retry=(retry_if_exception_type(RequestError) | retry_if_exception_type(HTTPStatusError) | retry_if_exception_type(sync_base.NewConnectionRequired)),
+    @retry(retry=(retry_if_exception_type(RequestError) | retry_if_exception_type(HTTPStatusError) | retry_if_exception_type(sync_base.NewConnectionRequired)) & _retry_allowed,
            reraise=True,
            stop=stop_after_attempt(SgRequestsBase.DEFAULT_RETRIES),
            wait=wait_incrementing(start=1, increment=3, max=31),
            before_sleep=before_sleep_log(SgRequestsBase._main_logger, logging.WARNING))
-    def __retry_request_sync(self, cmd: Callable[[], Response]) -> Response:
-        return self._analyze_resp_status(cmd())
+    def __retry_request_sync(self, url: str, method: str, cmd: Callable[..., Response]) -> Response:
+        delay = self._pacing_delay(url)
+        if delay > 0:
+            time.sleep(delay)
+        started = time.monotonic()
+        try:
+            response = self.__send_hedged_sync(url, method, cmd)
+        except BaseException as e:
+            self._on_attempt_result(url, time.monotonic() - started, error=e)
+            raise
+        self._on_attempt_result(url, time.monotonic() - started, response=response)
+        return self._analyze_resp_status(response)
+
+    def __send_sync(self,
+                    url: str,
+                    method: str,
+                    client: BaseClient,
+                    proxy: Optional[str],
+                    cmd: Callable[..., Response],
+                    is_hedge: bool = False) -> Response:
+        timeout = self._timeout_for(url, method)
+        started = time.monotonic()
+        try:
+            response = cmd(client, timeout)
+        except Exception as e:
+            self._on_send_result(url, method, proxy, time.monotonic() - started, error=e, is_hedge=is_hedge)
+            raise
+        finally:
+            for retired in self._checkin(client):
+                retired.close()
+        self._on_send_result(url, method, proxy, time.monotonic() - started, response=response, is_hedge=is_hedge)
+        return response
+
+    def __executor(self) -> ThreadPoolExecutor:
+        with self.__hedge_executor_lock:
+            if self.__hedge_executor is None:
+                self.__hedge_executor = ThreadPoolExecutor(max_workers=self._hedge_workers(),
+                                                           thread_name_prefix='sgrequests-hedge')
+            return self.__hedge_executor
+
+    @staticmethod
+    def __in_own_thread(fn: Callable[..., Response], *args) -> 'Future[Response]':
+        """
+        Runs the call on a thread of its own, so that it never queues behind other calls (as it could on a pool).
+        """
+        future: 'Future[Response]' = Future()
+
+        def run():
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+        Thread(target=run, name='sgrequests-primary', daemon=True).start()
+        return future
+
+    def __send_hedged_sync(self, url: str, method: str, cmd: Callable[..., Response]) -> Response:
+        """
+        Sends the request; if it's slow to answer, as per the `hedge_policy`, sends a duplicate through another proxy
+        (if there's another), and returns whichever answers first. So that the caller can return as soon as either
+        answers, a request that may be hedged is sent on a thread of its own, and the hedge on the hedging threads;
+        the loser can't be cancelled, and is left to finish in the background.
+        """
+        client, proxy = self._checkout()
+        hedge_delay = self._hedge_delay(url, method)
+        if hedge_delay is None:
+            return self.__send_sync(url, method, client, proxy, cmd)
+
+        primary = self.__in_own_thread(self.__send_sync, url, method, client, proxy, cmd)
+        done, _ = wait([primary], timeout=hedge_delay)
+        may_hedge, hedge_proxy = (False, None) if done else self._try_hedge(proxy)
+        if not may_hedge:
+            return primary.result()
+
+        hedge_client, evicted = self._client_for(hedge_proxy, checkout=True)
+        for evicted_client in evicted:
+            evicted_client.close()
+        hedge = self.__executor().submit(self.__send_sync, url, method, hedge_client, hedge_proxy, cmd, True)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._record_hedge_win()
+                    return future.result()
+        return primary.result()  # both failed
 
     def request(self,
                 url: str,
@@ -552,16 +1242,26 @@ class SgRequests(SgRequestsBase):
         A near-complete subset of httpx.request(...).
         Throws an `SgRequestError` in the case the result isn't in the 2XX range.
         """
-        return self.__execute_http_sync(
-            lambda: self._client().request(method=method,
-                                           url=url,
-                                           data=data,
-                                           params=params,
-                                           headers=headers,
-                                           cookies=cookies,
-                                           files=files,
-                                           json=json,
-                                           allow_redirects=True))
+        cache_key, cached = self._cache_lookup(method, url, data, params, headers, cookies, files, json)
+        if cached and cached.is_fresh():
+            return cached.to_response(method)
+        headers = self._revalidation_headers(headers, cached)
+
+        key = self._single_flight_key(method, url, data, params, headers, cookies, files, json)
+        execute = lambda: self._cache_update(cache_key, cached, self.__execute_http_sync(
+            url,
+            method,
+            lambda client, timeout: client.request(method=method,
+                                                   url=url,
+                                                   data=data,
+                                                   params=params,
+                                                   headers=headers,
+                                                   cookies=cookies,
+                                                   files=files,
+                                                   json=json,
+                                                   allow_redirects=True,
+                                                   timeout=timeout)))
+        return execute() if key is None else self._single_flight().do(key, execute)
 
     def get(self,
             url: str,
@@ -653,12 +1353,18 @@ class SgRequests(SgRequestsBase):
         self.__refresh_client()
 
     def _mk_client(self, proxy_url: Optional[str]) -> BaseClient:
-        return httpx.Client(proxies=proxy_url,
+        if self._replay_transport():
+            return httpx.Client(trust_env=False, timeout=self.__timeout, transport=self._replay_transport())
+        # when recording, the proxy goes on the recorded transport; a separate proxy transport would bypass it.
+        recording = self._recording()
+        return httpx.Client(proxies=None if recording else proxy_url,
                             trust_env=False,
                             timeout=self.__timeout,
                             verify=self.__verify_ssl,
-                            transport=httpx.HTTPTransport(retries=SgRequestsBase._CONNECTION_RETRIES,
-                                                          verify=self.__verify_ssl,
-                                                          trust_env=False,
-                                                          http2=True)
+                            transport=self._recorded(
+                                httpx.HTTPTransport(retries=SgRequestsBase._CONNECTION_RETRIES,
+                                                    verify=self.__verify_ssl,
+                                                    trust_env=False,
+                                                    http2=True,
+                                                    proxy=httpx.Proxy(proxy_url) if recording and proxy_url else None))
                             )
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from hashlib import blake2b
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+from httpx._types import CookieTypes, HeaderTypes, QueryParamTypes
+
+
+@dataclass(frozen=True)
+class SingleFlightStats:
+    leaders: int
+    followers: int
+
+    @property
+    def hit_ratio(self) -> float:
+        """
+        The share of calls that were served by another, identical call already in flight.
+        """
+        calls = self.leaders + self.followers
+        return self.followers / calls if calls else 0.0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call with a given key is in flight, other calls with the same key
+    wait for it, and share its result (or its exception), rather than making their own.
+
+    For `SgRequests`, the key is the request's fingerprint (see `request_fingerprint`), so concurrent identical GETs
+    share one response; note that it's the very same `Response` object. It's thread-safe.
+    """
+
+    COALESCED_METHODS = frozenset({'GET', 'HEAD'})
+
+    def __init__(self):
+        self.__calls: Dict[str, Future] = {}
+        self.__async_calls: Dict[Tuple[int, str], 'asyncio.Future'] = {}  # keyed on the event loop, too
+        self.__leaders = 0
+        self.__followers = 0
+        self.__lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Calls `fn`, unless an identical call is already in flight; in which case, waits for its result.
+        """
+        with self.__lock:
+            future = self.__calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self.__calls[key] = Future()
+                self.__leaders += 1
+            else:
+                self.__followers += 1
+        if not is_leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+        return future.result()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Same as `do`, for coroutines; calls are coalesced within the same event loop.
+        """
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self.__lock:
+            future = self.__async_calls.get(loop_key)
+            is_leader = future is None
+            if is_leader:
+                future = self.__async_calls[loop_key] = asyncio.get_running_loop().create_future()
+                self.__leaders += 1
+            else:
+                self.__followers += 1
+        if not is_leader:
+            return await asyncio.shield(future)
+
+        try:
+            future.set_result(await fn())
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.__lock:
+                del self.__async_calls[loop_key]
+        return future.result()
+
+    def in_flight(self) -> int:
+        with self.__lock:
+            return len(self.__calls) + len(self.__async_calls)
+
+    def stats(self) -> SingleFlightStats:
+        with self.__lock:
+            return SingleFlightStats(leaders=self.__leaders, followers=self.__followers)
+
+    @staticmethod
+    def request_fingerprint(method: str,
+                            url: str,
+                            params: Optional[QueryParamTypes] = None,
+                            headers: Optional[HeaderTypes] = None,
+                            cookies: Optional[CookieTypes] = None) -> Optional[str]:
+        """
+        A canonical fingerprint of a body-less request: the method, the URL as httpx sends it (with `params`, if any),
+        and the headers (case-insensitively) and cookies, in sorted order.
+
+        :return: The fingerprint, or `None` if the request isn't to be coalesced (see `COALESCED_METHODS`),
+                 or its cookies aren't a plain dict.
+        """
+        method = method.upper()
+        if method not in SingleFlight.COALESCED_METHODS or not (cookies is None or isinstance(cookies, dict)):
+            return None
+        canonical = [method,
+                     str(httpx.URL(url, params=params)),
+                     sorted((name.lower(), value) for name, value in httpx.Headers(headers).multi_items()),
+                     sorted((cookies or {}).items())]
+        return blake2b(json.dumps(canonical).encode('utf-8'), digest_size=16).hexdigest()
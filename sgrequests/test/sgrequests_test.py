@@ -0,0 +1,386 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from httpx import Response
+from tenacity import stop_after_attempt, wait_none
+
+from sgrequests import SgRequests, SgRequestsAsync, SgRequestError, ProxyPool, PublicIpCache, StaticIpDiscovery, \
+    TrafficArchive, RecordedExchange, ReplayTransport, ReplayMissError, HedgePolicy, CircuitBreaker, RetryBudget, \
+    SingleFlight, ResponseCache
+from sgrequests.sgrequests import SgRequestsBase
+
+PROXY = 'http://proxy-1:8000'
+OTHER_PROXY = 'http://proxy-2:8000'
+
+
+class SessionIpDiscovery(StaticIpDiscovery):
+    """
+    Finds another IP on each discovery, as a rotating proxy does for each of its sessions.
+    """
+
+    def __init__(self, ips: List[str]):
+        super().__init__()
+        self.__ips = list(ips)
+        self.discoveries = 0
+
+    def discover(self, proxy_url: Optional[str]) -> Optional[str]:
+        self.discoveries += 1
+        return self.__ips.pop(0) if len(self.__ips) > 1 else self.__ips[0]
+
+
+class ThreadRecordingReplay(ReplayTransport):
+    """
+    Records which thread each request was sent on, and with which headers.
+    """
+
+    def __init__(self, archive: TrafficArchive, latency_scale: float = 0.0):
+        super().__init__(archive, latency_scale=latency_scale)
+        self.threads: List[str] = []
+        self.headers: List[Dict[str, str]] = []
+
+    def handle_request(self, method, url, headers, stream, extensions):
+        self.threads.append(threading.current_thread().name)
+        self.headers.append({name.decode('latin-1').lower(): value.decode('latin-1') for name, value in headers})
+        return super().handle_request(method, url, headers, stream, extensions)
+
+
+class SgRequestsTest(unittest.TestCase):
+    """
+    Drives `SgRequests` with recorded traffic (a `ReplayTransport`), so that no test goes to the network.
+    """
+
+    def setUp(self) -> None:
+        self.__tmp_dir = tempfile.TemporaryDirectory()
+        self.__closeables = []
+        # retry right away, and only once per proxy session, so that each recorded failure leads to a rotation.
+        self.__retrying = [SgRequests._SgRequests__retry_request_sync.retry,
+                           SgRequestsAsync._SgRequestsAsync__retry_request_async.retry]
+        self.__retry_policies = [(retrying.wait, retrying.stop) for retrying in self.__retrying]
+        for retrying in self.__retrying:
+            retrying.wait, retrying.stop = wait_none(), stop_after_attempt(1)
+
+    def tearDown(self) -> None:
+        for retrying, (wait, stop) in zip(self.__retrying, self.__retry_policies):
+            retrying.wait, retrying.stop = wait, stop
+        for closeable in reversed(self.__closeables):
+            closeable.close()
+        self.__tmp_dir.cleanup()
+        SgRequestsBase._SgRequestsBase__BANNED_IP_SET.clear()
+
+    def __archive(self, exchanges: List[tuple], elapsed_sec: float = 0.01) -> TrafficArchive:
+        """
+        An archive of `(method, url, status_code, response_headers, response_body)` exchanges, in that order;
+        an exchange can end with its own `elapsed_sec`.
+        """
+        archive = TrafficArchive(os.path.join(self.__tmp_dir.name, f'traffic{len(self.__closeables)}.jsonl'))
+        with open(archive.path, 'w', encoding='utf-8') as file:
+            for method, url, status_code, headers, body, *elapsed in exchanges:
+                file.write(RecordedExchange(method=method, url=url, request_headers=[], request_body=b'',
+                                            status_code=status_code, response_headers=headers, response_body=body,
+                                            http_version='HTTP/1.1', reason_phrase='',
+                                            elapsed_sec=elapsed[0] if elapsed else elapsed_sec,
+                                            recorded_at=time.time()).serialize() + '\n')
+        return archive
+
+    def __http(self,
+               exchanges,
+               ip_cache: Optional[PublicIpCache] = None,
+               replay: Optional[ReplayTransport] = None,
+               proxies: Tuple[str, ...] = (PROXY,),
+               **kwargs) -> SgRequests:
+        ip_cache = ip_cache or PublicIpCache(StaticIpDiscovery('10.0.0.1'))
+        http = SgRequests(replay_traffic=replay or ReplayTransport(self.__archive(exchanges)),
+                          proxy_pool=ProxyPool(proxies),
+                          public_ip_cache=ip_cache,
+                          dont_retry_status_codes_exceptions={403, 429, 503},
+                          **kwargs)
+        self.__closeables += [ip_cache, http]
+        return http
+
+    def test_replay_serves_identical_requests_in_order_then_the_last_one(self):
+        http = self.__http([('GET', 'http://h/page', 200, [], b'first'),
+                            ('GET', 'http://h/other', 200, [], b'other'),
+                            ('GET', 'http://h/page', 200, [], b'second')])
+
+        self.assertEqual(['first', 'second', 'second', 'other'],
+                         [http.get(url).text for url in ['http://h/page'] * 3 + ['http://h/other']])
+
+    def test_replay_miss_fails_without_retries(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/page', 200, [], b'page')]))
+        http = self.__http([], replay=replay)
+
+        missed = http.get('http://h/page?q=other')
+
+        self.assertIsInstance(missed, SgRequestError)
+        self.assertIsInstance(missed.base_exception, ReplayMissError)
+        self.assertEqual(1, len(replay.threads))
+
+    def test_ban_rotates_to_a_new_client_on_the_same_proxy(self):
+        http = self.__http([('GET', 'http://h/page', 403, [], b'banned'),
+                            ('GET', 'http://h/page', 200, [], b'page')])
+        banned_client = http._client()
+
+        response = http.get('http://h/page')
+
+        self.assertIsInstance(response, Response)
+        self.assertEqual('page', response.text)
+        self.assertIsNot(banned_client, http._client())
+        self.assertTrue(banned_client.is_closed)
+        self.assertFalse(http._client().is_closed)
+
+    def test_ban_gives_up_once_rotations_are_exhausted(self):
+        http = self.__http([('GET', 'http://h/page', 403, [], b'banned')], retries_with_fresh_proxy_ip=1)
+
+        response = http.get('http://h/page')
+
+        self.assertIsInstance(response, SgRequestError)
+        self.assertEqual(403, response.status_code)
+
+    def test_ban_rediscovers_the_ip_of_the_new_session(self):
+        discovery = SessionIpDiscovery(['10.0.0.1', '10.0.0.2'])
+        http = self.__http([('GET', 'http://h/page', 403, [], b'banned'),
+                            ('GET', 'http://h/page', 200, [], b'page'),
+                            ('GET', 'http://h/other', 200, [], b'other')],
+                           ip_cache=PublicIpCache(discovery))
+        self.assertEqual('10.0.0.1', http.my_public_ip(wait_sec=5))
+
+        http.get('http://h/page')
+        self.assertEqual('10.0.0.2', http.my_public_ip(wait_sec=5))
+
+        http.get('http://h/other')
+        self.assertEqual('10.0.0.2', http.my_public_ip(wait_sec=5))
+        self.assertEqual(2, discovery.discoveries)
+
+    def test_circuit_opens_and_fails_fast(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/down', 503, [], b'down')]))
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout_sec=60)
+        http = self.__http([], replay=replay, circuit_breaker=breaker)
+
+        gave_up = http.get('http://h/down')
+        self.assertEqual(503, gave_up.status_code)
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state('h'))
+        self.assertEqual(2, len(replay.threads))
+
+        failed_fast = http.get('http://h/down')
+        self.assertIsInstance(failed_fast, SgRequestError)
+        self.assertIn('Circuit open', failed_fast.message)
+        self.assertEqual(2, len(replay.threads))
+
+    def test_half_open_circuit_lets_a_single_trial_through(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/flaky', 503, [], b'down'),
+                                                       ('GET', 'http://h/flaky', 503, [], b'down'),
+                                                       ('GET', 'http://h/flaky', 200, [], b'up')]))
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_sec=0.1)
+        http = self.__http([], replay=replay, circuit_breaker=breaker)
+
+        self.assertEqual(503, http.get('http://h/flaky').status_code)
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state('h'))
+        time.sleep(0.15)
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state('h'))
+
+        self.assertEqual(503, http.get('http://h/flaky').status_code)  # the trial fails: open again
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state('h'))
+        self.assertEqual(2, len(replay.threads))
+        time.sleep(0.15)
+
+        self.assertEqual('up', http.get('http://h/flaky').text)
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state('h'))
+        self.assertEqual(3, len(replay.threads))
+
+    def test_half_open_trial_is_released_by_any_error(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/flaky', 503, [], b'down'),
+                                                       ('GET', 'http://h/flaky', 200, [], b'up')]))
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_sec=0.1)
+        http = self.__http([], replay=replay, circuit_breaker=breaker)
+
+        self.assertEqual(503, http.get('http://h/flaky').status_code)
+        time.sleep(0.15)
+
+        missed = http.get('http://h/flaky?q=unrecorded')  # the trial ends in a replay miss, not an httpx error
+        self.assertIsInstance(missed.base_exception, ReplayMissError)
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state('h'))
+        time.sleep(0.15)
+
+        self.assertEqual('up', http.get('http://h/flaky').text)
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state('h'))
+
+    def test_cancelled_half_open_trial_is_released(self):
+        archive = self.__archive([('GET', 'http://h/slow', 200, [], b'slow', 5.0)])
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_sec=0.1)
+        breaker.record_failure('h')
+        time.sleep(0.15)
+
+        async def cancel_the_trial():
+            async with SgRequestsAsync(replay_traffic=ReplayTransport(archive, latency_scale=1.0),
+                                       circuit_breaker=breaker,
+                                       dont_retry_status_codes_exceptions={503}) as http:
+                trial = asyncio.ensure_future(http.get('http://h/slow'))
+                await asyncio.sleep(0.05)
+                self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state('h'))
+                trial.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await trial
+
+        asyncio.run(cancel_the_trial())
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state('h'))
+
+    def test_retry_budget_denies_rotations_once_spent(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/banned', 403, [], b'banned')]))
+        budget = RetryBudget(ratio=0.0, min_retries_per_window=2)
+        http = self.__http([], replay=replay, retry_budget=budget)
+
+        response = http.get('http://h/banned')
+
+        self.assertIsInstance(response, SgRequestError)
+        self.assertEqual(403, response.status_code)
+        stats = http.retry_budget_stats()
+        self.assertEqual(1, stats.total_requests)
+        self.assertEqual(2, stats.total_retries)
+        self.assertGreater(stats.total_denied_retries, 0)
+        self.assertLess(len(replay.threads), SgRequests.DEFAULT_IP_ROTATION_RETRIES_BEHIND_PROXY)
+
+    def test_single_flight_followers_share_the_leaders_response(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/page', 200, [], b'page')], elapsed_sec=0.3),
+                                       latency_scale=1.0)
+        http = self.__http([], replay=replay, single_flight=SingleFlight())
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            responses = list(executor.map(lambda _: http.get('http://h/page'), range(4)))
+
+        self.assertEqual(['page'] * 4, [response.text for response in responses])
+        self.assertEqual(1, len(replay.threads))
+        self.assertEqual(1, http.single_flight_stats().leaders)
+        self.assertEqual(3, http.single_flight_stats().followers)
+
+    def test_single_flight_leaves_distinct_requests_alone(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/a', 200, [], b'a'),
+                                                       ('GET', 'http://h/b', 200, [], b'b'),
+                                                       ('POST', 'http://h/a', 200, [], b'posted')]))
+        http = self.__http([], replay=replay, single_flight=SingleFlight())
+
+        self.assertEqual(['a', 'b', 'posted'],
+                         [http.get('http://h/a').text, http.get('http://h/b').text, http.post('http://h/a').text])
+        self.assertEqual(3, len(replay.threads))
+        self.assertEqual(0, http.single_flight_stats().followers)
+
+    def __response_cache(self, default_ttl_sec: float) -> ResponseCache:
+        cache = ResponseCache(os.path.join(self.__tmp_dir.name, 'http_cache'), default_ttl_sec=default_ttl_sec)
+        self.__closeables.append(cache)
+        return cache
+
+    def test_fresh_cached_response_is_served_without_a_request(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/page', 200, [], b'page')]))
+        http = self.__http([], replay=replay, response_cache=self.__response_cache(default_ttl_sec=60))
+
+        self.assertEqual('page', http.get('http://h/page').text)
+        self.assertEqual('page', http.get('http://h/page', headers={'User-Agent': 'another'}).text)
+
+        self.assertEqual(1, len(replay.threads))
+        self.assertEqual(1, http.response_cache_stats().hits)
+
+    def test_stale_cached_response_is_revalidated_with_a_304(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/page', 200, [('ETag', '"v1"')], b'page'),
+                                                       ('GET', 'http://h/page', 304, [('ETag', '"v1"')], b'')]))
+        http = self.__http([], replay=replay, response_cache=self.__response_cache(default_ttl_sec=0))
+
+        self.assertEqual('page', http.get('http://h/page').text)
+        revalidated = http.get('http://h/page')
+
+        self.assertEqual(200, revalidated.status_code)
+        self.assertEqual('page', revalidated.text)
+        self.assertNotIn('if-none-match', replay.headers[0])
+        self.assertEqual('"v1"', replay.headers[1]['if-none-match'])
+        stats = http.response_cache_stats()
+        self.assertEqual((0, 1, 1), (stats.hits, stats.revalidations, stats.misses))
+
+    def test_changed_response_replaces_the_cached_one(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/page', 200, [('ETag', '"v1"')], b'old'),
+                                                       ('GET', 'http://h/page', 200, [('ETag', '"v2"')], b'new')]))
+        http = self.__http([], replay=replay, response_cache=self.__response_cache(default_ttl_sec=0))
+
+        self.assertEqual(['old', 'new', 'new'], [http.get('http://h/page').text for _ in range(3)])
+        self.assertEqual('"v2"', replay.headers[2]['if-none-match'])
+
+    @staticmethod
+    def __hedge_policy() -> HedgePolicy:
+        """
+        Hedges every request to `h` that's slower than 50ms.
+        """
+        policy = HedgePolicy(max_extra_load=1.0, min_samples=1, min_delay_sec=0.05)
+        policy.latency.record('h', 0.01)
+        return policy
+
+    def test_hedge_is_sent_on_another_thread_through_another_proxy(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/slow', 200, [], b'slow')], elapsed_sec=0.3),
+                                       latency_scale=1.0)
+        http = self.__http([], replay=replay, proxies=(PROXY, OTHER_PROXY), hedge_policy=self.__hedge_policy())
+
+        response = http.get('http://h/slow')
+
+        self.assertEqual('slow', response.text)
+        self.assertEqual('sgrequests-primary', replay.threads[0])
+        self.assertEqual(2, len(replay.threads))
+        self.assertTrue(replay.threads[1].startswith('sgrequests-hedge'))
+        self.assertEqual(1, http.hedge_stats().hedges)
+
+    def test_hedge_is_skipped_without_another_proxy(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/slow', 200, [], b'slow')], elapsed_sec=0.3),
+                                       latency_scale=1.0)
+        http = self.__http([], replay=replay, hedge_policy=self.__hedge_policy())
+
+        self.assertEqual('slow', http.get('http://h/slow').text)
+        time.sleep(0.1)
+        self.assertEqual(['sgrequests-primary'], replay.threads)
+        self.assertEqual(0, http.hedge_stats().hedges)
+
+    def test_faster_hedge_is_returned_without_waiting_on_the_request(self):
+        replay = ThreadRecordingReplay(self.__archive([('GET', 'http://h/page', 200, [], b'slow', 2.0),
+                                                       ('GET', 'http://h/page', 200, [], b'fast', 0.01)]),
+                                       latency_scale=1.0)
+        http = self.__http([], replay=replay, proxies=(PROXY, OTHER_PROXY), hedge_policy=self.__hedge_policy())
+
+        started = time.monotonic()
+        response = http.get('http://h/page')
+
+        self.assertEqual('fast', response.text)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(1, http.hedge_stats().hedge_wins)
+
+    def test_retired_client_is_closed_once_no_longer_in_use(self):
+        http = self.__http([], proxies=(PROXY, OTHER_PROXY))
+        hedge_client, _ = http._client_for(OTHER_PROXY, checkout=True)
+
+        self.assertEqual([], http._retire_client(OTHER_PROXY))
+        self.assertEqual([hedge_client], http._checkin(hedge_client))
+        self.assertIsNot(hedge_client, http._client_for(OTHER_PROXY)[0])
+
+    def test_ban_rotates_async(self):
+        archive = self.__archive([('GET', 'http://h/page', 429, [], b'slow down'),
+                                  ('GET', 'http://h/page', 200, [], b'page')])
+        ip_cache = PublicIpCache(StaticIpDiscovery('10.0.0.1'))
+        self.__closeables.append(ip_cache)
+
+        async def rotate():
+            async with SgRequestsAsync(replay_traffic=ReplayTransport(archive),
+                                       proxy_pool=ProxyPool([PROXY]),
+                                       public_ip_cache=ip_cache,
+                                       dont_retry_status_codes_exceptions={429}) as http:
+                banned_client = http._client()
+                response = await http.get('http://h/page')
+                return response, banned_client, http._client()
+
+        response, banned_client, client = asyncio.run(rotate())
+
+        self.assertEqual('page', response.text)
+        self.assertIsNot(banned_client, client)
+        self.assertTrue(banned_client.is_closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
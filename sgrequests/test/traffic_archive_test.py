@@ -0,0 +1,70 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from sgrequests import TrafficArchive, RecordedExchange, RecordingTransport, ReplayTransport, ReplayMissError
+
+
+class TrafficArchiveTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.__tmp_dir = tempfile.TemporaryDirectory()
+        self.__archive = TrafficArchive(os.path.join(self.__tmp_dir.name, 'traffic.jsonl'))
+        self.__sent = []
+
+    def tearDown(self) -> None:
+        self.__archive.close()
+        self.__tmp_dir.cleanup()
+
+    def __answer(self, request: httpx.Request) -> httpx.Response:
+        self.__sent.append(request)
+        return httpx.Response(200, content=b'echo:' + request.content, headers={'X-Path': request.url.path})
+
+    def test_recorded_exchanges_are_replayed_without_the_network(self):
+        with httpx.Client(transport=RecordingTransport(httpx.MockTransport(self.__answer), self.__archive)) as client:
+            client.get('http://h/page', headers={'Authorization': 'secret', 'User-Agent': 'recorder'})
+            client.post('http://h/form', content=b'q=1')
+        self.__archive.close()
+
+        self.assertEqual(2, self.__archive.recorded())
+        exchanges = list(self.__archive.exchanges())
+        self.assertEqual(['GET', 'POST'], [exchange.method for exchange in exchanges])
+        self.assertNotIn('authorization', [name.lower() for name, _ in exchanges[0].request_headers])
+
+        with httpx.Client(transport=ReplayTransport(self.__archive)) as client:
+            page = client.get('http://h/page', headers={'User-Agent': 'replayer'})
+            form = client.post('http://h/form', content=b'q=1')
+            with self.assertRaises(ReplayMissError):
+                client.post('http://h/form', content=b'q=2')
+
+        self.assertEqual(2, len(self.__sent))
+        self.assertEqual(('echo:', '/page'), (page.text, page.headers['X-Path']))
+        self.assertEqual('echo:q=1', form.text)
+
+    def test_async_replay(self):
+        with open(self.__archive.path, 'w', encoding='utf-8') as file:
+            file.write(RecordedExchange(method='GET', url='http://h/page', request_headers=[], request_body=b'',
+                                        status_code=200, response_headers=[], response_body=b'page',
+                                        http_version='HTTP/1.1', reason_phrase='OK', elapsed_sec=0.01,
+                                        recorded_at=0.0).serialize() + '\n')
+
+        async def replay():
+            async with httpx.AsyncClient(transport=ReplayTransport(self.__archive)) as client:
+                return await client.get('http://h/page')
+
+        self.assertEqual('page', asyncio.run(replay()).text)
+
+    def test_serialization_round_trip(self):
+        exchange = RecordedExchange(method='POST', url='http://h/form', request_headers=[('Accept', '*/*')],
+                                    request_body=b'\x00binary', status_code=404, response_headers=[('A', 'b')],
+                                    response_body=b'\xffgone', http_version='HTTP/2', reason_phrase='Not Found',
+                                    elapsed_sec=0.5, recorded_at=1.0)
+
+        self.assertEqual(exchange, RecordedExchange.deserialize(exchange.serialize()))
+
+
+if __name__ == "__main__":
+    unittest.main()
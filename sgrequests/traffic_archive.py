@@ -0,0 +1,261 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, asdict
+from hashlib import blake2b
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+
+class ReplayMissError(LookupError):
+    """
+    A replayed request that isn't in the archive. Deliberately not an `httpx` error, so that it's not retried.
+    """
+
+
+@dataclass(frozen=True)
+class RecordedExchange:
+    """
+    A request, and the response it got, as the transport saw them; i.e. the response body is still encoded
+    (e.g. gzipped), just as it came over the wire.
+    """
+    method: str
+    url: str
+    request_headers: List[Tuple[str, str]]
+    request_body: bytes
+    status_code: int
+    response_headers: List[Tuple[str, str]]
+    response_body: bytes
+    http_version: str
+    reason_phrase: str
+    elapsed_sec: float
+    recorded_at: float
+
+    def replay_key(self) -> str:
+        return RecordedExchange.key(self.method, self.url, self.request_body)
+
+    @staticmethod
+    def key(method: str, url: str, body: bytes) -> str:
+        """
+        Requests are matched on their method, URL and body; not their headers, which tend to vary (e.g. a random
+        `User-Agent`).
+        """
+        return f"{method.upper()} {url} {blake2b(body, digest_size=16).hexdigest()}"
+
+    def serialize(self) -> str:
+        """
+        One JSON line; bodies are zlib-compressed, and base64-encoded.
+        """
+        as_dict = asdict(self)
+        as_dict['request_body'] = RecordedExchange.__pack(self.request_body)
+        as_dict['response_body'] = RecordedExchange.__pack(self.response_body)
+        return json.dumps(as_dict)
+
+    @staticmethod
+    def deserialize(serialized_json: str) -> 'RecordedExchange':
+        as_dict = json.loads(serialized_json)
+        return RecordedExchange(
+            method=as_dict['method'],
+            url=as_dict['url'],
+            request_headers=[tuple(header) for header in as_dict['request_headers']],
+            request_body=RecordedExchange.__unpack(as_dict['request_body']),
+            status_code=as_dict['status_code'],
+            response_headers=[tuple(header) for header in as_dict['response_headers']],
+            response_body=RecordedExchange.__unpack(as_dict['response_body']),
+            http_version=as_dict['http_version'],
+            reason_phrase=as_dict['reason_phrase'],
+            elapsed_sec=as_dict['elapsed_sec'],
+            recorded_at=as_dict['recorded_at'],
+        )
+
+    @staticmethod
+    def __pack(body: bytes) -> str:
+        return base64.b64encode(zlib.compress(body)).decode('ascii')
+
+    @staticmethod
+    def __unpack(packed: str) -> bytes:
+        return zlib.decompress(base64.b64decode(packed))
+
+
+class TrafficArchive:
+    """
+    A JSONL archive of `RecordedExchange`s, one per line; appending to it is thread-safe.
+    There's deliberately no default path: pick one per recording, e.g. `'/tmp/zoro_traffic.jsonl'`.
+    """
+
+    DEFAULT_REDACTED_HEADERS = frozenset({'authorization', 'proxy-authorization', 'cookie'})
+
+    def __init__(self, path: str, redacted_headers: Iterable[str] = DEFAULT_REDACTED_HEADERS):
+        """
+        :param path: The archive file; recording appends to it.
+        :param redacted_headers: The request headers (case-insensitive) not to record; they aren't replayed on.
+        """
+        self.__path = path
+        self.__redacted_headers = frozenset(name.lower() for name in redacted_headers)
+        self.__file = None
+        self.__recorded = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def record(self,
+               method: bytes,
+               url: str,
+               request_headers: RawHeaders,
+               request_body: bytes,
+               status_code: int,
+               response_headers: RawHeaders,
+               response_body: bytes,
+               extensions: dict,
+               elapsed_sec: float) -> None:
+        exchange = RecordedExchange(
+            method=method.decode('ascii'),
+            url=url,
+            request_headers=[(name.decode('latin-1'), value.decode('latin-1')) for name, value in request_headers
+                             if name.decode('latin-1').lower() not in self.__redacted_headers],
+            request_body=request_body,
+            status_code=status_code,
+            response_headers=[(name.decode('latin-1'), value.decode('latin-1')) for name, value in response_headers],
+            response_body=response_body,
+            http_version=extensions.get('http_version', b'HTTP/1.1').decode('ascii'),
+            reason_phrase=extensions.get('reason_phrase', b'').decode('latin-1'),
+            elapsed_sec=elapsed_sec,
+            recorded_at=time.time())
+        line = exchange.serialize() + '\n'
+        with self.__lock:
+            if self.__file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.__path)), exist_ok=True)
+                self.__file = open(self.__path, 'a', encoding='utf-8')
+            self.__file.write(line)
+            self.__file.flush()
+            self.__recorded += 1
+
+    def recorded(self) -> int:
+        """
+        How many exchanges were recorded, by this instance.
+        """
+        with self.__lock:
+            return self.__recorded
+
+    def exchanges(self) -> Iterator[RecordedExchange]:
+        with open(self.__path, 'r', encoding='utf-8') as archive:
+            for line in archive:
+                if line.strip():
+                    yield RecordedExchange.deserialize(line)
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+
+def _url_of(url: Tuple[bytes, bytes, Optional[int], bytes]) -> str:
+    return str(httpx.URL(url))
+
+
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Sends requests through another transport (sync or async), and records each exchange into a `TrafficArchive`.
+    """
+
+    def __init__(self, transport, archive: TrafficArchive):
+        """
+        :param transport: The `httpx.BaseTransport` or `httpx.AsyncBaseTransport` to send the requests through.
+        :param archive: Where to record the exchanges.
+        """
+        self.__transport = transport
+        self.__archive = archive
+
+    def handle_request(self, method, url, headers, stream, extensions):
+        request_body = b''.join(stream)
+        start = time.monotonic()
+        status_code, response_headers, response_stream, response_extensions = self.__transport.handle_request(
+            method, url, headers, httpx.ByteStream(request_body), extensions)
+        try:
+            response_body = b''.join(response_stream)
+        finally:
+            response_stream.close()
+        self.__archive.record(method, _url_of(url), headers, request_body,
+                              status_code, response_headers, response_body, response_extensions,
+                              elapsed_sec=time.monotonic() - start)
+        return status_code, response_headers, httpx.ByteStream(response_body), response_extensions
+
+    async def handle_async_request(self, method, url, headers, stream, extensions):
+        request_body = b''.join([chunk async for chunk in stream])
+        start = time.monotonic()
+        status_code, response_headers, response_stream, response_extensions = \
+            await self.__transport.handle_async_request(method, url, headers, httpx.ByteStream(request_body), extensions)
+        try:
+            response_body = b''.join([chunk async for chunk in response_stream])
+        finally:
+            await response_stream.aclose()
+        self.__archive.record(method, _url_of(url), headers, request_body,
+                              status_code, response_headers, response_body, response_extensions,
+                              elapsed_sec=time.monotonic() - start)
+        return status_code, response_headers, httpx.ByteStream(response_body), response_extensions
+
+    def close(self):
+        self.__transport.close()
+
+    async def aclose(self):
+        await self.__transport.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Serves the exchanges of a `TrafficArchive` back, without any network; for sync and async clients alike.
+
+    Identical requests get the recorded responses in the order they were recorded, and then the last one, over
+    and over. A request that was never recorded raises a `ReplayMissError`.
+    """
+
+    def __init__(self, archive: TrafficArchive, latency_scale: float = 0.0):
+        """
+        :param archive: The recorded exchanges to serve.
+        :param latency_scale: How much of each exchange's recorded latency to wait before answering:
+                              0 answers right away (to benchmark the parsing and the writing alone),
+                              and 1 in real time (to benchmark the whole crawl).
+        """
+        self.__latency_scale = latency_scale
+        self.__exchanges: Dict[str, Deque[RecordedExchange]] = {}
+        for exchange in archive.exchanges():
+            self.__exchanges.setdefault(exchange.replay_key(), deque()).append(exchange)
+        self.__lock = threading.Lock()
+
+    def __next_exchange(self, method: bytes, url: str, request_body: bytes) -> RecordedExchange:
+        key = RecordedExchange.key(method.decode('ascii'), url, request_body)
+        with self.__lock:
+            exchanges = self.__exchanges.get(key)
+            if not exchanges:
+                raise ReplayMissError(f"Not in the archive: {method.decode('ascii')} {url}")
+            return exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+
+    @staticmethod
+    def __response_of(exchange: RecordedExchange):
+        headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in exchange.response_headers]
+        extensions = {'http_version': exchange.http_version.encode('ascii'),
+                      'reason_phrase': exchange.reason_phrase.encode('latin-1')}
+        return exchange.status_code, headers, httpx.ByteStream(exchange.response_body), extensions
+
+    def handle_request(self, method, url, headers, stream, extensions):
+        exchange = self.__next_exchange(method, _url_of(url), b''.join(stream))
+        if self.__latency_scale > 0:
+            time.sleep(exchange.elapsed_sec * self.__latency_scale)
+        return ReplayTransport.__response_of(exchange)
+
+    async def handle_async_request(self, method, url, headers, stream, extensions):
+        exchange = self.__next_exchange(method, _url_of(url), b''.join([chunk async for chunk in stream]))
+        if self.__latency_scale > 0:
+            await asyncio.sleep(exchange.elapsed_sec * self.__latency_scale)
+        return ReplayTransport.__response_of(exchange)
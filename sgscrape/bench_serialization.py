@@ -0,0 +1,38 @@
+"""
+Benchmarks the (de)serialization and hashing of `SerializableRequest`s, which the crawl state does for every request
+it pushes, pops, journals and snapshots. Run it with and without `orjson` installed, to compare:
+
+    python -m sgscrape.bench_serialization
+"""
+import json
+import timeit
+from dataclasses import asdict
+
+from sgscrape import pause_resume
+from sgscrape.pause_resume import SerializableRequest
+
+ITERATIONS = 20000
+
+
+def _per_call_us(fn, number: int = ITERATIONS) -> float:
+    return timeit.timeit(fn, number=number) / number * 1e6
+
+
+def main():
+    req = SerializableRequest(url='https://www.example.com/category/123?page=4',
+                              method='POST',
+                              params={'page': '4', 'sort': 'price'},
+                              headers={'User-Agent': 'Mozilla/5.0', 'Accept': 'application/json'},
+                              data={'query': 'drill bits', 'size': '3/4 in'},
+                              context={'category': 'Tools', 'subcategory': 'Drill Bits', 'page': 4})
+    serialized = req.serialize()
+    print(f"orjson: {'on' if pause_resume.orjson is not None else 'off'}")
+    print(f"json.dumps(asdict(req)): {_per_call_us(lambda: json.dumps(asdict(req))):.2f} us")
+    print(f"req.serialize():         {_per_call_us(req.serialize):.2f} us")
+    print(f"deserialize:             {_per_call_us(lambda: SerializableRequest.deserialize(serialized)):.2f} us")
+    print(f"hash, uncached:          {_per_call_us(lambda: hash(SerializableRequest.deserialize(serialized))):.2f} us (incl. deserialize)")
+    print(f"hash, cached:            {_per_call_us(lambda: hash(req)):.2f} us")
+
+
+if __name__ == "__main__":
+    main()
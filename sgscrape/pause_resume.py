@@ -1,9 +1,14 @@
+import atexit
 import csv
 import json
+import os
+import signal
 import threading
-from dataclasses import asdict, dataclass, field
+import time
+from dataclasses import asdict, dataclass, field, fields
 from datetime import timedelta, datetime
-from os import path
+from hashlib import blake2b
+from os import path, remove
 from threading import Lock
 from typing import List, Iterable, Tuple, Optional, Dict, Union, Set, Callable
 from ordered_set import OrderedSet
@@ -11,12 +16,31 @@ from sglogging import SgLogSetup
 
 from .sgrecord import SgRecord
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(obj) -> str:
+    """
+    Serializes to JSON via `orjson`, if it's installed, as it's several times faster than the `json` module.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj)
+
+
+def _loads(serialized: str):
+    return orjson.loads(serialized) if orjson is not None else json.loads(serialized)
+
 
 @dataclass(frozen=True)
 class SerializableRequest:
     """
     Consists of fields that define a request (as per sgrequests, or the requests libs),
-    plus a `context` field for storing arbitrary context information alongside the request.
+    plus a `context` field for storing arbitrary context information alongside the request,
+    and a scheduling `priority` (higher goes first), which isn't part of the request's identity.
     """
     url: str
     method: str = 'GET'
@@ -32,23 +56,39 @@ class SerializableRequest:
     cert: Optional[Union[str, Tuple[str, str]]] = None
     json: Optional[str] = None
     context: Optional[dict] = None
+    priority: int = 0
 
     def serialize(self) -> str:
         """
         Known deficiency: will serialize tuples as lists; this may not matter in practice, as tuples have list accessors.
         """
+        if orjson is not None:
+            return _dumps({f.name: getattr(self, f.name) for f in fields(self)})
         return json.dumps(asdict(self))
 
     def __hash__(self):
-        return hash((self.url, self.method, json.dumps(self.params), json.dumps(self.headers),
-                     json.dumps(self.data), json.dumps(self.cookies), self.json, json.dumps(self.context)))
+        return hash(self.fingerprint())
+
+    def fingerprint(self) -> str:
+        """
+        A hex digest over the fields that identify the request (all but the connection settings), which is stable
+        across processes, and so can key the request in persistent storage.
+
+        It's computed once, and cached on the instance; hence, a request's fields must not be mutated after use.
+        """
+        cached = self.__dict__.get('_fingerprint')
+        if cached is None:
+            identity = [self.url, self.method, self.params, self.headers, self.data, self.cookies, self.json, self.context]
+            cached = blake2b(json.dumps(identity, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+            object.__setattr__(self, '_fingerprint', cached)
+        return cached
 
     def __eq__(self, other):
-        return isinstance(other, SerializableRequest) and hash(self) == hash(other)
+        return isinstance(other, SerializableRequest) and self.fingerprint() == other.fingerprint()
 
     @staticmethod
     def deserialize(serialized_json: str) -> 'SerializableRequest':
-        as_dict = json.loads(serialized_json)
+        as_dict = _loads(serialized_json)
         return SerializableRequest(
             url=as_dict['url'],
             method=as_dict['method'],
@@ -63,34 +103,238 @@ class SerializableRequest:
             stream=as_dict['stream'],
             cert=as_dict['cert'],
             json=as_dict['json'],
-            context=as_dict['context']
+            context=as_dict['context'],
+            priority=as_dict.get('priority', 0)
         )
 
+class RequestJournal:
+    """
+    An append-only log of request queue operations, which is replayed on top of the last state snapshot.
+    This makes each queue operation cost O(1) I/O, while the (O(n)) snapshot is only rewritten periodically.
+
+    Each line is a JSON array of `[sequence_number, operation, serialized_request]`; the snapshot records the
+    sequence number it includes, so that replay skips entries the snapshot already accounts for.
+    """
+
+    PUSH = "+"
+    REMOVE = "-"
+
+    def __init__(self, journal_file: str, last_seq: int):
+        """
+        :param journal_file: The journal's path; appended to if it exists, and only opened (or created) on the
+                             first append.
+        :param last_seq: The sequence number of the last entry that's been applied (see `replay`).
+        """
+        self.__journal_file = journal_file
+        self.__seq = last_seq
+        self.__entries = 0
+        self.__handle = None
+
+    def append(self, op: str, req: SerializableRequest) -> None:
+        if self.__handle is None:
+            self.__handle = open(self.__journal_file, mode='a', encoding='utf-8')
+        self.__seq += 1
+        self.__entries += 1
+        self.__handle.write(_dumps([self.__seq, op, req.serialize()]))
+        self.__handle.write('\n')
+        self.__handle.flush()
+
+    def seq(self) -> int:
+        """
+        The sequence number of the last appended entry.
+        """
+        return self.__seq
+
+    def entries(self) -> int:
+        """
+        The number of entries appended since the journal was opened, or last rotated.
+        """
+        return self.__entries
+
+    def rotate(self) -> None:
+        """
+        Moves the entries appended so far into a segment file, named after its last sequence number, so that
+        it can be removed once a snapshot including it is written (see `compact`), while appends carry on.
+        """
+        if self.__entries == 0:
+            return
+        self.__handle.close()
+        os.replace(self.__journal_file, f'{self.__journal_file}.{self.__seq}')
+        self.__handle = None
+        self.__entries = 0
+
+    def compact(self, snapshot_seq: int) -> None:
+        """
+        Removes the segments that a snapshot, which includes all entries up to `snapshot_seq`, has made redundant.
+        """
+        for segment_seq, segment in RequestJournal.segments(self.__journal_file):
+            if segment_seq <= snapshot_seq:
+                os.remove(segment)
+
+    def close(self) -> None:
+        if self.__handle is not None:
+            self.__handle.close()
+            self.__handle = None
+
+    @staticmethod
+    def segments(journal_file: str) -> List[Tuple[int, str]]:
+        """
+        The rotated segments of a journal, as (last sequence number, file path), in order.
+        """
+        directory, prefix = path.split(journal_file)
+        segments = []
+        for name in os.listdir(directory or '.'):
+            suffix = name[len(prefix) + 1:]
+            if name.startswith(prefix + '.') and suffix.isdigit():
+                segments.append((int(suffix), path.join(directory, name)))
+        return sorted(segments)
+
+    @staticmethod
+    def replay(journal_file: str,
+               seed: OrderedSet,
+               snapshot_seq: int) -> Tuple[OrderedSet, int]:
+        """
+        Applies the journal entries (across its segments) newer than `snapshot_seq` on top of the `seed` queue.
+        A torn (partially written) last line is ignored.
+
+        :return: The resulting queue, and the sequence number of the last entry applied.
+        """
+        files = [segment for _, segment in RequestJournal.segments(journal_file)] + [journal_file]
+        queue = dict.fromkeys(seed)  # O(1) removals, while preserving insertion order.
+        last_seq = snapshot_seq
+        for file in filter(path.exists, files):
+            with open(file, mode='r', encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        seq, op, serialized = _loads(line)
+                    except ValueError:
+                        break
+                    if seq <= snapshot_seq:
+                        continue
+                    req = SerializableRequest.deserialize(serialized)
+                    if op == RequestJournal.PUSH:
+                        queue.setdefault(req)
+                    else:
+                        queue.pop(req, None)
+                    last_seq = seq
+
+        return OrderedSet(queue), last_seq
+
+
 class RequestStack:
-    def __init__(self, seed: Optional[OrderedSet[SerializableRequest]], state: 'CrawlState'):
+    def __init__(self,
+                 seed: Optional[OrderedSet[SerializableRequest]],
+                 state: 'CrawlState',
+                 journal: Optional[RequestJournal] = None):
         self.__request_stack = seed
+        self.__in_flight: Set[SerializableRequest] = set()
         self.__state = state
+        self.__journal = journal
+        self.__lock = threading.Lock()
 
     def push_request(self, req: SerializableRequest) -> bool:
         """
         Whenever found a new request to query, push the request to the request queue instead of directly querying it.
         Note that each request has a dictionary `context` field to provide extra context when making it.
+
+        Returns whether the request was new.
         """
-        self.__request_stack.add(req)
+        with self.__lock:
+            is_new = req not in self.__request_stack and req not in self.__in_flight
+            if is_new:
+                self.__request_stack.add(req)
+                if self.__journal:
+                    self.__journal.append(RequestJournal.PUSH, req)
         self.__state.save()
+        return is_new
 
     def pop_request(self) -> Optional[SerializableRequest]:
         """
         Pop a request from the queue to query it.
         Note that each request has a dictionary `context` field to provide extra context when making it.
+
+        The request is removed as it's handed out, so should the crawl stop while it's being processed, it's lost
+        (at-most-once); see `claim_request` to keep it until it's acked.
         """
-        req = self.__request_stack.pop() if self.__request_stack else None
+        with self.__lock:
+            req = self.__request_stack.pop() if self.__request_stack else None
+            if req and self.__journal:
+                self.__journal.append(RequestJournal.REMOVE, req)
         if req:
             self.__state.save()
         return req
 
+    def claim_request(self) -> Optional[SerializableRequest]:
+        """
+        Takes the next request, as `pop_request` does, but keeps it (in-flight) until `ack_request` or `nack_request`
+        is called; should the crawl stop meanwhile, it's handed out again on resuming (at-least-once).
+        """
+        with self.__lock:
+            req = self.__request_stack.pop() if self.__request_stack else None
+            if req:
+                self.__in_flight.add(req)
+        return req
+
+    def ack_request(self, req: SerializableRequest) -> None:
+        """
+        Removes a claimed request, once it's been processed.
+        """
+        with self.__lock:
+            if req not in self.__in_flight:
+                return
+            self.__in_flight.remove(req)
+            if self.__journal:
+                self.__journal.append(RequestJournal.REMOVE, req)
+        self.__state.save()
+
+    def nack_request(self, req: SerializableRequest) -> None:
+        """
+        Returns a claimed request to the top of the stack, e.g. when processing it failed.
+        """
+        with self.__lock:
+            if req in self.__in_flight:
+                self.__in_flight.remove(req)
+                self.__request_stack.add(req)
+
+    def in_flight(self) -> int:
+        """
+        The number of claimed, but not yet acked, requests.
+        """
+        with self.__lock:
+            return len(self.__in_flight)
+
     def serialize_requests(self) -> Iterable[str]:
-        return list(map(lambda r: r.serialize(), self.__request_stack))
+        return list(map(lambda r: r.serialize(), self.snapshot()[0]))
+
+    def snapshot(self) -> Tuple[List[SerializableRequest], int]:
+        """
+        Returns a (shallow; requests are immutable) copy of the requests, alongside the journal sequence number
+        they include (0 without a journal). The journal is rotated, so that it can be compacted once the copy is saved.
+        In-flight requests are included last, so that they're the first to be retried if the crawl is resumed
+        before they're acked.
+        """
+        with self.__lock:
+            if self.__journal:
+                self.__journal.rotate()
+            return list(self.__request_stack) + list(self.__in_flight), self.journal_seq()
+
+    def journal_seq(self) -> int:
+        return self.__journal.seq() if self.__journal else 0
+
+    def journal_entries(self) -> int:
+        return self.__journal.entries() if self.__journal else 0
+
+    def compact_journal(self, snapshot_seq: int) -> None:
+        """
+        Call after a snapshot, taken via `snapshot()`, was written.
+        """
+        if self.__journal:
+            self.__journal.compact(snapshot_seq)
+
+    def close(self) -> None:
+        if self.__journal:
+            with self.__lock:
+                self.__journal.close()
 
     def __iter__(self):
         return self
@@ -106,20 +350,155 @@ class RequestStack:
             return req
 
 
+@dataclass(frozen=True)
+class SnapshotStats:
+    """
+    How long writing the state file has taken, across the snapshots written so far.
+    """
+    snapshots: int = 0
+    last_duration_sec: float = 0.0
+    max_duration_sec: float = 0.0
+    total_duration_sec: float = 0.0
+
+    @property
+    def mean_duration_sec(self) -> float:
+        return self.total_duration_sec / self.snapshots if self.snapshots else 0.0
+
+
+class _SnapshotWriter:
+    """
+    Serializes and writes state snapshots on a dedicated background thread, so that the thread calling `save`
+    only pays for copying references. A newer snapshot supersedes one that hasn't been written yet.
+    Each snapshot is written to a temporary file first, and renamed over the state file, so it's never torn.
+    """
+
+    def __init__(self, state_file: str, on_written: Callable[[int], None], log):
+        """
+        :param state_file: The file to write snapshots to.
+        :param on_written: Called with the snapshot's journal sequence number, after it's been written.
+        :param log: The owning state's logger.
+        """
+        self.__state_file = state_file
+        self.__on_written = on_written
+        self.__log = log
+        self.__cond = threading.Condition()
+        self.__pending: Optional[Tuple[dict, List[SerializableRequest], int]] = None
+        self.__submitted = 0
+        self.__written = 0
+        self.__error: Optional[BaseException] = None
+        self.__closed = False
+        self.__stats = SnapshotStats()
+        self.__thread = threading.Thread(target=self.__run, name='CrawlStateSnapshotWriter', daemon=True)
+        self.__thread.start()
+
+    def submit(self, state: dict, requests: List[SerializableRequest], journal_seq: int, wait: bool) -> None:
+        """
+        Queues a snapshot to be written.
+
+        :param state: The state, less its request queue, with `CrawlState.MISC` as a dict, still to be serialized;
+                      must not be mutated afterwards.
+        :param requests: The request queue, to be serialized under `CrawlState.REQUEST_QUEUE`.
+        :param journal_seq: The journal sequence number that the snapshot includes.
+        :param wait: Whether to block until the snapshot has been written.
+        """
+        with self.__cond:
+            self.__pending = (state, requests, journal_seq)
+            self.__submitted += 1
+            self.__cond.notify_all()
+        if wait:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Blocks until all submitted snapshots have been written; re-raises any error from writing them.
+        """
+        with self.__cond:
+            self.__cond.wait_for(lambda: self.__written >= self.__submitted or not self.__thread.is_alive())
+            error, self.__error = self.__error, None
+        if error:
+            raise error
+
+    def stats(self) -> SnapshotStats:
+        with self.__cond:
+            return self.__stats
+
+    def close(self) -> None:
+        self.flush()
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+        self.__thread.join()
+
+    def __run(self) -> None:
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__pending is not None or self.__closed)
+                if self.__pending is None:
+                    return
+                (state, requests, journal_seq), self.__pending = self.__pending, None
+                generation = self.__submitted
+
+            error = None
+            duration = 0.0
+            try:
+                duration = self.__write(state, requests, journal_seq)
+                self.__on_written(journal_seq)
+            except Exception as e:
+                self.__log.error(f'Failed writing state file: {e}')
+                error = e
+
+            with self.__cond:
+                if error:
+                    self.__error = error
+                else:
+                    stats = self.__stats
+                    self.__stats = SnapshotStats(snapshots=stats.snapshots + 1,
+                                                 last_duration_sec=duration,
+                                                 max_duration_sec=max(stats.max_duration_sec, duration),
+                                                 total_duration_sec=stats.total_duration_sec + duration)
+                self.__written = generation
+                self.__cond.notify_all()
+
+    def __write(self, state: dict, requests: List[SerializableRequest], journal_seq: int) -> float:
+        t1 = time.perf_counter()
+        state = dict(state)
+        state[CrawlState.MISC] = json.dumps(state[CrawlState.MISC])  # stored as a nested JSON string
+        state[CrawlState.REQUEST_QUEUE] = [r.serialize() for r in requests]
+        state[CrawlState.JOURNAL_SEQ] = journal_seq
+        tmp_file = f'{self.__state_file}.tmp'
+        with open(file=tmp_file, mode='w', encoding='utf-8') as state_file:
+            self.__log.info(f'Saving crawler state to {self.__state_file}...')
+            state_file.write(_dumps(state))
+        os.replace(tmp_file, self.__state_file)
+        duration = time.perf_counter() - t1
+        self.__log.info(f'Writing state file took: [{duration}] seconds')
+        return duration
+
+
 class CrawlState:
     """
     Constructs an object that manages crawler state.
     It will read any previous crawl state from a state file, and overwrite the state file when `save_state`
     is called, either if the `minimum_time_between_saves` has elapsed, or else, a "save signal" has been received.
+
+    A parent process asks for a save by sending `SAVE_SIGNAL` (where the platform has it), or by creating the
+    `SAVE_SIGNAL_FILE`, which is checked at most once per `SAVE_SIGNAL_FILE_CHECK_INTERVAL_SEC`; see `trigger_save`.
+    A crawler that handles `SAVE_SIGNAL` advertises it with a `SAVE_SIGNAL_HANDLER_FILE`, for as long as it does.
     """
 
     REQUEST_QUEUE = "___ReqQ"
     SGZIP_VISITED_CENTROIDS = "___VisitedSgzip"
     MISC = "___Misc"
     DUP_STREAK = "___DupStreak"
+    JOURNAL_SEQ = "___JournalSeq"
 
+    SAVE_SIGNAL = getattr(signal, 'SIGUSR1', None)
     SAVE_SIGNAL_FILE = '.save_state_trigger'
+    SAVE_SIGNAL_FILE_CHECK_INTERVAL_SEC = 5.0
+    SAVE_SIGNAL_HANDLER_FILE = '.save_state_handler.{pid}'
     STATE_FILE = 'state.json'
+    JOURNAL_FILE = 'state.journal'
+    JOURNAL_COMPACTION_THRESHOLD = 10000
     DEFAULT_DATA_FILE = 'data.csv'
 
     def increment_visited_coords(self, country_code: str) -> None:
@@ -151,6 +530,36 @@ class CrawlState:
         """
         Pop a request from the queue to query it.
         Note that each request has a dictionary `context` field to provide extra context when making it.
+
+        The request is removed as it's handed out, so should the crawl stop while it's being processed, it's lost
+        (at-most-once). To keep it until it's been processed, use `claim_request` and `ack_request` instead.
+        """
+        raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
+
+    def claim_request(self) -> Optional[SerializableRequest]:
+        """
+        Takes the next request, marking it in-flight; call `ack_request` once it's been processed, or `nack_request`
+        to return it. Should the crawl stop meanwhile, it's handed out again on resuming (at-least-once):
+        ```
+        for req in iter(state.claim_request, None):
+            try:
+                process(req)
+                state.ack_request(req)
+            except Exception:
+                state.nack_request(req)
+        ```
+        """
+        raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
+
+    def ack_request(self, req: SerializableRequest) -> None:
+        """
+        Removes a claimed request, once it's been processed.
+        """
+        raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
+
+    def nack_request(self, req: SerializableRequest) -> None:
+        """
+        Returns a claimed request to the queue, e.g. when processing it failed.
         """
         raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
 
@@ -166,6 +575,12 @@ class CrawlState:
         """
         raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
 
+    def set_duplicate_streak(self, value: int) -> None:
+        """
+        Sets the duplicate streak in memory only; it's persisted along with the next save.
+        """
+        raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
+
     def increment_and_get_duplicate_streak(self) -> int:
         """
         Increment the duplicate streak by 1, and fetch it
@@ -193,6 +608,12 @@ class CrawlState:
         """
         raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
 
+    def get_misc_keys(self, prefix: str = '') -> List[str]:
+        """
+        Lists the keys of the miscellaneous values in the state, optionally only those starting with `prefix`.
+        """
+        raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
+
     def save(self, override: bool = False) -> None:
         """
         Saves a (serializable!) dictionary into a JSON file, if a "save" signal has been received, or enough time has
@@ -202,6 +623,33 @@ class CrawlState:
         """
         raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
 
+    def snapshot_stats(self) -> SnapshotStats:
+        """
+        Returns metrics on how long writing state snapshots (in the background) has taken.
+        """
+        raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
+
+    def close(self) -> None:
+        """
+        Waits for any pending snapshot to be written, and releases any files held open by the state;
+        it should no longer be used afterwards.
+        """
+        raise NotImplementedError("Use CrawlStateSingleton.get_instance() instead of CrawlState()")
+
+    @staticmethod
+    def trigger_save(pid: Optional[int] = None) -> None:
+        """
+        For use by a parent process: asks a crawler to save its state, by creating the `SAVE_SIGNAL_FILE`,
+        and, if a `pid` is provided, by sending it the `SAVE_SIGNAL` as well, to be picked up immediately.
+
+        The signal is only sent if the crawler advertises a handler for it (see `SAVE_SIGNAL_HANDLER_FILE`), as it
+        would otherwise terminate the process; e.g. before its state is created, or after it's closed.
+        """
+        open(CrawlState.SAVE_SIGNAL_FILE, mode='a').close()
+        if pid is not None and CrawlState.SAVE_SIGNAL is not None \
+                and path.exists(CrawlState.SAVE_SIGNAL_HANDLER_FILE.format(pid=pid)):
+            os.kill(pid, CrawlState.SAVE_SIGNAL)
+
     @staticmethod
     def load_data(data_file: str = DEFAULT_DATA_FILE) -> Iterable[SgRecord]:
         """
@@ -213,6 +661,40 @@ class CrawlState:
                 for rec in reader:
                     yield SgRecord(raw=rec)
 
+    @staticmethod
+    def load_columns(data_file: str, columns: Iterable[str]) -> Iterable[Dict[str, str]]:
+        """
+        Streams only the requested `columns` of an existing data file (csv, or xlsx across all of its sheets),
+        as normalized str->str dicts, without constructing an `SgRecord` per row.
+        Columns missing from the file are yielded as `SgRecord.MISSING`.
+        """
+        columns = list(columns)
+        if not path.exists(data_file):
+            return
+
+        if data_file.lower().endswith('.xlsx'):
+            from openpyxl import load_workbook
+            workbook = load_workbook(data_file, read_only=True)
+            try:
+                for sheet in workbook.worksheets:
+                    rows = sheet.iter_rows(values_only=True)
+                    header = next(rows, None)
+                    if not header:
+                        continue
+                    indices = [header.index(col) if col in header else None for col in columns]
+                    for row in rows:
+                        if not any(cell is not None for cell in row):
+                            continue
+                        yield {col: SgRecord.normalize_or_missing(row[i] if i is not None and i < len(row) else None)
+                               for col, i in zip(columns, indices)}
+            finally:
+                workbook.close()
+        else:
+            with open(data_file, mode='r', encoding='utf-8') as dfile:
+                reader = csv.DictReader(dfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL, lineterminator='\n')
+                for rec in reader:
+                    yield {col: SgRecord.normalize_or_missing(rec.get(col)) for col in columns}
+
 
 class _CrawlStateImpl(CrawlState):
 
@@ -220,24 +702,61 @@ class _CrawlStateImpl(CrawlState):
     __state_file_lock = Lock()
 
     def __init__(self,
-                 minimum_time_between_saves: timedelta):
+                 minimum_time_between_saves: timedelta,
+                 frontier_db_path: Optional[str] = None,
+                 host_concurrency: Optional[Tuple[int, Dict[str, int]]] = None):
         """
         Constructs an object that manages crawler state.
         It will read any previous crawl state from a state file, and overwrite the state file when `save_state`
         is called, either if the `minimum_time_between_saves` has elapsed, or else, a "save signal" has been received.
 
         :param minimum_time_between_saves: The minimum time period, between which there is no need to save results.
+        :param frontier_db_path: [Optional] If set, requests are queued in a `SqliteRequestFrontier` at this path,
+                                 rather than in memory. Any requests queued in the state file are moved over to it.
+        :param host_concurrency: [Optional] If set, requests are queued in a `RequestScheduler`, with this
+                                 `(max_in_flight_per_host, host_limits)`.
         """
         _CrawlStateImpl.__instance_id += 1
         self.__log = SgLogSetup().get_logger(logger_name=f'CrawlState_{_CrawlStateImpl.__instance_id}')
         state = self.__load_state()
-        self.__request_stack: RequestStack = RequestStack(seed=self.__req_q_from_state(state), state=self)
+        req_q, last_seq = RequestJournal.replay(journal_file=CrawlState.JOURNAL_FILE,
+                                                seed=self.__req_q_from_state(state),
+                                                snapshot_seq=self.__journal_seq_from_state(state))
+        if frontier_db_path:
+            from .request_frontier import SqliteRequestFrontier
+            self.__request_stack = SqliteRequestFrontier(frontier_db_path)
+            self.__request_stack.push_requests(req_q)
+            for _, segment in RequestJournal.segments(CrawlState.JOURNAL_FILE):
+                remove(segment)
+            if path.exists(CrawlState.JOURNAL_FILE):
+                remove(CrawlState.JOURNAL_FILE)
+        elif host_concurrency:
+            from .request_scheduler import RequestScheduler
+            max_in_flight_per_host, host_limits = host_concurrency
+            self.__request_stack = RequestScheduler(seed=req_q,
+                                                    state=self,
+                                                    journal=RequestJournal(CrawlState.JOURNAL_FILE, last_seq),
+                                                    max_in_flight_per_host=max_in_flight_per_host,
+                                                    host_limits=host_limits)
+        else:
+            self.__request_stack = RequestStack(seed=req_q,
+                                                state=self,
+                                                journal=RequestJournal(CrawlState.JOURNAL_FILE, last_seq))
         self.__visited_centroids: Dict[str, int] = self.__visited_centroids_from_state(state)
         self.__dup_streak: int = self.__dup_streak_from_state(state)
         self.__misc: dict = self.__misc_from_state(state)
         self.__minimum_time_between_saves = minimum_time_between_saves
         self.__saved_on_signal_received = False
+        self.__save_signal_pending = False
+        self.__next_signal_file_check = 0.0
+        self.__prev_signal_handler = self.__install_signal_handler()
+        self.__snapshot_writer = _SnapshotWriter(state_file=CrawlState.STATE_FILE,
+                                                 on_written=self.__request_stack.compact_journal,
+                                                 log=self.__log)
+        atexit.register(self.__snapshot_writer.flush)
         self.__update_last_saved()
+        if frontier_db_path and req_q:
+            self.save(override=True)  # so that the moved-over requests aren't moved over again
 
     def increment_visited_coords(self, country_code: str) -> None:
         """
@@ -272,12 +791,32 @@ class _CrawlStateImpl(CrawlState):
         """
         Pop a request from the queue to query it.
         Note that each request has a dictionary `context` field to provide extra context when making it.
+        At-most-once; see `CrawlState.pop_request`.
         """
         return self.__request_stack.pop_request()
 
+    def claim_request(self) -> Optional[SerializableRequest]:
+        """
+        Takes the next request, marking it in-flight until it's acked or nacked; see `CrawlState.claim_request`.
+        """
+        return self.__request_stack.claim_request()
+
+    def ack_request(self, req: SerializableRequest) -> None:
+        """
+        Removes a claimed request, once it's been processed.
+        """
+        self.__request_stack.ack_request(req)
+
+    def nack_request(self, req: SerializableRequest) -> None:
+        """
+        Returns a claimed request to the queue, e.g. when processing it failed.
+        """
+        self.__request_stack.nack_request(req)
+
     def request_stack_iter(self) -> RequestStack:
         """
-        Returns the internal `RequestStack`, which can be conveniently used as an iterator
+        Returns the internal `RequestStack` (or `SqliteRequestFrontier`, or `RequestScheduler`),
+        which can be conveniently used as an iterator
         """
         return self.__request_stack
 
@@ -287,6 +826,12 @@ class _CrawlStateImpl(CrawlState):
         """
         return self.__dup_streak
 
+    def set_duplicate_streak(self, value: int) -> None:
+        """
+        Sets the duplicate streak in memory only; it's persisted along with the next save.
+        """
+        self.__dup_streak = value
+
     def increment_and_get_duplicate_streak(self) -> int:
         """
         Increment the duplicate streak by 1, and fetch it
@@ -325,32 +870,92 @@ class _CrawlStateImpl(CrawlState):
 
         return value
 
+    def get_misc_keys(self, prefix: str = '') -> List[str]:
+        """
+        Lists the keys of the miscellaneous values in the state, optionally only those starting with `prefix`.
+        """
+        return [key for key in list(self.__misc.keys()) if key.startswith(prefix)]
+
     def save(self, override: bool = False) -> None:
         """
         Saves a (serializable!) dictionary into a JSON file, if a "save" signal has been received, or enough time has
         elapsed since the last save.
+        The state is copied on the calling thread, and written to file in the background.
 
-        :param override: If set to True, will always save to file.
+        :param override: If set to True, will always save to file, and wait for the file to be written.
         """
         with _CrawlStateImpl.__state_file_lock:
             save_signal = self.__should_save_on_signal()
-            if override or save_signal or self.__is_time_to_save():
-                self.__update_last_saved()
-                self.__raise_saved_on_signal_flag(save_signal)
-                state = {
-                    CrawlState.REQUEST_QUEUE: self.__request_stack.serialize_requests(),
-                    CrawlState.SGZIP_VISITED_CENTROIDS: self.__visited_centroids,
-                    CrawlState.MISC: json.dumps(self.__misc),
-                    CrawlState.DUP_STREAK: self.__dup_streak
-                }
-                with open(file=CrawlState.STATE_FILE, mode='w', encoding='utf-8') as state_file:
-                    self.__log.info(f'Saving crawler state to {CrawlState.STATE_FILE}...')
-                    t1 = datetime.now()
-                    json.dump(state, state_file)
-                    t2 = datetime.now()
-                    self.__log.info(f'Writing state file took: [{(t2 - t1).total_seconds()}] seconds')
+            compact = self.__request_stack.journal_entries() >= CrawlState.JOURNAL_COMPACTION_THRESHOLD
+            if not (override or save_signal or compact or self.__is_time_to_save()):
+                return
+            self.__update_last_saved()
+            self.__raise_saved_on_signal_flag(save_signal)
+            requests, journal_seq = self.__request_stack.snapshot()
+            state = {
+                CrawlState.SGZIP_VISITED_CENTROIDS: dict(self.__visited_centroids),
+                CrawlState.MISC: dict(self.__misc),  # serialized by the snapshot writer
+                CrawlState.DUP_STREAK: self.__dup_streak
+            }
+            self.__snapshot_writer.submit(state, requests, journal_seq, wait=False)
+        if override:
+            self.__snapshot_writer.flush()
+
+    def snapshot_stats(self) -> SnapshotStats:
+        """
+        Returns metrics on how long writing state snapshots (in the background) has taken.
+        """
+        return self.__snapshot_writer.stats()
+
+    def close(self) -> None:
+        """
+        Waits for any pending snapshot to be written, and releases any files held open by the state;
+        it should no longer be used afterwards.
+        """
+        atexit.unregister(self.__snapshot_writer.flush)
+        self.__snapshot_writer.close()
+        if self.__prev_signal_handler is not None:
+            atexit.unregister(self.__withdraw_signal_handler)
+            self.__withdraw_signal_handler()
+            try:
+                signal.signal(CrawlState.SAVE_SIGNAL, self.__prev_signal_handler)
+            except ValueError:
+                pass  # not on the main thread
+        self.__request_stack.close()
+
+    def __install_signal_handler(self):
+        """
+        Returns the previous handler, or None if the handler could not be installed, in which case
+        only the `SAVE_SIGNAL_FILE` is used.
+        """
+        if CrawlState.SAVE_SIGNAL is None:
+            return None
+        try:
+            prev_handler = signal.signal(CrawlState.SAVE_SIGNAL, self.__on_save_signal)
+        except ValueError:
+            self.__log.info('Not on the main thread; save requests are only received via the signal file.')
+            return None
+        open(CrawlState.SAVE_SIGNAL_HANDLER_FILE.format(pid=os.getpid()), mode='a').close()
+        atexit.register(self.__withdraw_signal_handler)
+        return prev_handler
+
+    @staticmethod
+    def __withdraw_signal_handler():
+        """
+        Stops advertising the `SAVE_SIGNAL` handler, before it's uninstalled; see `trigger_save`.
+        """
+        try:
+            os.remove(CrawlState.SAVE_SIGNAL_HANDLER_FILE.format(pid=os.getpid()))
+        except FileNotFoundError:
+            pass
+
+    def __on_save_signal(self, signum, frame):
+        self.__save_signal_pending = True
 
     def __should_save_on_signal(self) -> bool:
+        if self.__save_signal_pending:
+            self.__save_signal_pending = False
+            return True
         save_signal_received = self.__save_signal_received()
         value = save_signal_received and not self.__saved_on_signal_received
         return value
@@ -390,16 +995,26 @@ class _CrawlStateImpl(CrawlState):
     def __dup_streak_from_state(state: dict) -> int:
         return state.get(CrawlState.DUP_STREAK) or 0
 
+    @staticmethod
+    def __journal_seq_from_state(state: dict) -> int:
+        return state.get(CrawlState.JOURNAL_SEQ) or 0
+
     @staticmethod
     def __misc_from_state(state: dict) -> dict:
         misc = state.get(CrawlState.MISC)
         return json.loads(misc) if misc else dict()
 
-    @staticmethod
-    def __save_signal_received() -> bool:
+    def __save_signal_received(self) -> bool:
         """
-        Tells the current process whether the parent process has asked to save state.
+        Tells the current process whether the parent process has asked to save state, via the signal file.
+        The file is checked at most once per `SAVE_SIGNAL_FILE_CHECK_INTERVAL_SEC`, as this is called on every `save`.
         """
+        if self.__saved_on_signal_received:
+            return True
+        now = time.monotonic()
+        if now < self.__next_signal_file_check:
+            return False
+        self.__next_signal_file_check = now + CrawlState.SAVE_SIGNAL_FILE_CHECK_INTERVAL_SEC
         return path.exists(CrawlState.SAVE_SIGNAL_FILE)
 
 class CrawlStateSingleton:
@@ -408,11 +1023,51 @@ class CrawlStateSingleton:
 
     DEFAULT_MIN_TIME_BETWEEN_SAVES = timedelta(seconds=30)
     __minimum_time_between_saves = DEFAULT_MIN_TIME_BETWEEN_SAVES
+    __frontier_db_path: Optional[str] = None
+    __host_concurrency: Optional[Tuple[int, Dict[str, int]]] = None
 
     @staticmethod
     def set_minimum_time_between_saves(duration: timedelta):
         CrawlStateSingleton.__minimum_time_between_saves = duration
 
+    @staticmethod
+    def set_state_file(state_file: str):
+        """
+        Keep the state in `state_file`, with its journal alongside it, instead of in the working directory;
+        e.g. so that several crawlers can run from the same directory. Must be called before the first `get_instance()`.
+        """
+        CrawlState.STATE_FILE = state_file
+        CrawlState.JOURNAL_FILE = f'{path.splitext(state_file)[0]}.journal'
+
+    @staticmethod
+    def discard_saved_state():
+        """
+        Deletes any previously-saved state (the state file and its journal), to start a crawl afresh.
+        Must be called before the first `get_instance()`.
+        """
+        segments = [segment for _, segment in RequestJournal.segments(CrawlState.JOURNAL_FILE)]
+        for file in [CrawlState.STATE_FILE, CrawlState.JOURNAL_FILE] + segments:
+            if path.exists(file):
+                remove(file)
+
+    @staticmethod
+    def set_frontier_db_path(db_path: Optional[str]):
+        """
+        Queue requests in an on-disk `SqliteRequestFrontier` at `db_path`, instead of in memory.
+        Must be called before the first `get_instance()`.
+        """
+        CrawlStateSingleton.__frontier_db_path = db_path
+
+    @staticmethod
+    def set_host_concurrency(max_in_flight_per_host: Optional[int], host_limits: Optional[Dict[str, int]] = None):
+        """
+        Queue requests in a `RequestScheduler`, which keeps a queue per host, and caps each host's in-flight
+        requests at `max_in_flight_per_host` (or its `host_limits` entry). Pass `None` to revert to the `RequestStack`.
+        Must be called before the first `get_instance()`.
+        """
+        CrawlStateSingleton.__host_concurrency = \
+            (max_in_flight_per_host, host_limits or {}) if max_in_flight_per_host is not None else None
+
     @staticmethod
     def get_instance() -> CrawlState:
         """
@@ -420,7 +1075,9 @@ class CrawlStateSingleton:
         """
         with CrawlStateSingleton.__lock:
             if not CrawlStateSingleton.__instance:
-                CrawlStateSingleton.__instance = _CrawlStateImpl(CrawlStateSingleton.__minimum_time_between_saves)
+                CrawlStateSingleton.__instance = _CrawlStateImpl(CrawlStateSingleton.__minimum_time_between_saves,
+                                                                 CrawlStateSingleton.__frontier_db_path,
+                                                                 CrawlStateSingleton.__host_concurrency)
             return CrawlStateSingleton.__instance
 
     @staticmethod
@@ -428,4 +1085,7 @@ class CrawlStateSingleton:
         """
         For test use; Do not use.
         """
+        if CrawlStateSingleton.__instance:
+            CrawlStateSingleton.__instance.close()
         CrawlStateSingleton.__instance = None
+
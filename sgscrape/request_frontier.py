@@ -0,0 +1,190 @@
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from .pause_resume import SerializableRequest
+
+
+class SqliteRequestFrontier:
+    """
+    An on-disk crawl frontier, backed by SQLite in WAL mode, as an alternative to the in-memory `RequestStack`.
+    Memory use is constant regardless of the frontier's size, and every push/claim is committed as it happens,
+    so that nothing is lost on a crash.
+
+    Requests are handed out by descending `priority`, then most-recently-pushed first (as `RequestStack` does).
+    A request that's been pushed is ignored until it's been acked, including while it's claimed.
+
+    It is thread-safe, and several processes can share the same database file.
+
+    Usage, via `CrawlState`, acking requests only once they've been processed (`pop_request` would ack them as it
+    hands them out):
+    ```
+    CrawlStateSingleton.set_frontier_db_path('frontier.db')
+    state = CrawlStateSingleton.get_instance()
+    for req in iter(state.claim_request, None):
+        try:
+            process(req)
+            state.ack_request(req)
+        except Exception:
+            state.nack_request(req)
+    ```
+    """
+
+    PENDING = 0
+    CLAIMED = 1
+
+    DEFAULT_BATCH_SIZE = 1000
+    DEFAULT_BUSY_TIMEOUT_SEC = 60.0
+
+    def __init__(self,
+                 db_path: str,
+                 requeue_claimed: bool = True,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 busy_timeout_sec: float = DEFAULT_BUSY_TIMEOUT_SEC):
+        """
+        :param db_path: The SQLite database file; created if needed.
+        :param requeue_claimed: Whether to return requests that were claimed but never acked (e.g. by a crashed run)
+                                to the frontier. Set to `False` when joining other processes that are still running.
+        :param batch_size: How many requests `push_requests` writes per transaction.
+        :param busy_timeout_sec: How long to wait for another process's write lock, before failing.
+        """
+        self.__batch_size = batch_size
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(db_path,
+                                      timeout=busy_timeout_sec,
+                                      isolation_level=None,
+                                      check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS frontier ("
+                            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                            "fingerprint TEXT NOT NULL UNIQUE, "
+                            "request TEXT NOT NULL, "
+                            "priority INTEGER NOT NULL DEFAULT 0, "
+                            "status INTEGER NOT NULL DEFAULT 0)")
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS frontier_next "
+                            "ON frontier (status, priority DESC, seq DESC)")
+        if requeue_claimed:
+            self.__conn.execute("UPDATE frontier SET status = ? WHERE status = ?",
+                                (SqliteRequestFrontier.PENDING, SqliteRequestFrontier.CLAIMED))
+
+    def __insert(self, req: SerializableRequest, priority: Optional[int]) -> bool:
+        cursor = self.__conn.execute("INSERT OR IGNORE INTO frontier (fingerprint, request, priority) VALUES (?, ?, ?)",
+                                     (req.fingerprint(), req.serialize(), req.priority if priority is None else priority))
+        return cursor.rowcount > 0
+
+    def push_request(self, req: SerializableRequest, priority: Optional[int] = None) -> bool:
+        """
+        Adds a request to the frontier, unless it's already there.
+
+        :param priority: Higher-priority requests are claimed first. Defaults to the request's own `priority`.
+        :return: Whether the request was new.
+        """
+        with self.__lock:
+            return self.__insert(req, priority)
+
+    def push_requests(self, reqs: Iterable[SerializableRequest], priority: Optional[int] = None) -> int:
+        """
+        Same as `push_request`, for many requests, in `batch_size`-d transactions.
+
+        :return: How many of the requests were new.
+        """
+        reqs = list(reqs)
+        added = 0
+        with self.__lock:
+            for start in range(0, len(reqs), self.__batch_size):
+                self.__conn.execute("BEGIN IMMEDIATE")
+                try:
+                    added += sum(self.__insert(req, priority) for req in reqs[start:start + self.__batch_size])
+                    self.__conn.execute("COMMIT")
+                except BaseException:
+                    self.__conn.execute("ROLLBACK")
+                    raise
+        return added
+
+    def claim_request(self) -> Optional[SerializableRequest]:
+        """
+        Atomically takes the next request, marking it in-flight; call `ack_request` or `nack_request` when done.
+        Returns `None` if there are no pending requests.
+        """
+        with self.__lock:
+            self.__conn.execute("BEGIN IMMEDIATE")
+            try:
+                row: Optional[Tuple[int, str]] = self.__conn.execute(
+                    "SELECT seq, request FROM frontier WHERE status = ? ORDER BY priority DESC, seq DESC LIMIT 1",
+                    (SqliteRequestFrontier.PENDING,)).fetchone()
+                if row:
+                    self.__conn.execute("UPDATE frontier SET status = ? WHERE seq = ?",
+                                        (SqliteRequestFrontier.CLAIMED, row[0]))
+                self.__conn.execute("COMMIT")
+            except BaseException:
+                self.__conn.execute("ROLLBACK")
+                raise
+        return SerializableRequest.deserialize(row[1]) if row else None
+
+    def ack_request(self, req: SerializableRequest) -> None:
+        """
+        Removes a claimed request from the frontier, once it's been processed.
+        """
+        with self.__lock:
+            self.__conn.execute("DELETE FROM frontier WHERE fingerprint = ?", (req.fingerprint(),))
+
+    def nack_request(self, req: SerializableRequest) -> None:
+        """
+        Returns a claimed request to the frontier, e.g. when processing it failed.
+        """
+        with self.__lock:
+            self.__conn.execute("UPDATE frontier SET status = ? WHERE fingerprint = ?",
+                                (SqliteRequestFrontier.PENDING, req.fingerprint()))
+
+    def pop_request(self) -> Optional[SerializableRequest]:
+        """
+        Claims and immediately acks the next request, as per `RequestStack.pop_request`; so should the crawl stop
+        while it's being processed, it's lost (at-most-once). Use `claim_request` and `ack_request` not to lose it.
+        """
+        req = self.claim_request()
+        if req:
+            self.ack_request(req)
+        return req
+
+    def claimed(self) -> int:
+        """
+        The number of in-flight requests, across all processes sharing the frontier.
+        """
+        with self.__lock:
+            return self.__conn.execute("SELECT COUNT(*) FROM frontier WHERE status = ?",
+                                       (SqliteRequestFrontier.CLAIMED,)).fetchone()[0]
+
+    def snapshot(self) -> Tuple[List[SerializableRequest], int]:
+        """
+        The frontier is durable on its own, so it contributes nothing to the `CrawlState` snapshot.
+        """
+        return [], 0
+
+    def journal_entries(self) -> int:
+        return 0
+
+    def compact_journal(self, snapshot_seq: int) -> None:
+        pass
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__conn.close()
+
+    def __iter__(self):
+        return self
+
+    def __len__(self):
+        """
+        The number of pending (unclaimed) requests.
+        """
+        with self.__lock:
+            return self.__conn.execute("SELECT COUNT(*) FROM frontier WHERE status = ?",
+                                       (SqliteRequestFrontier.PENDING,)).fetchone()[0]
+
+    def __next__(self):
+        req = self.pop_request()
+        if not req:
+            raise StopIteration
+        else:
+            return req
@@ -0,0 +1,231 @@
+import heapq
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from .pause_resume import CrawlState, RequestJournal, SerializableRequest
+
+
+class RequestScheduler:
+    """
+    A thread-safe request queue, as an alternative to `RequestStack`, that keeps a queue per host, and caps how many
+    requests to each host can be in flight at once; so that a slow or rate-limited host doesn't hold up the others.
+
+    Requests are handed out by descending `SerializableRequest.priority`; among hosts whose heads share the highest
+    priority, hosts take turns. Within a host, the most recently pushed request goes first (as `RequestStack` does).
+    A request that's been pushed is ignored until it's been acked, including while it's claimed.
+
+    Usage, via `CrawlState`:
+    ```
+    CrawlStateSingleton.set_host_concurrency(max_in_flight_per_host=4, host_limits={'www.zoro.com': 8})
+    state = CrawlStateSingleton.get_instance()
+    scheduler = state.request_stack_iter()
+
+    def worker():
+        for req in iter(lambda: scheduler.claim_request(block=True), None):
+            try:
+                process(req)
+                scheduler.ack_request(req)
+            except Exception:
+                scheduler.nack_request(req)
+    ```
+    """
+
+    DEFAULT_MAX_IN_FLIGHT_PER_HOST = 4
+
+    def __init__(self,
+                 seed: Iterable[SerializableRequest] = (),
+                 state: Optional[CrawlState] = None,
+                 journal: Optional[RequestJournal] = None,
+                 max_in_flight_per_host: int = DEFAULT_MAX_IN_FLIGHT_PER_HOST,
+                 host_limits: Optional[Dict[str, int]] = None):
+        """
+        :param seed: The initially-queued requests, oldest first.
+        :param state: [Optional] The state to `save()` on every change.
+        :param journal: [Optional] A journal to record pushes and acks in (see `RequestJournal`).
+        :param max_in_flight_per_host: How many requests to the same host may be claimed, but not yet acked, at once.
+        :param host_limits: Per-host overrides of `max_in_flight_per_host`, keyed on the URL's host (e.g. `www.zoro.com`).
+        """
+        self.__state = state
+        self.__journal = journal
+        self.__max_in_flight_per_host = max_in_flight_per_host
+        self.__host_limits = {host.lower(): limit for host, limit in (host_limits or {}).items()}
+        self.__cond = threading.Condition()
+        self.__seq = 0
+        self.__queues: Dict[str, List[Tuple[int, int, SerializableRequest]]] = {}
+        self.__hosts: List[str] = []  # in turn-taking order
+        self.__next_host = 0
+        self.__queued = 0
+        self.__in_flight: Dict[SerializableRequest, int] = {}  # -> seq
+        self.__in_flight_per_host: Dict[str, int] = {}
+        self.__known = set()
+        for req in seed:
+            self.__enqueue(req)
+
+    @staticmethod
+    def host_of(req: SerializableRequest) -> str:
+        return urlparse(req.url).netloc.lower()
+
+    def __limit(self, host: str) -> int:
+        return self.__host_limits.get(host, self.__max_in_flight_per_host)
+
+    def __enqueue(self, req: SerializableRequest, seq: Optional[int] = None) -> None:
+        host = RequestScheduler.host_of(req)
+        if host not in self.__queues:
+            self.__queues[host] = []
+            self.__hosts.append(host)
+            self.__in_flight_per_host[host] = 0
+        if seq is None:
+            self.__seq += 1
+            seq = self.__seq
+        heapq.heappush(self.__queues[host], (-req.priority, -seq, req))
+        self.__known.add(req)
+        self.__queued += 1
+
+    def __take(self) -> Optional[SerializableRequest]:
+        best_host, best_key, best_turn = None, None, 0
+        num_hosts = len(self.__hosts)
+        for turn in range(num_hosts):
+            host = self.__hosts[(self.__next_host + turn) % num_hosts]
+            queue = self.__queues[host]
+            if not queue or self.__in_flight_per_host[host] >= self.__limit(host):
+                continue
+            key = queue[0][0]
+            if best_key is None or key < best_key:
+                best_host, best_key, best_turn = host, key, turn
+        if best_host is None:
+            return None
+
+        self.__next_host = (self.__next_host + best_turn + 1) % num_hosts
+        _, neg_seq, req = heapq.heappop(self.__queues[best_host])
+        self.__queued -= 1
+        self.__in_flight[req] = -neg_seq
+        self.__in_flight_per_host[best_host] += 1
+        return req
+
+    def push_request(self, req: SerializableRequest) -> bool:
+        """
+        Queues the request, unless it's already queued or in flight.
+
+        :return: Whether the request was new.
+        """
+        with self.__cond:
+            is_new = req not in self.__known
+            if is_new:
+                self.__enqueue(req)
+                if self.__journal:
+                    self.__journal.append(RequestJournal.PUSH, req)
+                self.__cond.notify_all()
+        if is_new and self.__state:
+            self.__state.save()
+        return is_new
+
+    def claim_request(self, block: bool = False, timeout: Optional[float] = None) -> Optional[SerializableRequest]:
+        """
+        Takes the next request whose host is under its concurrency cap, marking it in-flight;
+        call `ack_request` or `nack_request` when done.
+
+        :param block: If set, waits for a request to become available, for as long as any are queued or in flight.
+        :param timeout: [Optional] The longest to wait, in seconds, when blocking.
+        :return: The request, or `None` if there's none available.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.__cond:
+            while True:
+                req = self.__take()
+                if req or not block or not (self.__queued or self.__in_flight):
+                    return req
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.__cond.wait(remaining)
+
+    def __release(self, req: SerializableRequest) -> Optional[int]:
+        seq = self.__in_flight.pop(req, None)
+        if seq is not None:
+            self.__in_flight_per_host[RequestScheduler.host_of(req)] -= 1
+            self.__cond.notify_all()
+        return seq
+
+    def ack_request(self, req: SerializableRequest) -> None:
+        """
+        Removes a claimed request, once it's been processed.
+        """
+        with self.__cond:
+            if self.__release(req) is None:
+                return
+            self.__known.discard(req)
+            if self.__journal:
+                self.__journal.append(RequestJournal.REMOVE, req)
+        if self.__state:
+            self.__state.save()
+
+    def nack_request(self, req: SerializableRequest) -> None:
+        """
+        Returns a claimed request to its queue, in its original place, e.g. when processing it failed.
+        """
+        with self.__cond:
+            seq = self.__release(req)
+            if seq is not None:
+                self.__enqueue(req, seq)
+
+    def pop_request(self) -> Optional[SerializableRequest]:
+        """
+        Claims and immediately acks the next request, as per `RequestStack.pop_request`; so should the crawl stop
+        while it's being processed, it's lost (at-most-once). Use `claim_request` and `ack_request` not to lose it.
+        """
+        req = self.claim_request()
+        if req:
+            self.ack_request(req)
+        return req
+
+    def in_flight(self) -> int:
+        """
+        The number of claimed, but not yet acked, requests.
+        """
+        with self.__cond:
+            return len(self.__in_flight)
+
+    def snapshot(self) -> Tuple[List[SerializableRequest], int]:
+        """
+        Returns the queued and in-flight requests, oldest first, alongside the journal sequence number they
+        include (0 without a journal); see `RequestStack.snapshot`. In-flight requests are included, so that
+        they're retried if the crawl is restarted before they're acked.
+        """
+        with self.__cond:
+            if self.__journal:
+                self.__journal.rotate()
+            entries = [(-neg_seq, req) for queue in self.__queues.values() for _, neg_seq, req in queue]
+            entries.extend((seq, req) for req, seq in self.__in_flight.items())
+            entries.sort(key=lambda entry: entry[0])
+            return [req for _, req in entries], self.__journal.seq() if self.__journal else 0
+
+    def journal_entries(self) -> int:
+        return self.__journal.entries() if self.__journal else 0
+
+    def compact_journal(self, snapshot_seq: int) -> None:
+        if self.__journal:
+            self.__journal.compact(snapshot_seq)
+
+    def close(self) -> None:
+        if self.__journal:
+            with self.__cond:
+                self.__journal.close()
+
+    def __iter__(self):
+        return self
+
+    def __len__(self):
+        """
+        The number of queued (unclaimed) requests.
+        """
+        with self.__cond:
+            return self.__queued
+
+    def __next__(self):
+        req = self.pop_request()
+        if not req:
+            raise StopIteration
+        else:
+            return req
@@ -2,6 +2,8 @@ from dataclasses import MISSING, dataclass
 from os import PRIO_PROCESS, defpath
 from typing import List, Dict, Optional, Literal, Union
 
+from .sgrecord_typed import SgTypedFields
+
 
 class SgRecord:
     """
@@ -275,6 +277,7 @@ class SgRecord:
 
         self.__as_row = self.__to_row()
         self.__as_dict = self.__to_dict()
+        self.__typed: Optional[SgTypedFields] = None
 
     def __from_dict(self, raw: Dict[str, str]):
         """
@@ -474,6 +477,22 @@ class SgRecord:
     # def raw_address(self) -> str:
     #     return self.__raw_address
 
+    def typed(self) -> SgTypedFields:
+        """
+        The price and dimensions, parsed into numbers (see `SgTypedFields`).
+        Parsed once, upon first access, and cached thereafter.
+        """
+        if self.__typed is None:
+            self.__typed = SgTypedFields.parse(price=self.__price,
+                                               width=self.__width,
+                                               width_unit=self.__width_unit,
+                                               height=self.__height,
+                                               height_unit=self.__height_unit,
+                                               depth=self.__depth,
+                                               weight=self.__weight,
+                                               weight_uom=self.__weight_uom)
+        return self.__typed
+
     def as_row(self) -> List[str]:
         return self.__as_row
 
@@ -539,6 +558,13 @@ class SgRecord:
     def __str__(self) -> str:
         return str(self.__to_dict())
 
+    @staticmethod
+    def normalize_or_missing(field_value: Optional[object]) -> str:
+        """
+        Normalizes a raw field value exactly as the constructor does; useful when bypassing `SgRecord` altogether.
+        """
+        return SgRecord.__normalize_or_missing(field_value)
+
     @staticmethod
     def __normalize_or_missing(field_value: Optional[object]) -> str:
         if isinstance(field_value, float):
@@ -0,0 +1,202 @@
+from decimal import Decimal
+from typing import Dict, List, Optional, Iterable, Iterator, Sequence
+
+from .sgrecord import SgRecord
+from .sgrecord_typed import parse_price, parse_measure
+
+
+class SgRecordBatch:
+    """
+    A columnar batch of records, keyed on `SgRecord.Headers.HEADER_ROW`.
+
+    Each column is a plain list of normalized strings (see `SgRecord.normalize_or_missing`), so converting
+    to and from pandas / Arrow doesn't require constructing an `SgRecord` per row.
+
+    Usage:
+    ```
+    batch = SgRecordBatch.from_records(records)
+    df = batch.to_pandas()
+    with SgWriter(deduper=SgRecordDeduper(SgRecordID({SgRecord.Headers.ITEM_URL}))) as writer:
+        writer.write_batch(SgRecordBatch.from_pandas(df))
+    ```
+    """
+
+    DEPTH_UNIT = "depth_unit"
+
+    # Measure header -> the header that holds its unit, in typed output.
+    TYPED_MEASURES = {
+        SgRecord.Headers.WIDTH: SgRecord.Headers.WIDTH_UNIT,
+        SgRecord.Headers.HEIGHT: SgRecord.Headers.HEIGHT_UNIT,
+        SgRecord.Headers.DEPTH: DEPTH_UNIT,
+        SgRecord.Headers.WEIGHT: SgRecord.Headers.WEIGHT_UOM
+    }
+
+    ARROW_PRICE_TYPE_ARGS = (18, 4)  # decimal128(precision, scale)
+
+    def __init__(self, columns: Optional[Dict[str, Sequence[str]]] = None):
+        """
+        :param columns: A dict of `SgRecord.Headers` -> column values. All columns must be of equal length;
+                        headers that aren't provided are filled with `SgRecord.MISSING`.
+                        Values are taken as-is, and are expected to already be normalized.
+        """
+        columns = columns or {}
+        unknown = set(columns.keys()).difference(SgRecord.Headers.HEADER_ROW)
+        if unknown:
+            raise ValueError(f"Unknown record headers: {sorted(unknown)}")
+
+        lengths = {len(col) for col in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"All columns must be of equal length. Found lengths: {sorted(lengths)}")
+
+        self.__size = lengths.pop() if lengths else 0
+        self.__columns: Dict[str, List[str]] = {
+            header: list(columns[header]) if header in columns else [SgRecord.MISSING] * self.__size
+            for header in SgRecord.Headers.HEADER_ROW
+        }
+
+    @staticmethod
+    def from_records(records: Iterable[SgRecord]) -> 'SgRecordBatch':
+        """
+        Transposes the records into columns.
+        """
+        rows = [rec.as_row() for rec in records]
+        if not rows:
+            return SgRecordBatch()
+        return SgRecordBatch(dict(zip(SgRecord.Headers.HEADER_ROW, map(list, zip(*rows)))))
+
+    @staticmethod
+    def from_pandas(df) -> 'SgRecordBatch':
+        """
+        Creates a batch from a `pandas.DataFrame`, whose columns are named after `SgRecord.Headers`.
+        Columns not in `SgRecord.Headers.HEADER_ROW` are ignored; `NaN`/`None` values become `SgRecord.MISSING`.
+        """
+        columns = {}
+        for header in SgRecord.Headers.HEADER_ROW:
+            if header in df.columns:
+                series = df[header]
+                values = series.astype(object).where(series.notna(), None).tolist()
+                columns[header] = [SgRecord.normalize_or_missing(v) for v in values]
+        if not columns:
+            return SgRecordBatch({SgRecord.Headers.HEADER_ROW[0]: [SgRecord.MISSING] * len(df.index)})
+        return SgRecordBatch(columns)
+
+    @staticmethod
+    def from_arrow(table) -> 'SgRecordBatch':
+        """
+        Creates a batch from a `pyarrow.Table`, whose columns are named after `SgRecord.Headers`.
+        Columns not in `SgRecord.Headers.HEADER_ROW` are ignored; nulls become `SgRecord.MISSING`.
+        """
+        columns = {}
+        for header in SgRecord.Headers.HEADER_ROW:
+            if header in table.column_names:
+                columns[header] = [SgRecord.normalize_or_missing(v) for v in table.column(header).to_pylist()]
+        if not columns:
+            return SgRecordBatch({SgRecord.Headers.HEADER_ROW[0]: [SgRecord.MISSING] * table.num_rows})
+        return SgRecordBatch(columns)
+
+    def to_pandas(self, typed: bool = False):
+        """
+        Returns a `pandas.DataFrame` with one column per `SgRecord.Headers.HEADER_ROW` entry.
+
+        :param typed: If set, the price and measure columns are written as `float64` (`NaN` where unparseable),
+                      and units are filled in from the parsed values (see `typed_columns`).
+        """
+        import pandas as pd
+        if not typed:
+            return pd.DataFrame(self.__columns, columns=SgRecord.Headers.HEADER_ROW)
+
+        columns = dict(self.__columns)
+        typed_cols = self.typed_columns()
+        columns[SgRecord.Headers.PRICE] = [float(p) if p is not None else None
+                                           for p in typed_cols.pop(SgRecord.Headers.PRICE)]
+        columns.update(typed_cols)
+        df = pd.DataFrame(columns, columns=SgRecord.Headers.HEADER_ROW + [SgRecordBatch.DEPTH_UNIT])
+        for header in [SgRecord.Headers.PRICE] + list(SgRecordBatch.TYPED_MEASURES.keys()):
+            df[header] = df[header].astype('float64')
+        return df
+
+    def to_arrow(self, typed: bool = False):
+        """
+        Returns a `pyarrow.Table`, one column per `SgRecord.Headers.HEADER_ROW` entry.
+        Requires the optional `pyarrow` dependency.
+
+        :param typed: If set, price is written as `decimal128(18, 4)`, measures as `float64` (null where
+                      unparseable), and units are filled in from the parsed values (see `typed_columns`).
+                      Otherwise, all columns are strings.
+        """
+        import pyarrow as pa
+        if not typed:
+            return pa.table({header: pa.array(self.__columns[header], type=pa.string())
+                             for header in SgRecord.Headers.HEADER_ROW})
+
+        typed_cols = self.typed_columns()
+        scale = Decimal(1).scaleb(-SgRecordBatch.ARROW_PRICE_TYPE_ARGS[1])
+        arrays = {}
+        for header in SgRecord.Headers.HEADER_ROW + [SgRecordBatch.DEPTH_UNIT]:
+            if header == SgRecord.Headers.PRICE:
+                arrays[header] = pa.array([p.quantize(scale) if p is not None else None for p in typed_cols[header]],
+                                          type=pa.decimal128(*SgRecordBatch.ARROW_PRICE_TYPE_ARGS))
+            elif header in SgRecordBatch.TYPED_MEASURES:
+                arrays[header] = pa.array(typed_cols[header], type=pa.float64())
+            else:
+                arrays[header] = pa.array(typed_cols.get(header, self.__columns.get(header)), type=pa.string())
+        return pa.table(arrays)
+
+    def typed_columns(self) -> Dict[str, list]:
+        """
+        Parses the price and measure columns once for the whole batch (see `SgTypedFields`).
+
+        :return: price as `Decimal`, each of `TYPED_MEASURES` as `float` (`None` where unparseable or missing),
+                 and each measure's unit column, filled in from the parsed value where the unit was missing.
+        """
+        typed_cols = {SgRecord.Headers.PRICE: [parse_price(p) if p else None
+                                               for p in self.__columns[SgRecord.Headers.PRICE]]}
+        for header, unit_header in SgRecordBatch.TYPED_MEASURES.items():
+            units = self.__columns.get(unit_header) or [SgRecord.MISSING] * self.__size
+            measures = [parse_measure(v, u) if v else None for v, u in zip(self.__columns[header], units)]
+            typed_cols[header] = [m.value if m else None for m in measures]
+            typed_cols[unit_header] = [u or (m.unit if m else SgRecord.MISSING) for m, u in zip(measures, units)]
+        return typed_cols
+
+    def column(self, header: SgRecord.Headers.HeaderUnion) -> List[str]:
+        """
+        Returns the column's values. The returned list is the batch's own; do not mutate it.
+        """
+        return self.__columns[header]
+
+    def select(self, indices: Iterable[int]) -> 'SgRecordBatch':
+        """
+        Returns a new batch, containing only the rows at the provided indices (in the provided order).
+        """
+        indices = list(indices)
+        return SgRecordBatch({header: [col[i] for i in indices] for header, col in self.__columns.items()})
+
+    def rows(self) -> Iterator[List[str]]:
+        """
+        Iterates the batch row-wise, with values ordered as `SgRecord.Headers.HEADER_ROW`.
+        """
+        cols = [self.__columns[header] for header in SgRecord.Headers.HEADER_ROW]
+        for i in range(self.__size):
+            yield [col[i] for col in cols]
+
+    def row_dicts(self, headers: Optional[Iterable[SgRecord.Headers.HeaderUnion]] = None) -> Iterator[Dict[str, str]]:
+        """
+        Iterates the batch row-wise as dicts, optionally restricted to a subset of `headers`.
+        """
+        headers = list(headers) if headers is not None else SgRecord.Headers.HEADER_ROW
+        cols = [self.__columns[header] for header in headers]
+        for i in range(self.__size):
+            yield {header: col[i] for header, col in zip(headers, cols)}
+
+    def records(self) -> Iterator[SgRecord]:
+        """
+        Iterates the batch as `SgRecord`s.
+        """
+        for row_dict in self.row_dicts():
+            yield SgRecord(raw=row_dict)
+
+    def __len__(self):
+        return self.__size
+
+    def __str__(self) -> str:
+        return f"SgRecordBatch(rows={self.__size})"
@@ -1,8 +1,10 @@
-from typing import Set, Tuple
+from typing import Tuple, List, Optional
 
 from .pause_resume import CrawlState, CrawlStateSingleton
 from .sgrecord import SgRecord
+from .sgrecord_batch import SgRecordBatch
 from .sgrecord_id import SgRecordID
+from .sgrecord_id_store import IdStore, InMemoryIdStore
 
 
 class DupCycleDetectedError(Exception):
@@ -22,23 +24,34 @@ class SgRecordDeduper:
 
     DUPLICATE_STREAK_MINIMUM = 1000
     DUPLICATE_STREAK_DEFAULT_FAILURE_FACTOR = 2.0
+    EXISTING_FILE_CHUNK_SIZE = 10000
+    DUP_STREAK_CHECKPOINT_EVERY = 1000
 
     def __init__(self,
                  record_id: SgRecordID,
                  duplicate_streak_failure_factor: float = DUPLICATE_STREAK_DEFAULT_FAILURE_FACTOR,
-                 data_file_path: str = CrawlState.DEFAULT_DATA_FILE):
+                 data_file_path: Optional[str] = CrawlState.DEFAULT_DATA_FILE,
+                 id_store: Optional[IdStore] = None):
         """
         Deduplicates records by holding an internal set of record ids.
+        If the `record_id` is `hashed`, only the fixed-width digests of the ids are held.
 
         :param record_id: The way by which to deduplicate a record.
         :param duplicate_streak_failure_factor: How much bigger should the duplicate streak be than the set of
                                                 unique ids, to trigger a failure? [Defaults to 2]
-        :param data_file_path: The path to the existing data file.
+        :param data_file_path: The path to the existing data file (csv or xlsx), whose records are considered
+                               already encountered. Only the id columns are read. `None` skips reading.
+        :param id_store: Where to hold the encountered ids. Defaults to an exact, in-memory `InMemoryIdStore`;
+                         use e.g. a `ScalableBloomIdStore` to dedup within a fixed memory budget.
         """
         self.__id = record_id
-        self.__encountered_ids: Set[str] = self.__read_existing_file(record_id, data_file_path)
+        self.__encountered_ids: IdStore = id_store if id_store is not None else InMemoryIdStore()
+        self.__read_existing_file(record_id, data_file_path, self.__encountered_ids)
+        self.__uniq_ids = len(self.__encountered_ids)
         self.__duplicate_streak_failure_factor: float = duplicate_streak_failure_factor
         self.__state = CrawlStateSingleton.get_instance()
+        self.__dup_streak = self.__state.get_duplicate_streak()
+        self.__since_checkpoint = 0
 
     def get_id(self) -> SgRecordID:
         """
@@ -49,13 +62,24 @@ class SgRecordDeduper:
     def __err_if_cycle_detected(self, is_next_duplicate: bool):
         """
         Errors out if duplicate streak is too long (maximum of either the DUPLICATE_STREAK_MINIMUM, or deduped ids)
+
+        The streak is kept in memory, and handed to the crawl state without saving it; a (time-gated) save is only
+        requested every DUP_STREAK_CHECKPOINT_EVERY records, so the hot path does no I/O.
         """
         if is_next_duplicate:
-            dup_streak = self.__state.increment_and_get_duplicate_streak()
+            self.__dup_streak += 1
         else:
-            dup_streak = self.__state.reset_and_get_duplicate_streak()
+            self.__dup_streak = 0
+            self.__uniq_ids += 1
+
+        dup_streak = self.__dup_streak
+        uniq_ids = self.__uniq_ids
+        self.__state.set_duplicate_streak(dup_streak)
 
-        uniq_ids = len(self.__encountered_ids)
+        self.__since_checkpoint += 1
+        if self.__since_checkpoint >= SgRecordDeduper.DUP_STREAK_CHECKPOINT_EVERY:
+            self.__since_checkpoint = 0
+            self.__state.save()
 
         if dup_streak / self.__duplicate_streak_failure_factor > max(SgRecordDeduper.DUPLICATE_STREAK_MINIMUM, uniq_ids):
             raise DupCycleDetectedError(dup_streak=dup_streak,
@@ -63,24 +87,60 @@ class SgRecordDeduper:
                                         dup_streak_failure_factor=self.__duplicate_streak_failure_factor)
 
     @staticmethod
-    def __read_existing_file(record_id: SgRecordID, data_file_path: str) -> Set[str]:
-        ids = set()
-        for rec in CrawlState.load_data(data_file_path):
-            ids.add(record_id.generate_id(rec))
-        return ids
+    def __read_existing_file(record_id: SgRecordID, data_file_path: Optional[str], id_store: IdStore) -> None:
+        if not data_file_path:
+            return
+        keys = []
+        for id_dict in CrawlState.load_columns(data_file_path, record_id.id_fields):
+            keys.append(record_id.to_key(record_id.generate_id_from_dict(id_dict)))
+            if len(keys) >= SgRecordDeduper.EXISTING_FILE_CHUNK_SIZE:
+                id_store.contains_or_add_all(keys)
+                keys = []
+        id_store.contains_or_add_all(keys)
+        # these records are already on file.
+        id_store.commit()
 
     def dedup(self, record: SgRecord) -> Tuple[bool, str]:
         """
         Returns a tuple signifying: (is_duplicate?, generated_identity)
         """
-        rec_id = self.__id.generate_id(record)
-        if rec_id in self.__encountered_ids:
-            self.__err_if_cycle_detected(True)
-            return True, rec_id
-        else:
-            self.__encountered_ids.add(rec_id)
-            self.__err_if_cycle_detected(False)
-            return False, rec_id
+        return self.__dedup_id(self.__id.generate_id(record))
+
+    def dedup_batch(self, batch: SgRecordBatch) -> List[Tuple[bool, str]]:
+        """
+        Deduplicates a whole batch, reading only its id columns.
+        Returns a list of (is_duplicate?, generated_identity), aligned with the batch rows.
+        """
+        rec_ids = [self.__id.generate_id_from_dict(id_dict) for id_dict in batch.row_dicts(self.__id.id_fields)]
+        are_dups = self.__encountered_ids.contains_or_add_all(self.__id.to_key(rec_id) for rec_id in rec_ids)
+        results = []
+        for is_dup, rec_id in zip(are_dups, rec_ids):
+            self.__err_if_cycle_detected(is_dup)
+            results.append((is_dup, rec_id))
+        return results
+
+    def __dedup_id(self, rec_id: str) -> Tuple[bool, str]:
+        is_dup = self.__encountered_ids.contains_or_add(self.__id.to_key(rec_id))
+        self.__err_if_cycle_detected(is_dup)
+        return is_dup, rec_id
 
     def unique_ids(self) -> int:
+        """
+        The number of unique ids in the id store; for a shared store, that includes ids added by other workers.
+        """
         return len(self.__encountered_ids)
+
+    def commit(self) -> None:
+        """
+        Makes the ids deduplicated so far durable in the id store (see `IdStore.commit`); call once their records
+        are saved, e.g. from `SgWriter`'s `on_save`.
+        """
+        self.__encountered_ids.commit()
+
+    def close(self) -> None:
+        """
+        Saves the duplicate streak, and releases the id store.
+        """
+        self.__state.set_duplicate_streak(self.__dup_streak)
+        self.__state.save(override=True)
+        self.__encountered_ids.close()
@@ -1,6 +1,7 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from functools import partial
-from typing import Set, Tuple, Dict, Callable, Any
+from hashlib import blake2b
+from typing import Set, Tuple, Dict, Callable, Any, Optional, Union
 
 from .sgrecord import SgRecord
 from sglogging import SgLogSetup
@@ -10,10 +11,25 @@ _log = SgLogSetup().get_logger('SgRecordID')
 
 @dataclass(frozen=True)
 class SgRecordID:
+    """
+    Defines a record's identity, as a composite of `id_fields`.
+
+    When `hashed` is set, the deduplication key (see `to_key`) is a fixed-width integer digest of the
+    human-readable identity, instead of the identity string itself; `generate_id` is unaffected, so it can still
+    be used for logging. `digest_bits` is one of `SgRecordID.SUPPORTED_DIGEST_BITS`.
+    """
     id_fields: Set[SgRecord.Headers.HeaderUnion] = field(default_factory=set)
     fail_on_empty_field: bool = False
     fail_on_empty_id: bool = True
     transformations: Dict[SgRecord.Headers.HeaderUnion, Tuple[str, Callable[[Any], str]]] = field(default_factory=dict)
+    hashed: bool = False
+    digest_bits: int = 64
+
+    SUPPORTED_DIGEST_BITS = (64, 128)
+
+    def __post_init__(self):
+        if self.digest_bits not in SgRecordID.SUPPORTED_DIGEST_BITS:
+            raise ValueError(f"digest_bits must be one of {SgRecordID.SUPPORTED_DIGEST_BITS}. Got: {self.digest_bits}")
 
     def with_truncate(self, header: SgRecord.Headers.HeaderUnion, nums_after_decimal: int) -> 'SgRecordID':
         def truncate_decimal(after_decimal: int, value: Any) -> str:
@@ -32,7 +48,7 @@ class SgRecordID:
 
         upd_transforms = dict()
         upd_transforms.update(self.transformations.copy(), **{header: (identifier, fn)})
-        return SgRecordID(id_fields=self.id_fields, transformations=upd_transforms)
+        return replace(self, transformations=upd_transforms)
 
     def generate_id(self, record: SgRecord) -> str:
         """
@@ -41,9 +57,15 @@ class SgRecordID:
         Fails with `ValueError` either when one of the fields is empty or marked missing,
         or else when composite identity is empty.
         """
-        rec_dict = record.as_dict()
+        return self.generate_id_from_dict(record.as_dict())
+
+    def generate_id_from_dict(self, rec_dict: Dict[str, Optional[str]]) -> str:
+        """
+        Same as `generate_id`, but works on a dict keyed on `SgRecord.Headers`, which needs only contain the id fields.
+        Useful for columnar or streaming paths that don't construct an `SgRecord`.
+        """
         ident = ""
-        for field in self.id_fields:
+        for field in sorted(self.id_fields):
             value = rec_dict.get(field)
             if value and value != SgRecord.MISSING:
                 transform = self.transformations.get(field)
@@ -54,15 +76,33 @@ class SgRecordID:
 
         if not ident:
             if self.fail_on_empty_id:
-                raise ValueError(f"Composite record identity '{self.__str__()}' is empty. Record: {record}")
+                raise ValueError(f"Composite record identity '{self.__str__()}' is empty. Record: {rec_dict}")
             else:
-                _log.debug(f"Composite record identity '{self.__str__()}' is empty. Record: {record}")
+                _log.debug(f"Composite record identity '{self.__str__()}' is empty. Record: {rec_dict}")
 
         return ident
 
+    def generate_digest(self, record: SgRecord) -> int:
+        """
+        Generates a stable, field-order-independent `digest_bits`-wide integer digest of the record's identity.
+        """
+        return self.digest_of(self.generate_id(record))
+
+    def digest_of(self, ident: str) -> int:
+        """
+        Digests an identity generated by `generate_id` into a `digest_bits`-wide integer.
+        """
+        return int.from_bytes(blake2b(ident.encode('utf-8'), digest_size=self.digest_bits // 8).digest(), 'big')
+
+    def to_key(self, ident: str) -> Union[str, int]:
+        """
+        The deduplication key for an identity generated by `generate_id`: its digest if `hashed`; else, itself.
+        """
+        return self.digest_of(ident) if self.hashed else ident
+
     def __str__(self) -> str:
         reprs = []
-        for field in self.id_fields:
+        for field in sorted(self.id_fields):
             transform = self.transformations.get(field)
             t_id = f"%{transform[0]}" if transform else ""
             reprs.append(f"{field}{t_id}")
@@ -0,0 +1,317 @@
+import math
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from hashlib import blake2b
+from typing import Iterable, List, Optional, Set, Tuple, Union
+
+IdKey = Union[str, int]
+
+
+class IdStore(ABC):
+    """
+    A set-like store of record-id keys (see `SgRecordID.to_key`), backing an `SgRecordDeduper`.
+    """
+
+    @abstractmethod
+    def contains_or_add(self, key: IdKey) -> bool:
+        """
+        Returns whether the key was already present; if it wasn't, it is added.
+        """
+
+    def contains_or_add_all(self, keys: Iterable[IdKey]) -> List[bool]:
+        """
+        Same as `contains_or_add`, in order, for each of the keys. Keys repeated within `keys` are duplicates.
+        """
+        return [self.contains_or_add(key) for key in keys]
+
+    def commit(self) -> None:
+        """
+        Makes the keys added so far durable, for stores that defer it; e.g. once their records are saved to file.
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Releases any resources held by the store.
+        """
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+
+class InMemoryIdStore(IdStore):
+    """
+    An exact store, backed by a `set`. This is the default.
+    """
+
+    def __init__(self):
+        self.__ids: Set[IdKey] = set()
+
+    def contains_or_add(self, key: IdKey) -> bool:
+        if key in self.__ids:
+            return True
+        self.__ids.add(key)
+        return False
+
+    def __len__(self):
+        return len(self.__ids)
+
+
+class _BloomFilter:
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self.capacity = capacity
+        self.num_bits = max(8, math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self.__bits = bytearray((self.num_bits + 7) // 8)
+
+    def positions(self, h1: int, h2: int) -> List[int]:
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def contains(self, h1: int, h2: int) -> bool:
+        bits = self.__bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(h1, h2))
+
+    def add(self, h1: int, h2: int) -> None:
+        bits = self.__bits
+        for pos in self.positions(h1, h2):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+    def size_bytes(self) -> int:
+        return len(self.__bits)
+
+
+class ScalableBloomIdStore(IdStore):
+    """
+    A memory-bounded, probabilistic store: a scalable Bloom filter (Almeida et al., 2007).
+
+    Whenever the current filter reaches its capacity, a new one is added, `growth_factor` times larger, and with
+    a `tightening_ratio` times smaller false-positive rate, so that the compound rate stays under
+    `false_positive_rate` however many ids are added.
+
+    There are no false negatives, but a false positive means a unique record is treated as a duplicate.
+    To rule those out, pass an exact `confirm_store`: it is consulted only when the filter reports a hit.
+    Note that the `confirm_store` receives every key, so it should be one that doesn't hold its keys in memory,
+    such as a `SqliteIdStore`.
+    """
+
+    DEFAULT_INITIAL_CAPACITY = 1_000_000
+    DEFAULT_FALSE_POSITIVE_RATE = 0.001
+
+    def __init__(self,
+                 initial_capacity: int = DEFAULT_INITIAL_CAPACITY,
+                 false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE,
+                 growth_factor: int = 2,
+                 tightening_ratio: float = 0.5,
+                 confirm_store: Optional[IdStore] = None):
+        """
+        :param initial_capacity: How many ids the first filter holds before a new one is added.
+        :param false_positive_rate: The upper bound on the compound false-positive rate.
+        :param growth_factor: How much bigger each new filter is than the previous one.
+        :param tightening_ratio: By how much each new filter's false-positive rate is tightened.
+        :param confirm_store: Optionally, an exact store that confirms (or refutes) the filter's hits.
+        """
+        if not 0 < false_positive_rate < 1:
+            raise ValueError(f"false_positive_rate must be between 0 and 1. Got: {false_positive_rate}")
+        if not 0 < tightening_ratio < 1:
+            raise ValueError(f"tightening_ratio must be between 0 and 1. Got: {tightening_ratio}")
+
+        self.__initial_capacity = initial_capacity
+        self.__false_positive_rate = false_positive_rate
+        self.__growth_factor = growth_factor
+        self.__tightening_ratio = tightening_ratio
+        self.__confirm_store = confirm_store
+        self.__filters: List[_BloomFilter] = []
+        self.__count = 0
+        self.__false_positives = 0
+        self.__lock = threading.Lock()
+        self.__add_filter()
+
+    def __add_filter(self) -> None:
+        i = len(self.__filters)
+        capacity = self.__initial_capacity * (self.__growth_factor ** i)
+        rate = self.__false_positive_rate * (1 - self.__tightening_ratio) * (self.__tightening_ratio ** i)
+        self.__filters.append(_BloomFilter(capacity, rate))
+
+    @staticmethod
+    def __hashes(key: IdKey) -> Tuple[int, int]:
+        raw = key.to_bytes(key.bit_length() // 8 + 1, 'big', signed=True) if isinstance(key, int) else key.encode('utf-8')
+        digest = blake2b(raw, digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+
+    def contains_or_add(self, key: IdKey) -> bool:
+        h1, h2 = self.__hashes(key)
+        with self.__lock:
+            if any(bloom.contains(h1, h2) for bloom in self.__filters):
+                if self.__confirm_store is None:
+                    return True
+                if self.__confirm_store.contains_or_add(key):
+                    return True
+                self.__false_positives += 1
+                self.__add(h1, h2)
+                return False
+
+            self.__add(h1, h2)
+            # the confirm store may already hold keys the filter hasn't seen, e.g. when it outlives this process.
+            return self.__confirm_store is not None and self.__confirm_store.contains_or_add(key)
+
+    def __add(self, h1: int, h2: int) -> None:
+        if self.__filters[-1].is_full():
+            self.__add_filter()
+        self.__filters[-1].add(h1, h2)
+        self.__count += 1
+
+    def size_bytes(self) -> int:
+        """
+        The memory held by the filters' bit arrays.
+        """
+        with self.__lock:
+            return sum(bloom.size_bytes() for bloom in self.__filters)
+
+    def confirmed_false_positives(self) -> int:
+        """
+        How many filter hits were refuted by the `confirm_store`.
+        """
+        return self.__false_positives
+
+    def commit(self) -> None:
+        if self.__confirm_store is not None:
+            self.__confirm_store.commit()
+
+    def close(self) -> None:
+        if self.__confirm_store is not None:
+            self.__confirm_store.close()
+
+    def __len__(self):
+        return self.__count
+
+
+class SqliteIdStore(IdStore):
+    """
+    An exact, on-disk store, backed by SQLite in WAL mode, that several worker processes can share, so that a
+    record is deduplicated before any of them writes it.
+
+    Ids are scoped by `namespace`, and are kept across runs for as long as the same database file and namespace
+    are reused; to deduplicate within a single run only, have all of that run's workers use a per-run namespace
+    (e.g. the run date), or `clear()` the namespace before the workers start.
+
+    With `autocommit=False`, new ids are only held in memory until `commit()`, which writes them; so that ids whose
+    records haven't been saved yet aren't taken as seen after a crash. Until then, they're invisible to the other
+    workers, which may write the same record in the meantime.
+    """
+
+    DEFAULT_NAMESPACE = "default"
+    DEFAULT_BATCH_SIZE = 1000
+    DEFAULT_BUSY_TIMEOUT_SEC = 60.0
+
+    def __init__(self,
+                 db_path: str,
+                 namespace: str = DEFAULT_NAMESPACE,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 busy_timeout_sec: float = DEFAULT_BUSY_TIMEOUT_SEC,
+                 autocommit: bool = True):
+        """
+        :param db_path: The SQLite database file; created if needed.
+        :param namespace: The dedup scope within the database.
+        :param batch_size: How many keys `contains_or_add_all` writes per transaction.
+        :param busy_timeout_sec: How long to wait for another process's write lock, before failing.
+        :param autocommit: Whether to write new ids right away; otherwise, only on `commit()`.
+        """
+        self.__namespace = namespace
+        self.__batch_size = batch_size
+        self.__autocommit = autocommit
+        self.__pending: Set[Union[str, bytes]] = set()
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(db_path,
+                                      timeout=busy_timeout_sec,
+                                      isolation_level=None,
+                                      check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS record_ids ("
+                            "namespace TEXT NOT NULL, "
+                            "id_key NOT NULL, "
+                            "PRIMARY KEY (namespace, id_key)) WITHOUT ROWID")
+
+    @staticmethod
+    def __to_column(key: IdKey) -> Union[str, bytes]:
+        # SQLite integers are signed 64-bit, so wider digests are stored as blobs.
+        return key.to_bytes(key.bit_length() // 8 + 1, 'big', signed=True) if isinstance(key, int) else key
+
+    def __insert(self, key: IdKey) -> bool:
+        cursor = self.__conn.execute("INSERT OR IGNORE INTO record_ids (namespace, id_key) VALUES (?, ?)",
+                                     (self.__namespace, self.__to_column(key)))
+        return cursor.rowcount == 0
+
+    def __contains_or_defer(self, key: IdKey) -> bool:
+        column = self.__to_column(key)
+        if column in self.__pending or self.__conn.execute("SELECT 1 FROM record_ids WHERE namespace = ? AND id_key = ?",
+                                                           (self.__namespace, column)).fetchone():
+            return True
+        self.__pending.add(column)
+        return False
+
+    def contains_or_add(self, key: IdKey) -> bool:
+        with self.__lock:
+            return self.__insert(key) if self.__autocommit else self.__contains_or_defer(key)
+
+    def contains_or_add_all(self, keys: Iterable[IdKey]) -> List[bool]:
+        keys = list(keys)
+        results = []
+        with self.__lock:
+            if not self.__autocommit:
+                return [self.__contains_or_defer(key) for key in keys]
+            for start in range(0, len(keys), self.__batch_size):
+                self.__conn.execute("BEGIN IMMEDIATE")
+                try:
+                    results.extend(self.__insert(key) for key in keys[start:start + self.__batch_size])
+                    self.__conn.execute("COMMIT")
+                except BaseException:
+                    self.__conn.execute("ROLLBACK")
+                    raise
+        return results
+
+    def commit(self) -> None:
+        """
+        Writes the ids held back since the last commit; a no-op with `autocommit`.
+        """
+        with self.__lock:
+            pending = list(self.__pending)
+            for start in range(0, len(pending), self.__batch_size):
+                self.__conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self.__conn.executemany("INSERT OR IGNORE INTO record_ids (namespace, id_key) VALUES (?, ?)",
+                                            [(self.__namespace, column) for column in pending[start:start + self.__batch_size]])
+                    self.__conn.execute("COMMIT")
+                except BaseException:
+                    self.__conn.execute("ROLLBACK")
+                    raise
+            self.__pending.clear()
+
+    def clear(self) -> None:
+        """
+        Removes all ids in this store's namespace.
+        """
+        with self.__lock:
+            self.__pending.clear()
+            self.__conn.execute("DELETE FROM record_ids WHERE namespace = ?", (self.__namespace,))
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__conn.close()
+
+    def __len__(self):
+        """
+        The number of ids in this store's namespace, as added by all of its sharing workers; plus this one's
+        uncommitted ids.
+        """
+        with self.__lock:
+            return len(self.__pending) + self.__conn.execute("SELECT COUNT(*) FROM record_ids WHERE namespace = ?",
+                                                             (self.__namespace,)).fetchone()[0]
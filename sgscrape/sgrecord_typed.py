@@ -0,0 +1,104 @@
+import re
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Optional, Union
+
+_PRICE_RE = re.compile(r'[-+]?\d[\d,]*(?:\.\d+)?|[-+]?\.\d+')
+_MIXED_FRACTION_RE = re.compile(r'^\s*(\d+)\s*[- ]\s*(\d+)\s*/\s*(\d+)\s*(.*)$')
+_FRACTION_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d+)\s*(.*)$')
+_DECIMAL_RE = re.compile(r'^\s*([-+]?(?:\d[\d,]*(?:\.\d*)?|\.\d+))\s*(.*)$')
+
+
+@dataclass(frozen=True)
+class Measure:
+    """
+    A numeric dimension, alongside its (lowercased, dot-stripped) unit; e.g. `Measure(1.5, 'in')`
+    """
+    value: float
+    unit: str = ''
+
+
+@dataclass(frozen=True)
+class SgTypedFields:
+    """
+    The numeric fields of an `SgRecord`, parsed out of their string representation.
+    Any field that could not be parsed is `None`.
+    """
+    price: Optional[Decimal] = None
+    width: Optional[Measure] = None
+    height: Optional[Measure] = None
+    depth: Optional[Measure] = None
+    weight: Optional[Measure] = None
+
+    @staticmethod
+    def parse(price: str = '',
+              width: str = '',
+              width_unit: str = '',
+              height: str = '',
+              height_unit: str = '',
+              depth: str = '',
+              weight: str = '',
+              weight_uom: str = '') -> 'SgTypedFields':
+        return SgTypedFields(price=parse_price(price),
+                             width=parse_measure(width, width_unit),
+                             height=parse_measure(height, height_unit),
+                             depth=parse_measure(depth),
+                             weight=parse_measure(weight, weight_uom))
+
+
+def parse_price(value: Union[str, float, int, Decimal, None]) -> Optional[Decimal]:
+    """
+    Parses a price such as `12.5`, `"$1,234.50"` or `"USD 3"` into a `Decimal`; returns `None` if there's no number.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+
+    match = _PRICE_RE.search(value)
+    if not match:
+        return None
+    try:
+        return Decimal(match.group(0).replace(',', ''))
+    except InvalidOperation:
+        return None
+
+
+def parse_measure(value: Union[str, float, int, None], unit: str = '') -> Optional[Measure]:
+    """
+    Parses a dimension such as `"12 in."`, `"1-1/2 in."`, `"3/4 in"` or `"2.5 lb."` into a `Measure`.
+
+    :param value: The raw dimension string (or number).
+    :param unit: An explicit unit, used when the value itself carries none.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return Measure(float(value), _clean_unit(unit))
+
+    mixed = _MIXED_FRACTION_RE.match(value)
+    fraction = _FRACTION_RE.match(value)
+    decimal = _DECIMAL_RE.match(value)
+    if mixed:
+        whole, num, denom, rest = mixed.groups()
+        if int(denom) == 0:
+            return None
+        number = int(whole) + int(num) / int(denom)
+    elif fraction:
+        num, denom, rest = fraction.groups()
+        if int(denom) == 0:
+            return None
+        number = int(num) / int(denom)
+    elif decimal:
+        num, rest = decimal.groups()
+        number = float(num.replace(',', ''))
+    else:
+        return None
+
+    return Measure(number, _clean_unit(rest) or _clean_unit(unit))
+
+
+def _clean_unit(unit: Optional[str]) -> str:
+    return (unit or '').strip().rstrip('.').strip().lower()
@@ -4,12 +4,13 @@ from re import I
 import threading
 from os import path
 import os
-from typing import Optional
+from typing import Callable, Optional, List
 
 from sglogging import SgLogSetup
 
 from sgscrape.pause_resume import CrawlState
 from sgscrape.sgrecord import SgRecord
+from sgscrape.sgrecord_batch import SgRecordBatch
 from sgscrape.sgrecord_id import RecommendedRecordIds
 from sgscrape.sgrecord_deduper import SgRecordDeduper
 
@@ -45,23 +46,30 @@ class SgWriter:
                  deduper = None,
                  data_file = CrawlState.DEFAULT_DATA_FILE,
                  s3 = None,
-                 type = ZORO_TYPE):
+                 type = ZORO_TYPE,
+                 resume: bool = False,
+                 on_save: Optional[Callable[[], None]] = None):
         """
         Creates the writer. Note that the constructor also writes the header row (if necessary).
 
         :param deduper: Optionally, inject a record deduplicator to filter out duplicates. If present, the data file will
                         contain an additional colon-delimited row that represents the record's unique id creation.
+        :param resume: If set, a pre-existing data file is reopened and appended to (pair it with a deduper that read
+                       the same `data_file_path`); otherwise, it is deleted.
+        :param on_save: Optionally, called whenever the data file has been saved; e.g. to checkpoint crawl progress
+                        only once the records it produced are on disk.
         """
         self.__log = SgLogSetup().get_logger(logger_name='sgwriter')
         self.__deduper = deduper
         self.__s3 = s3
+        self.__on_save = on_save
         self.__data_file_name = data_file
         preexisting = path.exists(data_file)
-        if preexisting:
+        if preexisting and not resume:
             os.remove(data_file)
             preexisting = False
         self.__zoro_wb = load_workbook(data_file) if preexisting else Workbook()
-        self.__writer = self.__zoro_wb.active
+        self.__writer = self.__zoro_wb.worksheets[-1] if preexisting else self.__zoro_wb.active
         self.__id_str = str(deduper.get_id()) if deduper else None
         # header_row = SgRecord.Headers.HEADER_ROW_WITH_REC_ID if self.__id_str else SgRecord.Headers.HEADER_ROW
         self.header_row = SgRecord.Headers.ZORO_ROW if type == ZORO_TYPE else SgRecord.Headers.BH_ROW
@@ -77,9 +85,13 @@ class SgWriter:
         self.__log.info('save and upload file to s3')
         self.__zoro_wb.save(self.__data_file_name)
         self.__s3.upload_file(self.__data_file_name, ZORO_RESULTS_BUCKET, self.__data_file_name.split('/')[-1])
+        if self.__on_save:
+            self.__on_save()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.save_file()
+        if self.__deduper:
+            self.__deduper.close()
 
     def __write_header(self)-> Optional[str]:
         SgWriter.__lock.acquire()
@@ -116,6 +128,46 @@ class SgWriter:
         else:
             return id
 
+    def write_batch(self, batch: SgRecordBatch) -> List[str]:
+        """
+        Writes all non-duplicate rows of the batch, deduplicating on the id columns only.
+        Column positions and the next free row are looked up once per batch, rather than once per cell.
+
+        :return: The ids of the rows that were skipped as duplicates.
+        """
+        if self.__deduper:
+            results = self.__deduper.dedup_batch(batch)
+            to_write = batch.select(i for i, (is_dup, _) in enumerate(results) if not is_dup)
+            dup_ids = [rec_id for is_dup, rec_id in results if is_dup]
+        else:
+            to_write = batch
+            dup_ids = []
+
+        if not len(to_write):
+            return dup_ids
+
+        SgWriter.__lock.acquire()
+        col_by_header = {header: Util().get_col_from_name(self.__writer, header) for header in self.header_row}
+        next_row = Util().max_row(self.__writer) + 1
+        for row_dict in to_write.row_dicts(self.header_row):
+            if next_row > ONE_SHEET_LIMIT + 1:
+                self.__log.info('create new sheet')
+                self.__writer = self.__zoro_wb.create_sheet()
+                SgWriter.__lock.release()
+                self.__write_header()
+                SgWriter.__lock.acquire()
+                next_row = 2
+
+            for header, val in row_dict.items():
+                self.__writer.cell(next_row, col_by_header[header]).value = val
+
+            if next_row % SAVE_LIMIT == 0:
+                self.save_file()
+            next_row += 1
+        SgWriter.__lock.release()
+
+        return dup_ids
+
     # def write_row(self, record: SgRecord) -> Optional[str]:
     #     """
     #     Writes the record to file, or else returns the id of a record, only if it is a duplicate.
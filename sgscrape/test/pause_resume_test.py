@@ -1,22 +1,31 @@
+import json
 import os
+import signal
 import time
 from os import path
 import unittest
 from datetime import timedelta
 from typing import Optional
 
-from sgscrape.pause_resume import CrawlState, CrawlStateSingleton, SerializableRequest
+from sgscrape.pause_resume import CrawlState, CrawlStateSingleton, RequestJournal, SerializableRequest
 
 
 class PauseResumeTest(unittest.TestCase):
 
     def setUp(self) -> None:
-        if path.exists('state.json'):
-            os.remove('state.json')
+        PauseResumeTest.remove_state_files()
 
     def tearDown(self) -> None:
-        if path.exists('state.json'):
-            os.remove('state.json')
+        PauseResumeTest.remove_state_files()
+
+    @staticmethod
+    def remove_state_files():
+        CrawlStateSingleton._delete_instance()
+        segments = [segment for _, segment in RequestJournal.segments(CrawlState.JOURNAL_FILE)]
+        handler_file = CrawlState.SAVE_SIGNAL_HANDLER_FILE.format(pid=os.getpid())
+        for file in [CrawlState.STATE_FILE, CrawlState.JOURNAL_FILE, CrawlState.SAVE_SIGNAL_FILE, handler_file] + segments:
+            if path.exists(file):
+                os.remove(file)
 
     @staticmethod
     def __fresh_state_instance(new_save_time: Optional[timedelta] = None):
@@ -61,6 +70,8 @@ class PauseResumeTest(unittest.TestCase):
         self.assertEqual('zero', state2.get_misc_value('field_value'))
         self.assertEqual(2, state2.get_misc_value('y'))
         self.assertEqual(3.1, state2.get_misc_value('z'))
+        self.assertEqual(['field_value', 'y', 'z'], sorted(state2.get_misc_keys()))
+        self.assertEqual(['field_value'], state2.get_misc_keys(prefix='field'))
 
     def test_default_ctor(self):
         state = PauseResumeTest.__fresh_state_instance(timedelta(seconds=0))
@@ -89,6 +100,132 @@ class PauseResumeTest(unittest.TestCase):
 
         self.assertEqual('y', state3.get_misc_value('field_value'))
 
+    def test_journal_persists_queue_between_saves(self):
+        state = PauseResumeTest.__fresh_state_instance(timedelta(minutes=10))
+        for i in range(5):
+            state.push_request(SerializableRequest(url=f'http://example.com/{i}'))
+        state.pop_request()
+        state.push_request(SerializableRequest(url='http://example.com/1'))  # duplicate
+
+        self.assertFalse(path.exists(CrawlState.STATE_FILE))
+
+        state2 = PauseResumeTest.__fresh_state_instance()
+        self.assertEqual(['http://example.com/3', 'http://example.com/2', 'http://example.com/1', 'http://example.com/0'],
+                         [req.url for req in state2.request_stack_iter()])
+
+    def test_journal_replays_on_top_of_snapshot(self):
+        state = PauseResumeTest.__fresh_state_instance(timedelta(minutes=10))
+        state.push_request(SerializableRequest(url='http://example.com/1'))
+        state.push_request(SerializableRequest(url='http://example.com/2'))
+        state.save(override=True)
+        self.assertFalse(path.exists(CrawlState.JOURNAL_FILE))  # compacted into the snapshot; reopened on append
+
+        state.pop_request()
+        state.push_request(SerializableRequest(url='http://example.com/3'))
+        with open(CrawlState.JOURNAL_FILE, mode='a', encoding='utf-8') as journal:
+            journal.write('[99, "+", "{\\"url')  # torn write
+
+        state2 = PauseResumeTest.__fresh_state_instance()
+        self.assertEqual(['http://example.com/3', 'http://example.com/1'],
+                         [req.url for req in state2.request_stack_iter()])
+
+    def test_claimed_requests_are_kept_until_acked(self):
+        state = PauseResumeTest.__fresh_state_instance(timedelta(minutes=10))
+        for i in range(4):
+            state.push_request(SerializableRequest(url=f'http://example.com/{i}'))
+        acked, crashed, nacked = state.claim_request(), state.claim_request(), state.claim_request()
+        state.ack_request(acked)
+        state.nack_request(nacked)
+        self.assertFalse(state.push_request(crashed))  # still in flight
+        self.assertEqual(1, state.request_stack_iter().in_flight())
+
+        state2 = PauseResumeTest.__fresh_state_instance()  # e.g. after a crash, while processing `crashed`
+        self.assertEqual(['http://example.com/2', 'http://example.com/1', 'http://example.com/0'],
+                         [req.url for req in state2.request_stack_iter()])
+
+    def test_claimed_requests_are_snapshotted(self):
+        state = PauseResumeTest.__fresh_state_instance(timedelta(minutes=10))
+        state.push_request(SerializableRequest(url='http://example.com/1'))
+        state.push_request(SerializableRequest(url='http://example.com/2'))
+        state.claim_request()
+        state.save(override=True)
+
+        state2 = PauseResumeTest.__fresh_state_instance()
+        self.assertEqual(['http://example.com/2', 'http://example.com/1'],
+                         [req.url for req in state2.request_stack_iter()])
+
+    @unittest.skipIf(CrawlState.SAVE_SIGNAL is None, "The platform has no save signal")
+    def test_save_on_signal(self):
+        prev_handler = signal.getsignal(CrawlState.SAVE_SIGNAL)
+        state = PauseResumeTest.__fresh_state_instance(timedelta(minutes=10))
+        state.set_misc_value('x', 1)
+        self.assertFalse(path.exists(CrawlState.STATE_FILE))
+
+        os.kill(os.getpid(), CrawlState.SAVE_SIGNAL)
+        state.set_misc_value('x', 2)
+        self.assertEqual(2, PauseResumeTest.__fresh_state_instance().get_misc_value('x'))
+
+        CrawlStateSingleton._delete_instance()
+        self.assertEqual(prev_handler, signal.getsignal(CrawlState.SAVE_SIGNAL))
+
+    @unittest.skipIf(CrawlState.SAVE_SIGNAL is None, "The platform has no save signal")
+    def test_trigger_save_only_signals_an_advertised_handler(self):
+        handler_file = CrawlState.SAVE_SIGNAL_HANDLER_FILE.format(pid=os.getpid())
+        received = []
+        prev_handler = signal.signal(CrawlState.SAVE_SIGNAL, lambda signum, frame: received.append(signum))
+        try:
+            CrawlState.trigger_save(os.getpid())  # nothing advertised: the signal would be fatal without a handler
+            self.assertEqual([], received)
+
+            state = PauseResumeTest.__fresh_state_instance(timedelta(minutes=10))
+            self.assertTrue(path.exists(handler_file))
+            os.remove(CrawlState.SAVE_SIGNAL_FILE)
+            state.set_misc_value('x', 1)
+            CrawlState.trigger_save(os.getpid())
+            state.set_misc_value('x', 2)
+            self.assertEqual(2, PauseResumeTest.__fresh_state_instance().get_misc_value('x'))
+
+            CrawlStateSingleton._delete_instance()
+            self.assertFalse(path.exists(handler_file))
+            CrawlState.trigger_save(os.getpid())
+            self.assertEqual([], received)
+        finally:
+            signal.signal(CrawlState.SAVE_SIGNAL, prev_handler)
+
+    def test_save_on_signal_file(self):
+        state = PauseResumeTest.__fresh_state_instance(timedelta(minutes=10))
+        CrawlState.trigger_save()
+        state.set_misc_value('x', 1)
+        state.set_misc_value('x', 2)  # only saves once per signal file
+
+        self.assertEqual(1, PauseResumeTest.__fresh_state_instance().get_misc_value('x'))
+
+    def test_background_snapshot(self):
+        state = PauseResumeTest.__fresh_state_instance(timedelta(milliseconds=0))
+        for i in range(100):
+            state.push_request(SerializableRequest(url=f'http://example.com/{i}'))
+        state.close()  # waits for the pending snapshot
+
+        stats = state.snapshot_stats()
+        self.assertGreater(stats.snapshots, 0)
+        self.assertGreaterEqual(stats.max_duration_sec, stats.last_duration_sec)
+        self.assertFalse(path.exists(CrawlState.STATE_FILE + '.tmp'))
+        self.assertEqual([], RequestJournal.segments(CrawlState.JOURNAL_FILE))  # compacted by the last snapshot
+
+        with open(CrawlState.STATE_FILE, mode='r', encoding='utf-8') as state_file:
+            self.assertEqual(100, len(json.load(state_file)[CrawlState.REQUEST_QUEUE]))
+
+    def test_journal_segments_replayed_after_crash(self):
+        state = PauseResumeTest.__fresh_state_instance(timedelta(minutes=10))
+        state.push_request(SerializableRequest(url='http://example.com/1'))
+        state.request_stack_iter().snapshot()  # rotated, but the snapshot never gets written
+        state.push_request(SerializableRequest(url='http://example.com/2'))
+
+        self.assertEqual(1, len(RequestJournal.segments(CrawlState.JOURNAL_FILE)))
+        state2 = PauseResumeTest.__fresh_state_instance()
+        self.assertEqual(['http://example.com/2', 'http://example.com/1'],
+                         [req.url for req in state2.request_stack_iter()])
+
     def test_dup_streak(self):
         state = PauseResumeTest.__fresh_state_instance(timedelta(seconds=0))
 
@@ -100,6 +237,18 @@ class PauseResumeTest(unittest.TestCase):
         state2 = PauseResumeTest.__fresh_state_instance()
         self.assertEqual(1, state2.get_duplicate_streak())
 
+    def test_set_dup_streak_persisted_on_next_save(self):
+        state = PauseResumeTest.__fresh_state_instance(timedelta(minutes=10))
+        state.set_duplicate_streak(5)
+
+        self.assertEqual(5, state.get_duplicate_streak())
+        self.assertEqual(0, PauseResumeTest.__fresh_state_instance().get_duplicate_streak())
+
+        state = PauseResumeTest.__fresh_state_instance()
+        state.set_duplicate_streak(5)
+        state.save(override=True)
+        self.assertEqual(5, PauseResumeTest.__fresh_state_instance().get_duplicate_streak())
+
 
 if __name__ == "__main__":
     unittest.main()
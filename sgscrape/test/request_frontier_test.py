@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from os import path
+
+from sgscrape.pause_resume import CrawlState, CrawlStateSingleton, RequestJournal, SerializableRequest
+from sgscrape.request_frontier import SqliteRequestFrontier
+
+
+class SqliteRequestFrontierTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.__dir = tempfile.mkdtemp()
+        self.__db = path.join(self.__dir, 'frontier.db')
+
+    def tearDown(self) -> None:
+        CrawlStateSingleton._delete_instance()
+        CrawlStateSingleton.set_frontier_db_path(None)
+        segments = [segment for _, segment in RequestJournal.segments(CrawlState.JOURNAL_FILE)]
+        for file in [CrawlState.STATE_FILE, CrawlState.JOURNAL_FILE] + segments:
+            if path.exists(file):
+                os.remove(file)
+        shutil.rmtree(self.__dir)
+
+    @staticmethod
+    def __req(i: int) -> SerializableRequest:
+        return SerializableRequest(url=f'http://example.com/{i}')
+
+    def test_order_and_dedup(self):
+        frontier = SqliteRequestFrontier(self.__db)
+        self.assertEqual(3, frontier.push_requests([self.__req(1), self.__req(2), self.__req(3), self.__req(2)]))
+        self.assertTrue(frontier.push_request(self.__req(0), priority=1))
+        self.assertFalse(frontier.push_request(self.__req(1)))
+
+        self.assertEqual(['http://example.com/0', 'http://example.com/3', 'http://example.com/2', 'http://example.com/1'],
+                         [req.url for req in frontier])
+        self.assertEqual(0, len(frontier))
+        frontier.close()
+
+    def test_claim_ack_nack(self):
+        frontier = SqliteRequestFrontier(self.__db)
+        frontier.push_requests([self.__req(1), self.__req(2)])
+
+        first = frontier.claim_request()
+        second = frontier.claim_request()
+        self.assertIsNone(frontier.claim_request())
+        self.assertEqual(2, frontier.claimed())
+        self.assertFalse(frontier.push_request(first))  # in-flight requests aren't re-queued
+
+        frontier.ack_request(first)
+        frontier.nack_request(second)
+        self.assertEqual(0, frontier.claimed())
+        self.assertEqual(second, frontier.claim_request())
+        frontier.close()
+
+        # an unacked claim survives a crash, and is handed out again.
+        reopened = SqliteRequestFrontier(self.__db)
+        self.assertEqual(second, reopened.pop_request())
+        self.assertIsNone(reopened.pop_request())
+        reopened.close()
+
+    def test_concurrent_claims_are_exclusive(self):
+        frontier = SqliteRequestFrontier(self.__db)
+        frontier.push_requests(self.__req(i) for i in range(500))
+        claimed = []
+
+        def worker():
+            for req in iter(frontier.claim_request, None):
+                claimed.append(req.url)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(500, len(claimed))
+        self.assertEqual(500, len(set(claimed)))
+        frontier.close()
+
+    def test_crawl_state_backend(self):
+        CrawlStateSingleton._delete_instance()
+        CrawlStateSingleton.set_minimum_time_between_saves(timedelta(minutes=10))
+        state = CrawlStateSingleton.get_instance()
+        state.push_request(self.__req(1))
+        state.push_request(self.__req(2))
+        state.save(override=True)
+
+        # requests queued in the state file are moved over to the frontier.
+        CrawlStateSingleton._delete_instance()
+        CrawlStateSingleton.set_frontier_db_path(self.__db)
+        state = CrawlStateSingleton.get_instance()
+        self.assertIsInstance(state.request_stack_iter(), SqliteRequestFrontier)
+        self.assertFalse(path.exists(CrawlState.JOURNAL_FILE))
+        state.push_request(self.__req(3))
+        state.save(override=True)
+
+        CrawlStateSingleton._delete_instance()
+        state = CrawlStateSingleton.get_instance()
+        self.assertEqual(['http://example.com/3', 'http://example.com/2', 'http://example.com/1'],
+                         [req.url for req in state.request_stack_iter()])
+
+    def test_crawl_state_claims_until_acked(self):
+        CrawlStateSingleton._delete_instance()
+        CrawlStateSingleton.set_frontier_db_path(self.__db)
+        state = CrawlStateSingleton.get_instance()
+        for i in range(3):
+            state.push_request(self.__req(i))
+        acked, crashed = state.claim_request(), state.claim_request()
+        state.ack_request(acked)
+
+        # e.g. a crash while processing `crashed`: the next run gets it again.
+        CrawlStateSingleton._delete_instance()
+        state = CrawlStateSingleton.get_instance()
+        self.assertEqual({crashed.url, 'http://example.com/0'}, {req.url for req in state.request_stack_iter()})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+import unittest
+from datetime import timedelta
+from os import path
+
+from sgscrape.pause_resume import CrawlState, CrawlStateSingleton, RequestJournal, SerializableRequest
+from sgscrape.request_scheduler import RequestScheduler
+
+
+class RequestSchedulerTest(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        CrawlStateSingleton._delete_instance()
+        CrawlStateSingleton.set_host_concurrency(None)
+        segments = [segment for _, segment in RequestJournal.segments(CrawlState.JOURNAL_FILE)]
+        for file in [CrawlState.STATE_FILE, CrawlState.JOURNAL_FILE] + segments:
+            if path.exists(file):
+                os.remove(file)
+
+    @staticmethod
+    def __req(host: str, i: int, priority: int = 0) -> SerializableRequest:
+        return SerializableRequest(url=f'http://{host}/{i}', priority=priority)
+
+    def test_priority_then_hosts_take_turns(self):
+        scheduler = RequestScheduler()
+        for i in range(3):
+            scheduler.push_request(self.__req('a.com', i))
+        scheduler.push_request(self.__req('b.com', 0))
+        scheduler.push_request(self.__req('b.com', 1))
+        scheduler.push_request(self.__req('c.com', 0, priority=5))
+        self.assertFalse(scheduler.push_request(self.__req('a.com', 1, priority=9)))  # priority isn't identity
+
+        self.assertEqual(['http://c.com/0',
+                          'http://a.com/2', 'http://b.com/1', 'http://a.com/1', 'http://b.com/0', 'http://a.com/0'],
+                         [req.url for req in scheduler])
+
+    def test_per_host_concurrency(self):
+        scheduler = RequestScheduler(max_in_flight_per_host=2, host_limits={'B.com': 1})
+        for i in range(5):
+            scheduler.push_request(self.__req('a.com', i))
+            scheduler.push_request(self.__req('b.com', i))
+
+        claimed = [scheduler.claim_request() for _ in range(4)]
+        self.assertEqual(['a.com', 'b.com', 'a.com', None],
+                         [RequestScheduler.host_of(req) if req else None for req in claimed])
+        self.assertEqual(3, scheduler.in_flight())
+
+        scheduler.ack_request(claimed[1])
+        self.assertEqual('b.com', RequestScheduler.host_of(scheduler.claim_request()))
+
+        scheduler.nack_request(claimed[0])
+        self.assertEqual(claimed[0], scheduler.claim_request())
+
+    def test_blocking_claims(self):
+        scheduler = RequestScheduler(max_in_flight_per_host=3)
+        for i in range(60):
+            scheduler.push_request(self.__req('a.com' if i % 2 else 'b.com', i))
+        processed = []
+        lock = threading.Lock()
+        peak = {'a.com': 0, 'b.com': 0, 'c.com': 0}
+        active = {'a.com': 0, 'b.com': 0, 'c.com': 0}
+
+        def worker():
+            for req in iter(lambda: scheduler.claim_request(block=True, timeout=5), None):
+                host = RequestScheduler.host_of(req)
+                with lock:
+                    active[host] += 1
+                    peak[host] = max(peak[host], active[host])
+                time.sleep(0.001)
+                if req.url.endswith('/0'):  # discovers more requests while processing
+                    scheduler.push_request(self.__req('c.com', 0))
+                with lock:
+                    active[host] -= 1
+                    processed.append(req.url)
+                scheduler.ack_request(req)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(61, len(set(processed)))
+        self.assertLessEqual(max(peak.values()), 3)
+
+    def test_crawl_state_backend(self):
+        CrawlStateSingleton._delete_instance()
+        CrawlStateSingleton.set_minimum_time_between_saves(timedelta(minutes=10))
+        CrawlStateSingleton.set_host_concurrency(2)
+        state = CrawlStateSingleton.get_instance()
+        scheduler = state.request_stack_iter()
+        self.assertIsInstance(scheduler, RequestScheduler)
+
+        state.push_request(self.__req('a.com', 0, priority=1))
+        state.push_request(self.__req('a.com', 1))
+        state.push_request(self.__req('b.com', 0))
+        in_flight = scheduler.claim_request()  # never acked
+        state.save(override=True)
+        state.push_request(self.__req('b.com', 1))  # only in the journal
+
+        CrawlStateSingleton._delete_instance()
+        state = CrawlStateSingleton.get_instance()
+        self.assertEqual(in_flight, state.pop_request())
+        self.assertEqual(1, in_flight.priority)
+        self.assertEqual(['http://b.com/1', 'http://a.com/1', 'http://b.com/0'],
+                         [req.url for req in state.request_stack_iter()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import hashlib
+import unittest
+from unittest import mock
+
+from sgscrape.pause_resume import SerializableRequest
+
+
+class SerializableRequestTest(unittest.TestCase):
+
+    @staticmethod
+    def __req(**kwargs) -> SerializableRequest:
+        return SerializableRequest(url='http://example.com/search',
+                                   method='POST',
+                                   params={'page': '4', 'sort': 'price'},
+                                   headers={'Accept': 'application/json'},
+                                   data=[('query', 'drill bits')],
+                                   auth=('user', 'pass'),
+                                   timeout=(3.0, 10.0),
+                                   context={'category': 'Tools', 'page': 4},
+                                   **kwargs)
+
+    def __assert_round_trip(self):
+        req = SerializableRequestTest.__req()
+        req2 = SerializableRequest.deserialize(req.serialize())
+
+        self.assertEqual(req, req2)
+        self.assertEqual(['user', 'pass'], req2.auth)  # tuples become lists
+        self.assertEqual({'category': 'Tools', 'page': 4}, req2.context)
+
+    def test_round_trip(self):
+        self.__assert_round_trip()
+
+    def test_round_trip_without_orjson(self):
+        with mock.patch('sgscrape.pause_resume.orjson', None):
+            self.__assert_round_trip()
+
+    def test_fingerprint_is_cached(self):
+        req = SerializableRequestTest.__req()
+        with mock.patch('sgscrape.pause_resume.blake2b', wraps=hashlib.blake2b) as digest:
+            fingerprint = req.fingerprint()
+            hash(req)
+            self.assertEqual(req, req)
+            self.assertEqual(1, digest.call_count)
+        self.assertEqual(fingerprint, req.fingerprint())
+        self.assertNotIn('_fingerprint', req.serialize())
+
+    def test_equality(self):
+        req = SerializableRequestTest.__req()
+        same = SerializableRequest.deserialize(req.serialize())
+        unverified = SerializableRequestTest.__req(verify=False)  # connection settings aren't part of the identity
+        other = SerializableRequest(url='http://example.com/search')
+
+        self.assertEqual(req, same)
+        self.assertEqual(hash(req), hash(same))
+        self.assertEqual(req, unverified)
+        self.assertNotEqual(req, other)
+        self.assertEqual(SerializableRequest(url='a', params={'x': '1', 'y': '2'}),
+                         SerializableRequest(url='a', params={'y': '2', 'x': '1'}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import unittest
+from typing import List
+
+from sgscrape.pause_resume import CrawlState, CrawlStateSingleton, RequestJournal
+from sgscrape.sgrecord import SgRecord
+from sgscrape.sgrecord_batch import SgRecordBatch
+from sgscrape.sgrecord_deduper import SgRecordDeduper
+from sgscrape.sgrecord_id import SgRecordID
+
+
+class SgRecordBatchTest(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        SgRecordBatchTest.remove_journal_files()
+
+    @staticmethod
+    def remove_journal_files():
+        CrawlStateSingleton._delete_instance()
+        segments = [segment for _, segment in RequestJournal.segments(CrawlState.JOURNAL_FILE)]
+        for file in [CrawlState.JOURNAL_FILE] + segments:
+            if os.path.exists(file):
+                os.remove(file)
+
+    @staticmethod
+    def __gen_records(num: int) -> List[SgRecord]:
+        return [SgRecord(item_url=f"https://example.com/{i}", price=i * 1.5, name=f" item {i} ") for i in range(num)]
+
+    def test_records_round_trip(self):
+        records = SgRecordBatchTest.__gen_records(10)
+        batch = SgRecordBatch.from_records(records)
+
+        self.assertEqual(10, len(batch))
+        self.assertEqual("item 3", batch.column(SgRecord.Headers.NAME)[3])
+        self.assertEqual([rec.as_row() for rec in records], [rec.as_row() for rec in batch.records()])
+
+    def test_missing_columns_are_filled(self):
+        batch = SgRecordBatch({SgRecord.Headers.ITEM_URL: ["a", "b"]})
+
+        self.assertEqual(2, len(batch))
+        self.assertEqual([SgRecord.MISSING] * 2, batch.column(SgRecord.Headers.PRICE))
+
+    def test_invalid_columns(self):
+        with self.assertRaises(ValueError):
+            SgRecordBatch({"no_such_header": ["a"]})
+
+        with self.assertRaises(ValueError):
+            SgRecordBatch({SgRecord.Headers.ITEM_URL: ["a", "b"], SgRecord.Headers.NAME: ["a"]})
+
+    def test_pandas_round_trip(self):
+        batch = SgRecordBatch.from_records(SgRecordBatchTest.__gen_records(5))
+        df = batch.to_pandas()
+        df.loc[0, SgRecord.Headers.NAME] = None
+
+        batch2 = SgRecordBatch.from_pandas(df)
+
+        self.assertEqual(list(SgRecord.Headers.HEADER_ROW), list(df.columns))
+        self.assertEqual(SgRecord.MISSING, batch2.column(SgRecord.Headers.NAME)[0])
+        self.assertEqual(batch.column(SgRecord.Headers.ITEM_URL), batch2.column(SgRecord.Headers.ITEM_URL))
+
+    def test_typed_pandas(self):
+        batch = SgRecordBatch.from_records([SgRecord(price="$1,000.25", width="1-1/2 in.", depth="3 ft"),
+                                            SgRecord(price="", width="n/a")])
+        df = batch.to_pandas(typed=True)
+
+        self.assertEqual('float64', str(df[SgRecord.Headers.PRICE].dtype))
+        self.assertEqual(1000.25, df[SgRecord.Headers.PRICE][0])
+        self.assertEqual(1.5, df[SgRecord.Headers.WIDTH][0])
+        self.assertEqual('in', df[SgRecord.Headers.WIDTH_UNIT][0])
+        self.assertEqual('ft', df[SgRecordBatch.DEPTH_UNIT][0])
+        self.assertTrue(df[SgRecord.Headers.PRICE].isna()[1])
+        self.assertTrue(df[SgRecord.Headers.WIDTH].isna()[1])
+
+    def test_dedup_batch(self):
+        deduper = SgRecordDeduper(SgRecordID({SgRecord.Headers.ITEM_URL}))
+        records = SgRecordBatchTest.__gen_records(5)
+        deduper.dedup(records[0])
+
+        results = deduper.dedup_batch(SgRecordBatch.from_records(records + records[1:2]))
+
+        self.assertEqual([True, False, False, False, False, True], [is_dup for is_dup, _ in results])
+        self.assertEqual(5, deduper.unique_ids())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+
+from sgscrape.pause_resume import CrawlState, CrawlStateSingleton, RequestJournal
+from sgscrape.sgrecord import SgRecord
+from sgscrape.sgrecord_deduper import SgRecordDeduper
+from sgscrape.sgrecord_id import SgRecordID
+
+
+class SgRecordDeduperResumeTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.__tmp_dir = tempfile.TemporaryDirectory()
+        self.__xlsx_path = os.path.join(self.__tmp_dir.name, 'data.xlsx')
+
+        workbook = Workbook()
+        for sheet in [workbook.active, workbook.create_sheet()]:
+            sheet.append(SgRecord.Headers.HEADER_ROW)
+        workbook.worksheets[0].append(SgRecord(item_url=" https://example.com/1 ", name="a").as_row())
+        workbook.worksheets[0].append([None] * len(SgRecord.Headers.HEADER_ROW))
+        workbook.worksheets[1].append(SgRecord(item_url="https://example.com/2", name="b").as_row())
+        workbook.save(self.__xlsx_path)
+
+    def tearDown(self) -> None:
+        self.__tmp_dir.cleanup()
+        SgRecordDeduperResumeTest.remove_journal_files()
+
+    @staticmethod
+    def remove_journal_files():
+        CrawlStateSingleton._delete_instance()
+        segments = [segment for _, segment in RequestJournal.segments(CrawlState.JOURNAL_FILE)]
+        for file in [CrawlState.JOURNAL_FILE] + segments:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_load_columns_from_xlsx(self):
+        rows = list(CrawlState.load_columns(self.__xlsx_path, [SgRecord.Headers.ITEM_URL, SgRecord.Headers.NAME]))
+
+        self.assertEqual([{SgRecord.Headers.ITEM_URL: "https://example.com/1", SgRecord.Headers.NAME: "a"},
+                          {SgRecord.Headers.ITEM_URL: "https://example.com/2", SgRecord.Headers.NAME: "b"}], rows)
+
+    def test_deduper_rebuilds_ids_from_xlsx(self):
+        deduper = SgRecordDeduper(SgRecordID({SgRecord.Headers.ITEM_URL}, hashed=True),
+                                  data_file_path=self.__xlsx_path)
+
+        self.assertEqual(2, deduper.unique_ids())
+        self.assertTrue(deduper.dedup(SgRecord(item_url="https://example.com/1"))[0])
+        self.assertTrue(deduper.dedup(SgRecord(item_url="https://example.com/2"))[0])
+        self.assertFalse(deduper.dedup(SgRecord(item_url="https://example.com/3"))[0])
+
+    def test_deduper_skips_reading(self):
+        deduper = SgRecordDeduper(SgRecordID({SgRecord.Headers.ITEM_URL}), data_file_path=None)
+
+        self.assertEqual(0, deduper.unique_ids())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from sgscrape.pause_resume import CrawlState, CrawlStateSingleton, RequestJournal
+from sgscrape.sgrecord import SgRecord
+from sgscrape.sgrecord_deduper import SgRecordDeduper
+from sgscrape.sgrecord_id import SgRecordID
+from sgscrape.sgrecord_id_store import IdStore, InMemoryIdStore, ScalableBloomIdStore, SqliteIdStore
+
+
+class SgRecordIdStoreTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.__tmp_dir = tempfile.TemporaryDirectory()
+        self.__db_path = os.path.join(self.__tmp_dir.name, 'ids.sqlite')
+
+    def tearDown(self) -> None:
+        self.__tmp_dir.cleanup()
+        SgRecordIdStoreTest.remove_journal_files()
+
+    @staticmethod
+    def remove_journal_files():
+        CrawlStateSingleton._delete_instance()
+        segments = [segment for _, segment in RequestJournal.segments(CrawlState.JOURNAL_FILE)]
+        for file in [CrawlState.JOURNAL_FILE] + segments:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_in_memory_store(self):
+        store = InMemoryIdStore()
+
+        self.assertEqual([False, False, True], store.contains_or_add_all(["a", 1, "a"]))
+        self.assertTrue(store.contains_or_add(1))
+        self.assertEqual(2, len(store))
+
+    def test_bloom_has_no_false_negatives(self):
+        store = ScalableBloomIdStore(initial_capacity=100, false_positive_rate=0.01)
+        keys = [f"https://example.com/{i}" for i in range(1000)] + list(range(1000))
+
+        for key in keys:
+            store.contains_or_add(key)
+
+        self.assertTrue(all(store.contains_or_add(key) for key in keys))
+
+    def test_bloom_has_no_false_negatives_across_threads(self):
+        store = ScalableBloomIdStore(initial_capacity=100, false_positive_rate=0.01)
+        keys = [f"https://example.com/{i}" for i in range(4000)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(store.contains_or_add, keys))
+
+        self.assertTrue(all(store.contains_or_add(key) for key in keys))
+
+    def test_incomplete_store_fails_on_construction(self):
+        class NoLenIdStore(IdStore):
+            def contains_or_add(self, key) -> bool:
+                return False
+
+        with self.assertRaises(TypeError):
+            NoLenIdStore()
+
+    def test_bloom_false_positive_rate_holds_while_scaling(self):
+        store = ScalableBloomIdStore(initial_capacity=500, false_positive_rate=0.01)
+        false_positives = sum(store.contains_or_add(f"key-{i}") for i in range(20000))
+
+        self.assertLess(false_positives, 20000 * 0.01)
+        self.assertGreater(len(store), 20000 - 20000 * 0.01)
+
+    def test_bloom_confirm_store_refutes_false_positives(self):
+        store = ScalableBloomIdStore(initial_capacity=10, false_positive_rate=0.5, confirm_store=InMemoryIdStore())
+        false_positives = sum(store.contains_or_add(i) for i in range(1000))
+
+        self.assertEqual(0, false_positives)
+        self.assertGreater(store.confirmed_false_positives(), 0)
+        self.assertTrue(store.contains_or_add(999))
+
+    def test_sqlite_store_is_shared(self):
+        worker_1 = SqliteIdStore(self.__db_path, namespace="run")
+        worker_2 = SqliteIdStore(self.__db_path, namespace="run")
+        other_run = SqliteIdStore(self.__db_path, namespace="other_run")
+
+        self.assertEqual([False, False, True], worker_1.contains_or_add_all(["a", 2 ** 127, "a"]))
+        self.assertEqual([True, True, False], worker_2.contains_or_add_all(["a", 2 ** 127, "b"]))
+        self.assertTrue(worker_1.contains_or_add("b"))
+        self.assertFalse(other_run.contains_or_add("a"))
+        self.assertEqual(3, len(worker_1))
+
+        for store in [worker_1, worker_2, other_run]:
+            store.close()
+
+    def test_sqlite_store_keeps_ids_across_runs(self):
+        store = SqliteIdStore(self.__db_path, batch_size=2)
+        store.contains_or_add_all(range(5))
+        store.close()
+
+        store = SqliteIdStore(self.__db_path)
+        self.assertEqual([True] * 5, store.contains_or_add_all(range(5)))
+
+        store.clear()
+        self.assertEqual(0, len(store))
+        store.close()
+
+    def test_sqlite_store_defers_ids_until_commit(self):
+        worker_1 = SqliteIdStore(self.__db_path, namespace="run", autocommit=False)
+        worker_2 = SqliteIdStore(self.__db_path, namespace="run")
+
+        self.assertEqual([False, False, True], worker_1.contains_or_add_all(["a", 2 ** 127, "a"]))
+        self.assertTrue(worker_1.contains_or_add(2 ** 127))
+        self.assertEqual(2, len(worker_1))
+        self.assertFalse(worker_2.contains_or_add("x"))
+        peer = SqliteIdStore(self.__db_path, namespace="run", autocommit=False)
+        self.assertEqual([False, False], peer.contains_or_add_all(["a", 2 ** 127]))
+        peer.close()
+
+        worker_1.commit()
+        self.assertEqual([True, True], worker_2.contains_or_add_all(["a", 2 ** 127]))
+        self.assertTrue(worker_1.contains_or_add("x"))
+
+        self.assertFalse(worker_1.contains_or_add("lost"))
+        worker_1.close()  # without a commit
+        self.assertFalse(worker_2.contains_or_add("lost"))
+        worker_2.close()
+
+    def test_deduper_with_bloom_store(self):
+        deduper = SgRecordDeduper(SgRecordID({SgRecord.Headers.ITEM_URL}, hashed=True),
+                                  id_store=ScalableBloomIdStore(initial_capacity=100))
+        records = [SgRecord(item_url=f"https://example.com/{i}") for i in range(10)]
+
+        self.assertEqual([False] * 10, [deduper.dedup(rec)[0] for rec in records])
+        self.assertEqual([True] * 10, [deduper.dedup(rec)[0] for rec in records])
+        self.assertEqual(10, deduper.unique_ids())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from sgscrape.sgrecord import SgRecord
+from sgscrape.sgrecord_id import SgRecordID
+
+
+class SgRecordIDTest(unittest.TestCase):
+
+    __rec = SgRecord(item_url="https://example.com/1", mf_number="MF-1", price=1.23456)
+
+    def test_readable_id_is_order_independent(self):
+        id_1 = SgRecordID({SgRecord.Headers.ITEM_URL, SgRecord.Headers.MF_NUMBER})
+        id_2 = SgRecordID({SgRecord.Headers.MF_NUMBER, SgRecord.Headers.ITEM_URL})
+
+        self.assertEqual(id_1.generate_id(self.__rec), id_2.generate_id(self.__rec))
+        self.assertEqual("item_url:https://example.com/1 mf_number:MF-1 ", id_1.generate_id(self.__rec))
+
+    def test_digest_width(self):
+        id_64 = SgRecordID({SgRecord.Headers.ITEM_URL}, hashed=True)
+        id_128 = SgRecordID({SgRecord.Headers.ITEM_URL}, hashed=True, digest_bits=128)
+
+        self.assertLess(id_64.generate_digest(self.__rec), 2 ** 64)
+        self.assertLess(id_128.generate_digest(self.__rec), 2 ** 128)
+        self.assertEqual(id_64.generate_digest(self.__rec), id_64.generate_digest(SgRecord(raw=self.__rec.as_dict())))
+
+        with self.assertRaises(ValueError):
+            SgRecordID({SgRecord.Headers.ITEM_URL}, digest_bits=32)
+
+    def test_to_key(self):
+        readable = SgRecordID({SgRecord.Headers.ITEM_URL})
+        hashed = SgRecordID({SgRecord.Headers.ITEM_URL}, hashed=True)
+        ident = readable.generate_id(self.__rec)
+
+        self.assertEqual(ident, readable.to_key(ident))
+        self.assertEqual(hashed.generate_digest(self.__rec), hashed.to_key(ident))
+
+    def test_transform_keeps_settings(self):
+        rec_id = SgRecordID({SgRecord.Headers.PRICE}, hashed=True, fail_on_empty_field=True)\
+            .with_truncate(SgRecord.Headers.PRICE, 2)
+
+        self.assertTrue(rec_id.hashed)
+        self.assertTrue(rec_id.fail_on_empty_field)
+        self.assertEqual("price:1.23 ", rec_id.generate_id(self.__rec))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from decimal import Decimal
+
+from sgscrape.sgrecord import SgRecord
+from sgscrape.sgrecord_typed import Measure, parse_price, parse_measure
+
+
+class SgRecordTypedTest(unittest.TestCase):
+
+    def test_parse_price(self):
+        self.assertEqual(Decimal('12.5'), parse_price('12.5'))
+        self.assertEqual(Decimal('1234.50'), parse_price('$1,234.50'))
+        self.assertEqual(Decimal('3'), parse_price(3))
+        self.assertIsNone(parse_price('call for price'))
+        self.assertIsNone(parse_price(None))
+
+    def test_parse_measure(self):
+        self.assertEqual(Measure(12.0, 'in'), parse_measure('12 in.'))
+        self.assertEqual(Measure(1.5, 'in'), parse_measure('1-1/2 in.'))
+        self.assertEqual(Measure(0.75, 'in'), parse_measure('3/4 in'))
+        self.assertEqual(Measure(2.5, 'lb'), parse_measure('2.5', 'lb.'))
+        self.assertIsNone(parse_measure('n/a'))
+        self.assertIsNone(parse_measure('1/0 in'))
+
+    def test_record_typed_fields(self):
+        rec = SgRecord(price=19.99, width='1-1/2 in.', width_unit='in', weight='3 lb.', depth='n/a')
+        typed = rec.typed()
+
+        self.assertEqual(Decimal('19.99'), typed.price)
+        self.assertEqual(Measure(1.5, 'in'), typed.width)
+        self.assertEqual(Measure(3.0, 'lb'), typed.weight)
+        self.assertIsNone(typed.height)
+        self.assertIsNone(typed.depth)
+        self.assertIs(typed, rec.typed())  # parsed only once
+
+
+if __name__ == "__main__":
+    unittest.main()
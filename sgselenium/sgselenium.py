@@ -1,6 +1,5 @@
 import os
 from copy import _copy_immutable
-import random
 from time import time, sleep
 from typing import Optional, List
 
@@ -9,6 +8,8 @@ from seleniumwire import webdriver
 from selenium.webdriver.firefox.options import Options
 import logging
 
+from sgrequests.proxy_pool import ProxyPool
+
 class SgSelenium:
     DEFAULT_PROXY_URL = "http://groups-RESIDENTIAL,country-us:{}@proxy.apify.com:8000/"
 
@@ -28,7 +29,7 @@ class SgSelenium:
 
     def __set_proxy_options(self) -> dict:
         if self.__behind_proxy:
-            proxy_url = random.choice(self.STORM_PROXIES)
+            proxy_url = ProxyPool.shared(self.STORM_PROXIES).acquire()
             return {
                 'proxy': {
                     'https': proxy_url,
@@ -1,4 +1,4 @@
-from sgrequests import SgRequests
+from sgrequests import SgRequests, ProxyPool
 from sgselenium import SgChrome, SgFirefox
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -14,7 +14,6 @@ from concurrent.futures import ThreadPoolExecutor
 import os
 import shutil
 import time
-import random
 import re
 import logging
 from logging.handlers import RotatingFileHandler
@@ -90,7 +89,7 @@ class Script:
         self.options.add_argument("--no-sandbox")
         self.options.add_argument('--headless')
         self.options.add_argument(f"user-agent={Util().get_random_user_agent()}")
-        self.options.add_argument('--proxy-server=%s' % random.choice(STORM_PROXIES))
+        self.options.add_argument('--proxy-server=%s' % ProxyPool.shared(STORM_PROXIES).acquire())
         self.options.add_argument('user-data-dir=/home/hello/.config/google-chrome/Profile 3')
         self.options.add_argument("--disable-dev-shm-usage")
 